@@ -17,18 +17,62 @@ BOOKMAKERS:
   - Bwin              → licence DGOJ Espagne
   - Pinnacle          → meilleures cotes du marché
 
-QUOTA:
-  9 sports × 3/heure × 12h × 30j = 9 720 req ✅
+QUOTA (coût d'un appel = marchés × régions, 1 par défaut: h2h × eu):
+  Adaptatif (défaut): QUOTA_MONTHLY = 10 000 req/mois répartis entre les
+  ligues selon leur rendement et leurs coups d'envoi ✅
+  Fixe (ADAPTIVE_SCHEDULING=False): 9 sports × 3/heure × 24h × 30j = 19 440 req
+  ⚠️ au-delà de 10 000; avec N marchés l'intervalle est multiplié par N
 """
 
+import codecs
+import gzip
 import os
+import random
+import signal
+import socket
+import sqlite3
 import sys
 import requests
 import time
 import json
+import difflib
+import hashlib
 import logging
-from datetime import datetime, timezone
+import mmap
+import queue
+import re
+import threading
+import tracemalloc
+import unicodedata
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED,
+)
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice, product
 from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from requests.adapters import HTTPAdapter
+
+try:
+    import numpy as np
+except ImportError:  # détection vectorisée désactivée, on retombe sur la boucle par match
+    np = None
+
+try:
+    import resource
+except ImportError:  # Windows: pas de RSS max dans le bench
+    resource = None
+
+try:
+    import redis
+except ImportError:  # store partagé Redis indisponible, SQLite reste possible
+    redis = None
 
 # ─────────────────────────────────────────────────────
 # ⚙️  CONFIG
@@ -37,18 +81,96 @@ from pathlib import Path
 ODDS_API_KEY        = os.environ.get("ODDS_API_KEY", "YOUR_ODDS_API_KEY")
 TELEGRAM_BOT_TOKEN  = os.environ.get("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID    = os.environ.get("TELEGRAM_CHAT_ID", "YOUR_TELEGRAM_CHAT_ID")
+ODDS_API_BASE       = os.environ.get("ODDS_API_BASE", "https://api.the-odds-api.com")  # ou la fausse API locale
+ODDS_REGIONS        = os.environ.get("ODDS_REGIONS", "eu").split(",")   # facturées chacune
+ODDS_MARKETS        = os.environ.get("ODDS_MARKETS", "h2h").split(",")  # facturés chacun: totals,spreads en opt-in
 
 PAPER_TRADING       = True
 MIN_PROFIT_PCT      = 1.0   # Baissé de 1.0% à 0.5%
 BANKROLL            = 100
 POLL_INTERVAL       = 1200  # 20 minutes
-LOG_FILE            = "arb_opportunities.json"
+LOG_FILE            = "arb_opportunities.jsonl"   # append-only, 1 opp par ligne
+LEGACY_LOG_FILE     = "arb_opportunities.json"    # ancien format (tableau JSON), migré au démarrage
+LOG_FSYNC_EVERY     = 20    # fsync toutes les N lignes...
+LOG_FSYNC_INTERVAL  = 30    # ...ou au plus tard toutes les N secondes
+STORE_FILE          = "arb_opportunities.db"   # index SQLite du log (WAL)
+STORE_BATCH_SIZE    = 5000  # lignes JSONL max par transaction SQLite
+STORE_SYNC_INTERVAL = 60    # secondes min entre deux syncs depuis la boucle
+ANALYZE_CACHE_FILE  = LOG_FILE + ".cols"   # colonnes typées du log pour `analyze` (relues par mmap)
+ANALYZE_WORKERS     = int(os.environ.get("ANALYZE_WORKERS", os.cpu_count() or 1))  # process pour parser/agréger
+ANALYZE_PARSE_CHUNK = 32 * 1024 * 1024  # octets de JSONL parsés par tâche
+ANALYZE_PARALLEL_MIN = 250_000  # opps min avant de répartir les agrégats groupés sur plusieurs cœurs
+
+FETCH_CONCURRENCY   = int(os.environ.get("FETCH_CONCURRENCY", 4))   # ligues fetchées en parallèle
+SCAN_DEADLINE       = int(os.environ.get("SCAN_DEADLINE", 45))      # secondes max pour la phase fetch
+STREAM_CHUNK_SIZE   = 64 * 1024  # octets lus à la fois dans le corps de la réponse
+STREAM_BATCH        = 25    # matchs décodés envoyés ensemble à la détection
+LATE_LEAGUE_MAX_AGE = 300   # réponse arrivée après la deadline ou le /pause: resservie au scan suivant si < N s
+FETCH_RETRIES       = 2     # nouvelles tentatives (5xx, 429, réseau) avant abandon d'une ligue
+FETCH_BACKOFF       = 0.5   # backoff exponentiel à jitter complet: uniform(0, base × 2^n)...
+FETCH_BACKOFF_MAX   = 4.0   # ...plafonné à N secondes
+FETCH_HEDGE         = os.environ.get("FETCH_HEDGE", "0") == "1"   # requête doublée au-delà du p95 (coûte du quota)
+FETCH_HEDGE_MIN_SAMPLES = 20  # mesures de latence avant d'oser doubler
+BREAKER_THRESHOLD   = 3     # fetchs ratés d'affilée avant d'ouvrir le disjoncteur d'une ligue
+BREAKER_COOLDOWN    = 300   # ligue ignorée N s, doublé à chaque échec de l'essai...
+BREAKER_COOLDOWN_MAX = 3600  # ...jusqu'à N s
+ODDS_FEEDS          = [f for f in os.environ.get("ODDS_FEEDS", "").split(";") if f]  # sources en plus: nom=fichier ou URL ({sport_key})
+EXTRA_BOOKS         = [b for b in os.environ.get("EXTRA_BOOKS", "").split(",") if b]  # bookies apportés par ces sources
+TEAM_MATCH_CUTOFF   = 0.85  # similarité min (difflib) pour rattacher un nom d'équipe inconnu
+EVENT_MATCH_WINDOW  = 2 * 3600  # écart max de coup d'envoi d'un même match entre deux sources
+SNAPSHOT_STALE_AFTER = 6 * 3600  # cache de snapshots: purge des matchs sans date lisible
+LIVE_OPP_MAX_AGE    = 1800  # opp d'un scan précédent encore comptée dans le portefeuille si son match a été revu depuis < N s
+STAKE_SETTLE_AFTER  = 3 * 3600  # mises alertées tenues pour engagées jusqu'à N s après le coup d'envoi
+STAKE_MAX_SHARE     = 0.25  # part max du solde d'un bookie engagée sur une seule opp (répartition entre opps live)
+NEAR_ARB_MARGIN     = 0.5   # quasi-arb: profit dans [MIN_PROFIT_PCT - marge, MIN_PROFIT_PCT[
+MIDDLE_MAX_LOSS_PCT = 2.0   # middle: perte max tolérée si un seul des deux paris passe
+WATCH_ALERT_MIN_PCT = 0.0   # middle notifié (silencieux) si le pire cas est ≥ ce %
+
+TELEGRAM_QUEUE_SIZE = 200   # messages en attente max (au-delà: abandonnés)
+TELEGRAM_RATE       = 1.0   # msg/s par chat (limite Telegram)
+TELEGRAM_BURST      = 3     # rafale tolérée
+TELEGRAM_MAX_RETRIES = 5
+TELEGRAM_MAX_LEN    = 4096  # limite Telegram par message
+TELEGRAM_COALESCE   = True  # fusionne les alertes d'une même rafale en un message
+TELEGRAM_LONG_POLL  = 50    # secondes de long polling getUpdates
+
+ADAPTIVE_SCHEDULING = True  # False = toutes les ligues toutes les FLAT_POLL_INTERVAL s
+QUOTA_MONTHLY       = int(os.environ.get("QUOTA_MONTHLY", 10000))  # requêtes Odds API / mois
+QUOTA_RESET_DAY     = int(os.environ.get("QUOTA_RESET_DAY", 1))    # jour du mois où le quota repart
+QUOTA_RESERVE       = 200   # requêtes jamais planifiées (marge)
+REQUEST_COST        = len(ODDS_MARKETS) * len(ODDS_REGIONS)  # requêtes facturées par appel
+FLAT_POLL_INTERVAL  = POLL_INTERVAL * REQUEST_COST  # mode fixe: même conso de quota quel que soit le nombre de marchés
+MIN_SPORT_INTERVAL  = 300   # 5 min
+MAX_SPORT_INTERVAL  = 4 * 3600
+FETCH_RETRY_DELAY   = 120   # ligue due mais pas fetchée (deadline, /pause, échec): nouvel essai après N s
+KICKOFF_HORIZON_H   = 12    # urgence divisée par 2 quand le prochain match est à 12h
+OPP_RATE_WINDOW_DAYS = 14   # fenêtre du taux d'opps historique
+OPP_RATE_PRIOR      = 1.0   # opps/jour fictives: une ligue sans historique reste fetchée
+SIM_OPP_LIFETIME    = 1200  # simulation: durée de vie supposée d'une opp
+
+RECORD_PAYLOADS     = os.environ.get("RECORD_PAYLOADS", "0") == "1"  # garde les réponses brutes pour le replay
+RECORD_DIR          = "snapshots"
+
+WORKER_COUNT        = int(os.environ.get("WORKER_COUNT", 1))   # workers qui se partagent SPORTS
+WORKER_INDEX        = int(os.environ.get("WORKER_INDEX", 0))   # shard de ce worker (0..WORKER_COUNT-1)
+SHARED_STORE        = os.environ.get("SHARED_STORE", "")       # "" = local, chemin SQLite ou redis://host:6379/0
+SHARED_POLL         = 5     # secondes entre deux lectures de l'état partagé (pause, reprise)
+
+CHECKPOINT_FILE     = "scanner_checkpoint.json.gz" if WORKER_COUNT == 1 else f"scanner_checkpoint.{WORKER_INDEX}.json.gz"
+CHECKPOINT_INTERVAL = 60    # secondes min entre deux checkpoints (plus tôt après une commande)
+
+ODDS_HISTORY_FILE   = "odds_history.bin" if WORKER_COUNT == 1 else f"odds_history.{WORKER_INDEX}.bin"
+ODDS_HISTORY_SERIES = int(os.environ.get("ODDS_HISTORY_SERIES", 16384))  # séries (match×marché×bookie×outcome), 0 = off
+ODDS_HISTORY_TICKS  = 32    # changements de cote gardés par série
+
+METRICS_HOST        = "127.0.0.1"
+METRICS_PORT        = int(os.environ.get("METRICS_PORT", 9108))  # 0 = pas d'endpoint /metrics
 
 # ─────────────────────────────────────────────────────
 # 🏟️  BOOKMAKERS
 # ─────────────────────────────────────────────────────
 
-BOOKS = ["betfair_ex_eu", "william_hill", "bwin", "pinnacle"]
+BOOKS = ["betfair_ex_eu", "william_hill", "bwin", "pinnacle"] + EXTRA_BOOKS
 
 BOOK_LABELS = {
     "betfair_ex_eu": "📗 BETFAIR ⭐",
@@ -57,6 +179,21 @@ BOOK_LABELS = {
     "pinnacle":      "📕 PINNACLE",
 }
 
+MARKET_LABELS = {
+    "h2h":     "Vainqueur",
+    "totals":  "Total (over/under)",
+    "spreads": "Handicap",
+}
+
+# Solde, mise max par pari (None = sans limite) et incrément de mise de chaque
+# compte: l'allocation de portefeuille répartit ces soldes entre les opps live.
+BOOK_ACCOUNTS = {
+    "betfair_ex_eu": {"balance": BANKROLL / 4, "max_stake": None, "unit": 1.0},
+    "william_hill":  {"balance": BANKROLL / 4, "max_stake": 50.0, "unit": 1.0},
+    "bwin":          {"balance": BANKROLL / 4, "max_stake": 50.0, "unit": 1.0},
+    "pinnacle":      {"balance": BANKROLL / 4, "max_stake": None, "unit": 1.0},
+}
+
 SAFE_BOOKS  = ["betfair_ex_eu", "pinnacle"]  # Pinnacle ne flag pas non plus
 RISKY_BOOKS = ["william_hill", "bwin"]
 
@@ -79,6 +216,24 @@ SPORTS = {
     "soccer_scotland_premiership":          "⚽ Scottish Premier",
 }
 
+# Alias entre sources, en formes normalisées (minuscules, sans accents ni FC/CF...)
+TEAM_ALIASES = {
+    "man utd": "manchester united",
+    "man united": "manchester united",
+    "man city": "manchester city",
+    "psg": "paris saint germain",
+    "inter": "internazionale",
+    "inter milan": "internazionale",
+    "sporting cp": "sporting lisbon",
+    "psv": "psv eindhoven",
+    "wolves": "wolverhampton wanderers",
+    "ny red bulls": "new york red bulls",
+    "la galaxy": "los angeles galaxy",
+    "la lakers": "los angeles lakers",
+    "la clippers": "los angeles clippers",
+    "gs warriors": "golden state warriors",
+}
+
 # ─────────────────────────────────────────────────────
 # 🎮  ÉTAT GLOBAL
 # ─────────────────────────────────────────────────────
@@ -86,6 +241,7 @@ SPORTS = {
 state = {
     "paused": False,
     "last_update_id": 0,
+    "resume_epoch": None,  # compteur partagé de /resume déjà appliqué
 }
 
 session_stats = {
@@ -93,8 +249,14 @@ session_stats = {
     "api_calls": 0,
     "opps_found": 0,
     "best_profit_pct": 0.0,
+    "fetch_retries": 0,
+    "fetch_hedges": 0,
+    "hedge_losers": 0,
+    "api_errors": 0,
+    "breaker_skips": 0,
     "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
 }
+stats_lock = threading.Lock()  # les fetchs tournent dans des threads
 
 # ─────────────────────────────────────────────────────
 # 📝  LOGGING
@@ -111,11 +273,435 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
+# ─────────────────────────────────────────────────────
+# 🔌  SESSION HTTP (keep-alive partagé)
+# ─────────────────────────────────────────────────────
+
+def make_http_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+http = make_http_session(2 * FETCH_CONCURRENCY)   # marge pour les requêtes doublées
+
+
+# ─────────────────────────────────────────────────────
+# 🤝  COORDINATION MULTI-WORKER (store partagé)
+# ─────────────────────────────────────────────────────
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{WORKER_INDEX}"
+
+
+def shard_sports(sports: dict, index: int = WORKER_INDEX, count: int = WORKER_COUNT) -> dict:
+    # Round-robin sur les clés triées: indépendant de l'ordre de SPORTS
+    mine = set(sorted(sports)[index::count])
+    return {k: v for k, v in sports.items() if k in mine}
+
+
+MY_SPORTS = shard_sports(SPORTS)
+
+
+class SQLiteSharedStore:
+    # Clés/valeurs avec expiration dans un fichier SQLite (WAL), partagé par
+    # les process d'une même machine. ":memory:" pour un worker seul.
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value, ttl: float = None):
+        expires = time.time() + ttl if ttl else None
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO kv VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                (key, str(value), expires),
+            )
+
+    def claim(self, key: str, ttl: float, owner: str = None) -> bool:
+        # SET NX EX: vrai si la clé était libre ou expirée. Avec `owner`,
+        # vrai aussi si on la détient déjà (bail renouvelé).
+        now = time.time()
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT INTO kv VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires "
+                "WHERE kv.expires <= ? OR (? IS NOT NULL AND kv.value = excluded.value)",
+                (key, owner or "1", now + ttl, now, owner),
+            )
+            return cur.rowcount == 1
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO kv VALUES (?, ?, NULL) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(kv.value AS INTEGER) + ?",
+                (key, str(amount), amount),
+            )
+            return int(self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()[0])
+
+    def scan(self, prefix: str) -> dict:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires IS NULL OR expires > ?)",
+                (prefix, prefix + "\uffff", time.time()),
+            ).fetchall()
+        return {key[len(prefix):]: value for key, value in rows}
+
+    def ttls(self, prefix: str) -> dict:
+        # Secondes restantes des clés expirables d'un préfixe
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, expires FROM kv WHERE key >= ? AND key < ? AND expires > ?",
+                (prefix, prefix + "\uffff", now),
+            ).fetchall()
+        return {key[len(prefix):]: expires - now for key, expires in rows}
+
+    def purge(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+
+
+class RedisSharedStore:
+    # Même interface sur Redis ou un serveur compatible (Valkey, KeyDB,
+    # Dragonfly): nécessaire dès que les workers tournent sur des machines
+    # différentes. Les expirations sont gérées par le serveur.
+    def __init__(self, url: str, prefix: str = "arb:"):
+        if redis is None:
+            raise RuntimeError("SHARED_STORE=redis://… nécessite le paquet redis (pip install redis)")
+        self.r = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def get(self, key: str):
+        return self.r.get(self.prefix + key)
+
+    def set(self, key: str, value, ttl: float = None):
+        self.r.set(self.prefix + key, str(value), px=max(int(ttl * 1000), 1) if ttl else None)
+
+    def claim(self, key: str, ttl: float, owner: str = None) -> bool:
+        px = max(int(ttl * 1000), 1)
+        if self.r.set(self.prefix + key, owner or "1", nx=True, px=px):
+            return True
+        if owner is not None and self.r.get(self.prefix + key) == owner:
+            self.r.pexpire(self.prefix + key, px)
+            return True
+        return False
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self.r.incrby(self.prefix + key, amount)
+
+    def scan(self, prefix: str) -> dict:
+        keys = list(self.r.scan_iter(match=self.prefix + prefix + "*"))
+        if not keys:
+            return {}
+        start = len(self.prefix + prefix)
+        return {key[start:]: value for key, value in zip(keys, self.r.mget(keys)) if value is not None}
+
+    def ttls(self, prefix: str) -> dict:
+        keys = list(self.r.scan_iter(match=self.prefix + prefix + "*"))
+        pipe = self.r.pipeline()
+        for key in keys:
+            pipe.pttl(key)
+        start = len(self.prefix + prefix)
+        return {key[start:]: ms / 1000 for key, ms in zip(keys, pipe.execute()) if ms > 0}
+
+    def purge(self):
+        pass
+
+
+coordination = {"store": None}
+
+
+def open_shared_store(url: str = SHARED_STORE):
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedStore(url)
+    if not url:
+        url = "arb_shared.db" if WORKER_COUNT > 1 else ":memory:"
+    return SQLiteSharedStore(url[len("sqlite:"):] if url.startswith("sqlite:") else url)
+
+
+def shared_store():
+    if coordination["store"] is None:
+        coordination["store"] = open_shared_store()
+    return coordination["store"]
+
+
+def is_leader() -> bool:
+    # Le worker qui détient le bail de lecture des commandes Telegram fait
+    # aussi les rapports et la synchro du store d'analyse.
+    return WORKER_COUNT == 1 or shared_store().get("telegram_poller") == WORKER_ID
+
+
+# ─────────────────────────────────────────────────────
+# 📊  MÉTRIQUES (histogrammes + endpoint Prometheus)
+# ─────────────────────────────────────────────────────
+
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                  1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+METRIC_HELP = {
+    "arb_fetch_seconds": "Durée HTTP (requête → fin du flux) par sport",
+    "arb_fetch_ttfb_seconds": "Durée HTTP jusqu'aux en-têtes de réponse, par tentative",
+    "arb_event_match_seconds": "Rapprochement d'un match avec les sources secondaires",
+    "arb_json_decode_seconds": "Décodage JSON cumulé d'une réponse Odds API",
+    "arb_detect_seconds": "Détection d'arb sur un lot de matchs",
+    "arb_format_alert_seconds": "format_alert",
+    "arb_send_telegram_seconds": "Envoi HTTP d'un message Telegram",
+    "arb_detection_to_alert_seconds": "Détection → alerte Telegram envoyée",
+}
+
+metrics_lock = threading.Lock()
+histograms = {}                       # (nom, labels) → {"counts", "sum", "count"}
+quota_samples = deque(maxlen=512)     # (timestamp, requêtes restantes)
+
+
+def observe(name: str, value: float, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        hist = histograms.get(key)
+        if hist is None:
+            hist = histograms[key] = {"counts": [0] * (len(METRIC_BUCKETS) + 1), "sum": 0.0, "count": 0}
+        hist["counts"][bisect_left(METRIC_BUCKETS, value)] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+
+@contextmanager
+def timed(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def observed_count(name: str) -> int:
+    with metrics_lock:
+        return sum(hist["count"] for (hist_name, _), hist in histograms.items() if hist_name == name)
+
+
+def quantile(name: str, q: float, **labels):
+    # Quantile estimé par interpolation dans les buckets; sans labels, toutes
+    # les séries du même nom sont fusionnées. None si aucune mesure.
+    wanted = tuple(sorted(labels.items()))
+    counts = [0] * (len(METRIC_BUCKETS) + 1)
+    with metrics_lock:
+        for (hist_name, hist_labels), hist in histograms.items():
+            if hist_name == name and (not labels or hist_labels == wanted):
+                counts = [a + b for a, b in zip(counts, hist["counts"])]
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for i, n in enumerate(counts):
+        if cumulative + n >= rank and n:
+            if i == len(METRIC_BUCKETS):
+                return METRIC_BUCKETS[-1]
+            lower = METRIC_BUCKETS[i - 1] if i else 0.0
+            return lower + (METRIC_BUCKETS[i] - lower) * (rank - cumulative) / n
+        cumulative += n
+    return METRIC_BUCKETS[-1]
+
+
+def record_quota(remaining: int):
+    with metrics_lock:
+        quota_samples.append((time.time(), remaining))
+
+
+def quota_burn_per_hour(window: float = 3600):
+    # Requêtes consommées par heure sur la dernière fenêtre (None si < 2 mesures)
+    with metrics_lock:
+        recent = [s for s in quota_samples if s[0] >= time.time() - window]
+    if len(recent) < 2 or recent[-1][0] <= recent[0][0]:
+        return None
+    spent = max(recent[0][1] - recent[-1][1], 0)
+    return spent * 3600 / (recent[-1][0] - recent[0][0])
+
+
+def _prom_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_metrics() -> str:
+    lines = []
+    with metrics_lock:
+        series = sorted(histograms.items())
+    seen = set()
+    for (name, labels), hist in series:
+        if name not in seen:
+            seen.add(name)
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, n in zip(METRIC_BUCKETS, hist["counts"]):
+            cumulative += n
+            lines.append(f"{name}_bucket{_prom_labels(labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_prom_labels(labels, le='+Inf')} {hist['count']}")
+        lines.append(f"{name}_sum{_prom_labels(labels)} {hist['sum']:.6f}")
+        lines.append(f"{name}_count{_prom_labels(labels)} {hist['count']}")
+
+    gauges = [
+        ("arb_scans_total", "counter", session_stats["scans"]),
+        ("arb_api_calls_total", "counter", session_stats["api_calls"]),
+        ("arb_opps_found_total", "counter", session_stats["opps_found"]),
+        ("arb_best_profit_pct", "gauge", session_stats["best_profit_pct"]),
+        ("arb_fetch_retries_total", "counter", session_stats["fetch_retries"]),
+        ("arb_fetch_hedges_total", "counter", session_stats["fetch_hedges"]),
+        ("arb_fetch_hedge_losers_total", "counter", session_stats["hedge_losers"]),
+        ("arb_api_errors_total", "counter", session_stats["api_errors"]),
+        ("arb_breaker_skips_total", "counter", session_stats["breaker_skips"]),
+        ("arb_breakers_open", "gauge", sum(1 for k in breakers if breaker_state(k) == "open")),
+        ("arb_paused", "gauge", int(state["paused"])),
+    ]
+    if quota["remaining"] is not None:
+        gauges.append(("arb_quota_remaining", "gauge", quota["remaining"]))
+    burn = quota_burn_per_hour()
+    if burn is not None:
+        gauges.append(("arb_quota_burn_per_hour", "gauge", round(burn, 3)))
+    for name, kind, value in gauges:
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if urlsplit(self.path).path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((METRICS_HOST, port), MetricsHandler)
+    except OSError as e:
+        log.error(f"Endpoint métriques indisponible sur :{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    log.info(f"📊 Métriques Prometheus sur http://{METRICS_HOST}:{port}/metrics")
+    return server
+
+
+def _ms(seconds) -> str:
+    return "?" if seconds is None else f"{seconds * 1000:.0f}"
+
+
 # ─────────────────────────────────────────────────────
 # 📱  TELEGRAM — ENVOI
 # ─────────────────────────────────────────────────────
 
-def send_telegram(message: str, silent: bool = False):
+telegram_http = make_http_session(2)
+telegram_queue = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+telegram_bucket = {"tokens": float(TELEGRAM_BURST), "updated": time.monotonic()}
+telegram_worker = {"thread": None}
+telegram_worker_lock = threading.Lock()
+COALESCE_SEPARATOR = "\n\n"
+
+
+def send_telegram(message: str, silent: bool = False, coalesce: bool = False, detected: float = None):
+    # Non bloquant: le message part dans la file, le thread d'envoi s'occupe
+    # du rate limit et des retries. `coalesce` = peut être fusionné avec
+    # les alertes suivantes déjà en file. `detected` (perf_counter) mesure
+    # la latence détection → alerte.
+    _ensure_telegram_worker()
+    try:
+        telegram_queue.put_nowait((message, silent, coalesce, detected))
+    except queue.Full:
+        log.warning(f"Telegram: file pleine ({TELEGRAM_QUEUE_SIZE}), message abandonné")
+
+
+def flush_telegram(timeout: float = 10):
+    deadline = time.time() + timeout
+    while telegram_queue.unfinished_tasks and time.time() < deadline:
+        time.sleep(0.1)
+
+
+def _ensure_telegram_worker():
+    with telegram_worker_lock:
+        if telegram_worker["thread"] is None:
+            thread = threading.Thread(target=_telegram_sender, name="telegram-sender", daemon=True)
+            thread.start()
+            telegram_worker["thread"] = thread
+
+
+def _take_telegram_token():
+    # Token bucket: TELEGRAM_RATE msg/s par chat, rafale de TELEGRAM_BURST
+    while True:
+        now = time.monotonic()
+        telegram_bucket["tokens"] = min(
+            TELEGRAM_BURST,
+            telegram_bucket["tokens"] + (now - telegram_bucket["updated"]) * TELEGRAM_RATE,
+        )
+        telegram_bucket["updated"] = now
+        if telegram_bucket["tokens"] >= 1:
+            telegram_bucket["tokens"] -= 1
+            return
+        time.sleep((1 - telegram_bucket["tokens"]) / TELEGRAM_RATE)
+
+
+def _telegram_sender():
+    carry = None
+    while True:
+        message, silent, coalesce, detected = carry or telegram_queue.get()
+        carry = None
+        batch = 1
+        detections = [detected] if detected is not None else []
+        _take_telegram_token()
+
+        # Pendant l'attente du token d'autres alertes ont pu arriver:
+        # on les colle au message tant qu'on reste sous la limite Telegram.
+        while coalesce and TELEGRAM_COALESCE:
+            try:
+                item = telegram_queue.get_nowait()
+            except queue.Empty:
+                break
+            if (item[2] and item[1] == silent
+                    and len(message) + len(COALESCE_SEPARATOR) + len(item[0]) <= TELEGRAM_MAX_LEN):
+                message += COALESCE_SEPARATOR + item[0]
+                batch += 1
+                if item[3] is not None:
+                    detections.append(item[3])
+            else:
+                carry = item
+                break
+
+        if _post_telegram(message, silent):
+            sent_at = time.perf_counter()
+            for t in detections:
+                observe("arb_detection_to_alert_seconds", sent_at - t)
+        for _ in range(batch):
+            telegram_queue.task_done()
+
+
+def _post_telegram(message: str, silent: bool):
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {
         "chat_id": TELEGRAM_CHAT_ID,
@@ -123,78 +709,192 @@ def send_telegram(message: str, silent: bool = False):
         "parse_mode": "HTML",
         "disable_notification": silent,
     }
-    try:
-        r = requests.post(url, json=payload, timeout=5)
-        r.raise_for_status()
-    except Exception as e:
-        log.error(f"Telegram send error: {e}")
+    for attempt in range(TELEGRAM_MAX_RETRIES):
+        try:
+            with timed("arb_send_telegram_seconds"):
+                r = telegram_http.post(url, json=payload, timeout=5)
+            if r.status_code == 429:
+                try:
+                    retry_after = r.json().get("parameters", {}).get("retry_after", 1)
+                except ValueError:
+                    retry_after = 1
+                log.warning(f"Telegram 429: retry dans {retry_after}s")
+                time.sleep(retry_after)
+                continue
+            if 400 <= r.status_code < 500:
+                log.error(f"Telegram send error: {r.status_code} {r.text[:200]}")
+                return False
+            r.raise_for_status()
+            return True
+        except Exception as e:
+            if attempt == TELEGRAM_MAX_RETRIES - 1:
+                log.error(f"Telegram send error: {e}")
+                return False
+            time.sleep(min(2 ** attempt, 30))
+    log.error(f"Telegram: abandon après {TELEGRAM_MAX_RETRIES} tentatives")
+    return False
 
 
 # ─────────────────────────────────────────────────────
 # 📱  TELEGRAM — COMMANDES
 # ─────────────────────────────────────────────────────
 
-def check_telegram_commands():
+command_http = make_http_session(1)
+state_lock = threading.Lock()
+wake_event = threading.Event()  # réveille la boucle de scan (/resume, /pause)
+
+
+def handle_command(text: str):
+    if text == "/pause":
+        with state_lock:
+            already = state["paused"]
+            state["paused"] = True
+        shared_store().set("paused", "1")
+        if already:
+            send_telegram("⏸ Scanner déjà en pause.")
+        else:
+            wake_event.set()
+            send_telegram(
+                "⏸ <b>Scanner mis en pause.</b>\n"
+                "Aucune requête API consommée.\n"
+                "Envoie /resume pour reprendre."
+            )
+    elif text == "/resume":
+        with state_lock:
+            was_paused = state["paused"]
+            state["paused"] = False
+        shared_store().set("paused", "0")
+        if not was_paused:
+            send_telegram("▶️ Scanner déjà actif.")
+        else:
+            for entry in sport_schedule.values():
+                entry["next_fetch"] = 0.0
+            shared_store().incr("resume_epoch")
+            wake_event.set()
+            send_telegram(
+                "▶️ <b>Scanner repris!</b>\n"
+                "Scan lancé immédiatement."
+            )
+    elif text == "/stats":
+        send_stats_update()
+    elif text == "/watch":
+        with watch_lock:
+            entries = list(watchlist.values())
+        entries = sorted(entries, key=lambda e: e["profit_pct"], reverse=True)[:10]
+        if entries:
+            send_telegram("\n\n".join(format_watch(e) for e in entries), silent=True)
+        else:
+            send_telegram("👀 Watchlist vide.", silent=True)
+    elif text == "/help":
+        send_telegram(
+            "🤖 <b>Commandes disponibles:</b>\n\n"
+            "⏸ /pause — Met le scanner en pause\n"
+            "▶️ /resume — Reprend le scanner\n"
+            "📊 /stats — Rapport de session\n"
+            "👀 /watch — Middles & quasi-arbs en cours\n"
+            "❓ /help — Affiche ce message\n\n"
+            "💡 <b>Tips anti-flag:</b>\n"
+            "• Varie tes mises de ±1-2€\n"
+            "• Mise quelques heures avant le match\n"
+            "• /pause la nuit pour économiser l'API"
+        )
+
+
+def check_telegram_commands(timeout: int = TELEGRAM_LONG_POLL):
+    # L'offset vit dans le store partagé: le worker qui reprend le bail
+    # repart du dernier update traité, sans rejouer de commande.
+    offset = shared_store().get("telegram_offset")
+    if offset is not None:
+        state["last_update_id"] = max(state["last_update_id"], int(offset))
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/getUpdates"
     params = {
         "offset": state["last_update_id"] + 1,
-        "timeout": 1,
+        "timeout": timeout,
         "allowed_updates": ["message"],
     }
-    try:
-        r = requests.get(url, params=params, timeout=5)
-        r.raise_for_status()
-        updates = r.json().get("result", [])
+    r = command_http.get(url, params=params, timeout=timeout + 10)
+    r.raise_for_status()
+    updates = r.json().get("result", [])
 
-        for update in updates:
-            state["last_update_id"] = update["update_id"]
-            msg = update.get("message", {})
-            text = msg.get("text", "").strip().lower()
-            chat_id = str(msg.get("chat", {}).get("id", ""))
+    for update in updates:
+        state["last_update_id"] = update["update_id"]
+        shared_store().set("telegram_offset", update["update_id"])
+        checkpoint["dirty"] = True
+        msg = update.get("message", {})
+        text = msg.get("text", "").strip().lower()
+        chat_id = str(msg.get("chat", {}).get("id", ""))
 
-            if chat_id != str(TELEGRAM_CHAT_ID):
+        if chat_id != str(TELEGRAM_CHAT_ID):
+            continue
+        handle_command(text)
+
+
+def _command_listener():
+    # Long polling: getUpdates bloque côté Telegram jusqu'à un message
+    # (ou TELEGRAM_LONG_POLL s), donc une commande est traitée dès réception.
+    # Un seul worker à la fois détient le bail (Telegram refuse deux
+    # getUpdates concurrents); un autre le reprend s'il expire.
+    while True:
+        try:
+            if not shared_store().claim("telegram_poller", TELEGRAM_LONG_POLL + 30, owner=WORKER_ID):
+                time.sleep(SHARED_POLL)
                 continue
+            check_telegram_commands()
+        except Exception as e:
+            log.error(f"Telegram getUpdates error: {e}")
+            time.sleep(5)
 
-            if text == "/pause":
-                if state["paused"]:
-                    send_telegram("⏸ Scanner déjà en pause.")
-                else:
-                    state["paused"] = True
-                    send_telegram(
-                        "⏸ <b>Scanner mis en pause.</b>\n"
-                        "Aucune requête API consommée.\n"
-                        "Envoie /resume pour reprendre."
-                    )
-            elif text == "/resume":
-                if not state["paused"]:
-                    send_telegram("▶️ Scanner déjà actif.")
-                else:
-                    state["paused"] = False
-                    send_telegram(
-                        f"▶️ <b>Scanner repris!</b>\n"
-                        f"Prochain scan dans ~{POLL_INTERVAL // 60} min."
-                    )
-            elif text == "/stats":
-                send_stats_update()
-            elif text == "/help":
-                send_telegram(
-                    "🤖 <b>Commandes disponibles:</b>\n\n"
-                    "⏸ /pause — Met le scanner en pause\n"
-                    "▶️ /resume — Reprend le scanner\n"
-                    "📊 /stats — Rapport de session\n"
-                    "❓ /help — Affiche ce message\n\n"
-                    "💡 <b>Tips anti-flag:</b>\n"
-                    "• Varie tes mises de ±1-2€\n"
-                    "• Mise quelques heures avant le match\n"
-                    "• /pause la nuit pour économiser l'API"
-                )
-    except Exception as e:
-        log.error(f"Telegram getUpdates error: {e}")
+
+def sync_shared_state() -> bool:
+    # Pause / reprise décidées par le worker qui lit les commandes.
+    # Vrai si l'état a changé depuis la dernière lecture.
+    store = shared_store()
+    paused = store.get("paused") == "1"
+    epoch = store.get("resume_epoch")
+    with state_lock:
+        changed = paused != state["paused"]
+        resumed = epoch != state.get("resume_epoch")
+        state["paused"] = paused
+        state["resume_epoch"] = epoch
+    if resumed:
+        for sport_key in MY_SPORTS:
+            sport_schedule[sport_key]["next_fetch"] = 0.0
+    return changed or resumed
 
 
-def send_startup_message():
+def wait_for_wakeup(timeout: float):
+    # Attend l'échéance, un /pause|/resume reçu ici (wake_event) ou par un
+    # autre worker (store partagé, relu toutes les SHARED_POLL s).
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or wake_event.wait(min(remaining, SHARED_POLL)):
+            return
+        if sync_shared_state():
+            return
+        maybe_checkpoint()
+
+
+def start_command_listener():
+    thread = threading.Thread(target=_command_listener, name="telegram-commands", daemon=True)
+    thread.start()
+    return thread
+
+
+def send_startup_message(restored: dict = None):
     mode = "📄 PAPER TRADING" if PAPER_TRADING else "💰 LIVE BETTING"
-    sports_list = "\n".join(f"   {v}" for v in SPORTS.values())
+    resumed = ""
+    if restored:
+        resumed = (
+            f"♻️ Reprise du checkpoint ({int(restored['age'])}s): "
+            f"{restored['fresh']}/{len(MY_SPORTS)} ligues encore fraîches\n"
+        )
+    sports_list = "\n".join(f"   {v}" for v in MY_SPORTS.values())
+    worker = f"Worker: <b>{WORKER_INDEX + 1}/{WORKER_COUNT}</b>\n" if WORKER_COUNT > 1 else ""
+    if ADAPTIVE_SCHEDULING:
+        interval = f"adaptatif {MIN_SPORT_INTERVAL // 60}–{MAX_SPORT_INTERVAL // 60} min"
+    else:
+        interval = f"{FLAT_POLL_INTERVAL // 60} min"
     send_telegram(
         f"🚀 <b>Arb Scanner v9 démarré</b>\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
@@ -206,10 +906,12 @@ def send_startup_message():
         f"   📕 Pinnacle (safe)\n"
         f"Min profit: <b>{MIN_PROFIT_PCT}%</b>\n"
         f"Bankroll: <b>${BANKROLL}</b>\n"
-        f"Interval: <b>{POLL_INTERVAL // 60} min</b>\n"
+        f"Interval: <b>{interval}</b>\n"
+        f"{worker}"
+        f"{resumed}"
         f"Sports:\n{sports_list}\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
-        f"💬 /pause /resume /stats /help\n"
+        f"💬 /pause /resume /stats /watch /help\n"
         f"💡 <i>Pense à /pause la nuit!</i>"
     )
 
@@ -219,6 +921,16 @@ def send_stats_update():
     hours = elapsed.seconds // 3600
     minutes = (elapsed.seconds % 3600) // 60
     status = "⏸ EN PAUSE" if state["paused"] else "▶️ ACTIF"
+    burn = quota_burn_per_hour()
+    burn_str = "?" if burn is None else f"{burn:.1f}"
+    cluster = ""
+    if WORKER_COUNT > 1:
+        store = shared_store()
+        cluster = (
+            f"🤝 Cluster ({WORKER_COUNT} workers, cumul): {store.get('stats:api_calls') or 0} appels API | "
+            f"{store.get('stats:opps_found') or 0} opps\n"
+        )
+    open_breakers = ", ".join(SPORTS.get(k, k) for k in breakers if breaker_state(k) == "open")
     send_telegram(
         f"📊 <b>Rapport session</b>\n"
         f"━━━━━━━━━━━━━━━━━━━━\n"
@@ -227,7 +939,18 @@ def send_stats_update():
         f"🔍 Scans: {session_stats['scans']}\n"
         f"📡 Appels API: {session_stats['api_calls']}\n"
         f"🎯 Opps trouvées: {session_stats['opps_found']}\n"
-        f"🏆 Meilleur profit: <b>{session_stats['best_profit_pct']}%</b>",
+        f"🏆 Meilleur profit: <b>{session_stats['best_profit_pct']}%</b>\n"
+        f"{cluster}"
+        f"━━━━━━━━━━━━━━━━━━━━\n"
+        f"🌐 Fetch p50/p95/p99: {_ms(quantile('arb_fetch_seconds', 0.5))}/"
+        f"{_ms(quantile('arb_fetch_seconds', 0.95))}/{_ms(quantile('arb_fetch_seconds', 0.99))} ms\n"
+        f"🛡 Erreurs API: {session_stats['api_errors']} | retries: {session_stats['fetch_retries']} | "
+        f"doublées: {session_stats['fetch_hedges']} ({session_stats['hedge_losers']} perdantes) | "
+        f"disjoncteurs ouverts: {open_breakers or 'aucun'}\n"
+        f"🔍 Détection p95: {_ms(quantile('arb_detect_seconds', 0.95))} ms\n"
+        f"📨 Détection→alerte p50/p95: {_ms(quantile('arb_detection_to_alert_seconds', 0.5))}/"
+        f"{_ms(quantile('arb_detection_to_alert_seconds', 0.95))} ms\n"
+        f"🔥 Quota: {burn_str} req/h | reste {quota['remaining'] if quota['remaining'] is not None else '?'}",
         silent=True,
     )
 
@@ -236,323 +959,3644 @@ def send_stats_update():
 # 🌐  ODDS API
 # ─────────────────────────────────────────────────────
 
-def fetch_odds(sport_key: str) -> list:
-    url = f"https://api.the-odds-api.com/v4/sports/{sport_key}/odds"
-    params = {
-        "apiKey": ODDS_API_KEY,
-        "regions": "eu",
-        "markets": "h2h",
-        "oddsFormat": "decimal",
-        "bookmakers": ",".join(BOOKS),
-    }
-    try:
-        r = requests.get(url, params=params, timeout=10)
-        remaining = r.headers.get("x-requests-remaining", "?")
-        used = r.headers.get("x-requests-used", "?")
-        log.info(f"[{sport_key}] ✓ used: {used} | remaining: {remaining}")
-        session_stats["api_calls"] += 1
+_json_decoder = json.JSONDecoder()
 
-        if remaining != "?" and int(remaining) < 500:
-            send_telegram(
-                f"⚠️ <b>Quota API bas!</b>\n"
-                f"Seulement <b>{remaining}</b> requêtes restantes.\n"
-                f"Envoie /pause pour économiser."
-            )
 
-        r.raise_for_status()
-        return r.json()
-    except Exception as e:
-        log.error(f"Odds API error [{sport_key}]: {e}")
-        return []
+def iter_json_array(chunks, stats: dict = None):
+    # Décode un tableau JSON élément par élément depuis des morceaux de
+    # texte: seul l'élément en cours (et le reste du morceau) est en mémoire.
+    # `stats["decode"]` cumule le temps passé dans le décodeur.
+    buf = ""
+    pos = 0
+    started = False
+    for chunk in chunks:
+        buf = buf[pos:] + chunk
+        pos = 0
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"tableau JSON attendu, reçu {buf[pos:pos + 40]!r}")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            t = time.perf_counter()
+            try:
+                item, end = _json_decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # élément incomplet: attendre le morceau suivant
+            finally:
+                if stats is not None:
+                    stats["decode"] = stats.get("decode", 0.0) + time.perf_counter() - t
+            if buf[pos] not in '{["' and (end == len(buf) or buf[end] not in " \t\r\n,]"):
+                break  # nombre ou littéral peut-être coupé (12|345, 2.|5): attendre la suite
+            pos = end
+            yield item
+    raise ValueError("flux JSON tronqué")
 
 
-# ─────────────────────────────────────────────────────
-# 🔍  DÉTECTION D'ARB
-# ─────────────────────────────────────────────────────
+def _keep_game(raw: dict, now_utc: datetime, min_books: int = 2) -> bool:
+    # Filtres précoces, avant toute construction du modèle. min_books=0 quand
+    # d'autres sources peuvent encore ajouter des bookies au match.
+    commence = _parse_commence(raw.get("commence_time", ""))
+    if commence is not None and commence <= now_utc:
+        return False
+    return sum(1 for bm in raw.get("bookmakers", ()) if bm.get("key") in BOOKS) >= min_books
 
-def find_arb_opportunities(game: dict, sport_label: str) -> list:
-    home = game.get("home_team", "Home")
-    away = game.get("away_team", "Away")
-    commence_raw = game.get("commence_time", "")
 
-    # Filtre pré-match
-    try:
-        commence_dt = datetime.fromisoformat(commence_raw.replace("Z", "+00:00"))
-        now_utc = datetime.now(timezone.utc)
-        if commence_dt <= now_utc:
-            return []
-        commence_str = commence_dt.strftime("%d/%m %H:%M UTC")
-        delta = commence_dt - now_utc
-        hours_left = int(delta.total_seconds() // 3600)
-        mins_left = int((delta.total_seconds() % 3600) // 60)
-        time_left = f"{hours_left}h {mins_left}m"
-    except Exception:
-        commence_str = commence_raw
-        time_left = "?"
+# Résilience: chaque ligue a son disjoncteur. Après BREAKER_THRESHOLD fetchs
+# ratés d'affilée il s'ouvre et la ligue est ignorée sans requête; une fois
+# le délai écoulé, un seul essai passe (semi-ouvert): succès → refermé,
+# échec → rouvert pour un délai doublé.
+breakers = {}   # sport_key → {"failures", "open_until"}
+breaker_lock = threading.Lock()
+hedge_pool = ThreadPoolExecutor(max_workers=2 * FETCH_CONCURRENCY, thread_name_prefix="hedge")
 
-    # Collecter cotes par bookie
-    bookie_odds = {}
-    for bookmaker in game.get("bookmakers", []):
-        bookie_key = bookmaker["key"]
-        if bookie_key not in BOOKS:
-            continue
-        for market in bookmaker.get("markets", []):
-            if market["key"] != "h2h":
-                continue
-            odds_map = {o["name"]: o["price"] for o in market.get("outcomes", [])}
-            if odds_map:
-                bookie_odds[bookie_key] = odds_map
 
-    if len(bookie_odds) < 2:
-        return []
+def breaker_state(sport_key: str, now: float = None) -> str:
+    entry = breakers.get(sport_key)
+    if entry is None or entry["failures"] < BREAKER_THRESHOLD:
+        return "closed"
+    return "open" if (now or time.time()) < entry["open_until"] else "half-open"
 
-    all_outcomes = set()
-    for odds in bookie_odds.values():
-        all_outcomes.update(odds.keys())
 
-    if len(all_outcomes) < 2:
-        return []
+def _breaker_cooldown(failures: int) -> float:
+    return min(BREAKER_COOLDOWN * 2 ** (failures - BREAKER_THRESHOLD), BREAKER_COOLDOWN_MAX)
 
-    # Pour chaque outcome → meilleure cote et son bookie
-    best = {}
-    all_odds_by_outcome = {}
 
-    for outcome in all_outcomes:
-        all_odds_by_outcome[outcome] = {}
-        best_price = 0
-        best_bookie = None
+def breaker_allow(sport_key: str) -> bool:
+    with breaker_lock:
+        current = breaker_state(sport_key)
+        if current == "half-open":
+            # L'essai réserve le créneau: aucun autre fetch tant qu'il est en vol
+            entry = breakers[sport_key]
+            entry["open_until"] = time.time() + _breaker_cooldown(entry["failures"])
+        return current != "open"
 
-        for bookie, odds in bookie_odds.items():
-            price = odds.get(outcome)
-            if price:
-                all_odds_by_outcome[outcome][bookie] = price
-                if price > best_price:
-                    best_price = price
-                    best_bookie = bookie
 
-        if best_bookie:
-            best[outcome] = {"odd": best_price, "bookie": best_bookie}
+def breaker_record(sport_key: str, ok: bool):
+    with breaker_lock:
+        entry = breakers.setdefault(sport_key, {"failures": 0, "open_until": 0.0})
+        if ok:
+            if entry["failures"] >= BREAKER_THRESHOLD:
+                log.info(f"[{sport_key}] 🔌 Disjoncteur refermé")
+            entry.update(failures=0, open_until=0.0)
+            return
+        entry["failures"] += 1
+        if entry["failures"] >= BREAKER_THRESHOLD:
+            cooldown = _breaker_cooldown(entry["failures"])
+            entry["open_until"] = time.time() + cooldown
+            log.warning(f"[{sport_key}] 🔌 Disjoncteur ouvert: {entry['failures']} échecs, ligue ignorée {cooldown:.0f}s")
 
-    if len(best) < 2:
-        return []
 
-    total_prob = sum(1 / v["odd"] for v in best.values())
-    if total_prob >= 1.0:
-        return []
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return isinstance(e, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
 
-    profit_pct = (1 / total_prob - 1) * 100
-    if profit_pct < MIN_PROFIT_PCT:
-        return []
 
-    sides = []
-    risky_involved = []
-
-    for team_name, info in best.items():
-        prob = 1 / info["odd"]
-        stake = round((BANKROLL * prob) / total_prob, 2)
-        if info["bookie"] in RISKY_BOOKS:
-            risky_involved.append(BOOK_LABELS.get(info["bookie"], info["bookie"]))
-        sides.append({
-            "team": team_name,
-            "odd": info["odd"],
-            "bookie": info["bookie"],
-            "stake": stake,
-            "all_odds": all_odds_by_outcome.get(team_name, {}),
-            "is_safe": info["bookie"] in SAFE_BOOKS,
-        })
+def _describe_error(e: Exception) -> str:
+    # Sans l'URL: elle contient la clé API
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return f"HTTP {e.response.status_code}"
+    if isinstance(e, requests.RequestException):
+        return type(e).__name__
+    return str(e)
 
-    return [{
-        "sport": sport_label,
-        "home": home,
-        "away": away,
-        "commence": commence_str,
-        "time_left": time_left,
-        "sides": sides,
-        "profit_pct": round(profit_pct, 2),
-        "profit": round(BANKROLL * (1 / total_prob - 1), 2),
-        "risky_involved": risky_involved,
-        "detected_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    }]
 
+def _account_response(sport_key: str, r: requests.Response):
+    # Réponse 2xx retenue: seule à compter comme appel et à mettre le quota à jour
+    remaining = r.headers.get("x-requests-remaining", "?")
+    used = r.headers.get("x-requests-used", "?")
+    log.info(f"[{sport_key}] ✓ used: {used} | remaining: {remaining}")
+    with stats_lock:
+        session_stats["api_calls"] += 1
+        if remaining != "?":
+            quota["remaining"] = int(remaining)
+    shared_store().incr("stats:api_calls")
+    if remaining != "?":
+        record_quota(int(remaining))
+        shared_store().set("quota_remaining", int(remaining), ttl=2 * MAX_SPORT_INTERVAL)
 
-# ─────────────────────────────────────────────────────
-# 💬  FORMAT ALERTE
-# ─────────────────────────────────────────────────────
+    if remaining != "?" and int(remaining) < 500:
+        send_telegram(
+            f"⚠️ <b>Quota API bas!</b>\n"
+            f"Seulement <b>{remaining}</b> requêtes restantes.\n"
+            f"Envoie /pause pour économiser."
+        )
 
-def format_alert(opp: dict) -> str:
-    mode_tag = "📄 PAPER" if PAPER_TRADING else "💰 LIVE"
-    p = opp["profit_pct"]
-    profit_emoji = "🤑" if p >= 5 else "💰" if p >= 3 else "✅" if p >= 2 else "⚡" if p >= 1 else "🔹"
 
-    msg = (
-        f"{profit_emoji} <b>ARB DETECTED [{mode_tag}] — {opp['sport']}</b>\n"
-        f"<b>{opp['away']} @ {opp['home']}</b>\n"
-        f"🕐 {opp['commence']} (<b>{opp['time_left']} restant</b>)\n"
-        f"━━━━━━━━━━━━━━━━━━━━\n"
-    )
+def _request_odds(sport_key: str, url: str, params: dict) -> requests.Response:
+    # Une tentative: réponse rendue dès ses en-têtes (corps non lu). Une
+    # réponse d'erreur est comptée à part (api_errors) et levée; le
+    # décompte du quota attend de savoir quelle réponse est retenue.
+    start = time.perf_counter()
+    r = http.get(url, params=params, timeout=10, stream=True)
+    observe("arb_fetch_ttfb_seconds", time.perf_counter() - start, sport=sport_key)
+    try:
+        r.raise_for_status()
+    except requests.HTTPError:
+        r.close()
+        with stats_lock:
+            session_stats["api_errors"] += 1
+        raise
+    return r
 
-    for side in opp["sides"]:
-        label = BOOK_LABELS.get(side["bookie"], side["bookie"].upper())
-        others = ", ".join(
-            f"{BOOK_LABELS.get(bk, bk).split()[-1]}: {odd}"
-            for bk, odd in side["all_odds"].items()
-            if bk != side["bookie"]
-        )
-        msg += f"{label}\n"
-        msg += f"   {side['team']} @ <b>{side['odd']}</b> ← meilleure\n"
-        if others:
-            msg += f"   (autres: {others})\n"
-        msg += f"   Mise: <b>${side['stake']}</b>\n\n"
 
-    msg += (
-        f"━━━━━━━━━━━━━━━━━━━━\n"
-        f"{profit_emoji} Profit garanti: <b>${opp['profit']}</b> (<b>{opp['profit_pct']}%</b>)\n"
-        f"   Sur bankroll de ${BANKROLL}\n"
-        f"⏱ Détecté: {opp['detected_at']}\n"
-    )
+def hedge_delay():
+    # Attente avant de doubler une requête: p95 des temps de réponse vus
+    # jusqu'ici, toutes ligues confondues. None = pas de doublage.
+    if not FETCH_HEDGE or observed_count("arb_fetch_ttfb_seconds") < FETCH_HEDGE_MIN_SAMPLES:
+        return None
+    if quota["remaining"] is not None and quota["remaining"] < QUOTA_RESERVE:
+        return None
+    return quantile("arb_fetch_ttfb_seconds", 0.95)
 
-    if opp["risky_involved"] and not PAPER_TRADING:
-        risky_str = ", ".join(opp["risky_involved"])
-        msg += f"\n⚠️ <b>Anti-flag:</b> varie ta mise ±1-2€ sur {risky_str}"
-    elif PAPER_TRADING:
-        msg += "\n📄 <i>Paper trade — aucun vrai pari placé</i>"
 
-    return msg
+def _drop_hedge_loser(sport_key: str, future):
+    # Réponse valide arrivée après la gagnante: fermée sans lire le corps,
+    # comptée à part (elle a coûté du quota mais n'apporte rien)
+    if future.cancelled() or future.exception() is not None:
+        return
+    future.result().close()
+    with stats_lock:
+        session_stats["hedge_losers"] += 1
+    log.info(f"[{sport_key}] ✂ Requête doublée perdante fermée")
 
 
-# ─────────────────────────────────────────────────────
-# 💾  LOG
-# ─────────────────────────────────────────────────────
+def _open_odds(sport_key: str, url: str, params: dict) -> requests.Response:
+    # Sans réponse au bout du p95, une seconde requête identique part: la
+    # première réponse valide gagne, l'autre est fermée à son arrivée.
+    delay = hedge_delay()
+    if delay is None:
+        r = _request_odds(sport_key, url, params)
+        _account_response(sport_key, r)
+        return r
+    futures = [hedge_pool.submit(_request_odds, sport_key, url, params)]
+    if not wait(futures, timeout=delay).done:
+        log.info(f"[{sport_key}] 🐢 Pas de réponse après {delay * 1000:.0f} ms (p95): requête doublée")
+        with stats_lock:
+            session_stats["fetch_hedges"] += 1
+        futures.append(hedge_pool.submit(_request_odds, sport_key, url, params))
+    pending = set(futures)
+    winner = error = None
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+            elif winner is None:
+                winner = future.result()
+            else:
+                _drop_hedge_loser(sport_key, future)
+    for future in pending:
+        future.add_done_callback(lambda f: _drop_hedge_loser(sport_key, f))
+    if winner is None:
+        raise error
+    _account_response(sport_key, winner)
+    return winner
 
-def log_opportunity(opp: dict):
-    log_path = Path(LOG_FILE)
-    existing = []
-    if log_path.exists():
-        try:
-            with open(log_path, "r") as f:
-                existing = json.load(f)
-        except Exception:
-            existing = []
-    existing.append(opp)
-    with open(log_path, "w") as f:
-        json.dump(existing, f, indent=2, ensure_ascii=False)
+
+def iter_odds(sport_key: str, recorded: list = None, stop: threading.Event = None, status: dict = None,
+              min_books: int = 2):
+    # Matchs bruts d'une ligue, rendus un par un pendant la lecture du
+    # corps HTTP. `recorded` reçoit tous les matchs avant filtrage (replay),
+    # `status["ok"]` dit si la ligue a été lue jusqu'au bout. Les erreurs
+    # transitoires sont retentées tant qu'aucun match n'a été rendu: après,
+    # les matchs déjà détectés sont gardés et la ligue est en échec.
+    if status is None:
+        status = {}
+    status["ok"] = False
+    if not breaker_allow(sport_key):
+        with stats_lock:
+            session_stats["breaker_skips"] += 1
+        log.info(f"[{sport_key}] 🔌 Disjoncteur ouvert: ligue ignorée")
+        return
+    url = f"{ODDS_API_BASE}/v4/sports/{sport_key}/odds"
+    params = {
+        "apiKey": ODDS_API_KEY,
+        "regions": ",".join(ODDS_REGIONS),
+        "markets": ",".join(ODDS_MARKETS),
+        "oddsFormat": "decimal",
+        "bookmakers": ",".join(b for b in BOOKS if b not in EXTRA_BOOKS),
+    }
+    start = time.perf_counter()
+    stats = {}
+    yielded = False
+    attempt = 0
+    try:
+        while True:
+            if stop is not None and stop.is_set():
+                return  # scan abandonné avant la requête: pas de quota dépensé
+            try:
+                with _open_odds(sport_key, url, params) as r:
+                    now_utc = datetime.now(timezone.utc)
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                    chunks = (decoder.decode(chunk) for chunk in r.iter_content(STREAM_CHUNK_SIZE))
+                    for raw in iter_json_array(chunks, stats):
+                        if recorded is not None:
+                            recorded.append(raw)
+                        if _keep_game(raw, now_utc, min_books):
+                            yielded = True
+                            yield raw
+                break
+            except Exception as e:
+                if yielded or attempt >= FETCH_RETRIES or not _retryable(e):
+                    raise
+                delay = random.uniform(0, min(FETCH_BACKOFF * 2 ** attempt, FETCH_BACKOFF_MAX))
+                attempt += 1
+                log.warning(f"[{sport_key}] ↻ {_describe_error(e)} — tentative {attempt + 1}/{FETCH_RETRIES + 1} dans {delay:.1f}s")
+                with stats_lock:
+                    session_stats["fetch_retries"] += 1
+                if stop is not None and stop.wait(delay):
+                    return
+                if stop is None:
+                    time.sleep(delay)
+                if recorded is not None:
+                    recorded.clear()
+        status["ok"] = True
+        breaker_record(sport_key, True)
+    except Exception as e:
+        log.error(f"Odds API error [{sport_key}]: {_describe_error(e)}")
+        breaker_record(sport_key, False)
+    finally:
+        observe("arb_fetch_seconds", time.perf_counter() - start, sport=sport_key)
+        observe("arb_json_decode_seconds", stats.get("decode", 0.0), sport=sport_key)
 
 
-# ─────────────────────────────────────────────────────
-# 🔄  BOUCLE PRINCIPALE
-# ─────────────────────────────────────────────────────
+# Sources multiples: chaque source rend des matchs au format de l'Odds API.
+# La première (l'Odds API) est lue en flux; les autres sont lues en
+# parallèle et leurs bookies greffés sur le match correspondant, retrouvé
+# par équipes normalisées et coup d'envoi proche.
 
-def run_scanner():
-    log.info("🚀 ARB SCANNER v9 STARTED")
-    send_startup_message()
+class OddsAPIProvider:
+    name = "oddsapi"
 
-    seen_opps = {}
-    last_report = time.time()
-    REPORT_INTERVAL = 3600
+    def iter_events(self, sport_key: str, recorded: list = None, stop: threading.Event = None,
+                    status: dict = None, min_books: int = 2):
+        return iter_odds(sport_key, recorded, stop, status, min_books)
 
-    while True:
+
+class FeedProvider:
+    # Fichier local ou URL ({sport_key} remplacé) servant un tableau JSON de
+    # matchs au format de l'Odds API: flux d'une autre source déjà converti,
+    # fausse API... Fichier absent ou 404 = aucun match pour cette ligue.
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source
+
+    def iter_events(self, sport_key: str, recorded: list = None, stop: threading.Event = None,
+                    status: dict = None, min_books: int = 2):
+        if status is None:
+            status = {}
+        status["ok"] = False
+        location = self.source.format(sport_key=sport_key)
+        now_utc = datetime.now(timezone.utc)
         try:
-            check_telegram_commands()
+            if location.startswith(("http://", "https://")):
+                with http.get(location, timeout=10, stream=True) as r:
+                    if r.status_code != 404:
+                        r.raise_for_status()
+                        decoder = codecs.getincrementaldecoder("utf-8")()
+                        chunks = (decoder.decode(chunk) for chunk in r.iter_content(STREAM_CHUNK_SIZE))
+                        yield from self._keep(iter_json_array(chunks), recorded, now_utc, min_books)
+            elif os.path.exists(location):
+                with open(location, encoding="utf-8") as f:
+                    chunks = iter(lambda: f.read(STREAM_CHUNK_SIZE), "")
+                    yield from self._keep(iter_json_array(chunks), recorded, now_utc, min_books)
+            status["ok"] = True
+        except Exception as e:
+            log.error(f"Source {self.name} [{sport_key}]: {_describe_error(e)}")
 
-            if state["paused"]:
-                log.info("⏸ En pause...")
-                time.sleep(15)
-                continue
+    @staticmethod
+    def _keep(events, recorded: list, now_utc: datetime, min_books: int):
+        for raw in events:
+            if recorded is not None:
+                recorded.append(raw)
+            if _keep_game(raw, now_utc, min_books):
+                yield raw
 
-            session_stats["scans"] += 1
-            log.info(f"─── Scan #{session_stats['scans']} ───")
 
-            all_opps = []
-            for sport_key, sport_label in SPORTS.items():
-                games = fetch_odds(sport_key)
-                for game in games:
-                    all_opps.extend(find_arb_opportunities(game, sport_label))
-
-            all_opps.sort(key=lambda x: x["profit_pct"], reverse=True)
-
-            if all_opps:
-                log.info(f"🎯 {len(all_opps)} opportunité(s)")
-                for opp in all_opps:
-                    key = f"{opp['home']}-{opp['away']}-{opp['profit_pct']}"
-                    now = time.time()
-                    if key in seen_opps and (now - seen_opps[key]) < POLL_INTERVAL:
-                        continue
-                    seen_opps[key] = now
-                    session_stats["opps_found"] += 1
-                    if opp["profit_pct"] > session_stats["best_profit_pct"]:
-                        session_stats["best_profit_pct"] = opp["profit_pct"]
-                    send_telegram(format_alert(opp))
-                    log_opportunity(opp)
-                    log.info(f"✅ {opp['profit_pct']}% | {opp['away']} @ {opp['home']} | {opp['time_left']}")
-                    time.sleep(1)
-            else:
-                log.info("❌ Aucune opportunité.")
+def _feed_provider(spec: str) -> FeedProvider:
+    # "nom=source"; sans nom, la source sert de nom
+    name, _, source = spec.partition("=")
+    return FeedProvider(name, source) if source else FeedProvider(spec, spec)
 
-            if time.time() - last_report > REPORT_INTERVAL:
-                send_stats_update()
-                last_report = time.time()
 
-            seen_opps = {k: v for k, v in seen_opps.items() if time.time() - v < POLL_INTERVAL}
+providers = [OddsAPIProvider()] + [_feed_provider(spec) for spec in ODDS_FEEDS]
+provider_pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="feed")
 
-            elapsed = 0
-            while elapsed < POLL_INTERVAL:
-                time.sleep(15)
-                elapsed += 15
-                check_telegram_commands()
-                if state["paused"]:
-                    break
+TEAM_STOPWORDS = frozenset({"fc", "cf", "sc", "ac", "afc", "cd", "sk", "fk", "club", "de", "the"})
 
-        except KeyboardInterrupt:
-            log.info("Arrêt manuel.")
-            send_stats_update()
-            send_telegram("⛔ <b>Scanner arrêté.</b>")
-            break
+
+class TeamIndex:
+    # Noms d'équipe → forme canonique (sans accents, ponctuation ni suffixes
+    # de club, puis table d'alias), mémoïsée par nom brut. Un nom d'une
+    # source est rattaché au vocabulaire des autres par égalité de forme,
+    # sinon par difflib: résultat mémoïsé, échecs compris, le fuzzy n'est
+    # refait que pour un nom jamais vu ou quand le vocabulaire grandit.
+    MAX_ENTRIES = 100000
+
+    def __init__(self, aliases: dict = None, cutoff: float = TEAM_MATCH_CUTOFF):
+        self.cutoff = cutoff
+        self.aliases = {self._normalize(k): self._normalize(v) for k, v in (aliases or {}).items()}
+        self.forms = {}       # nom brut → forme canonique
+        self.vocabulary = {}  # sport_key → {numéros: {forme canonique vue dans les sources secondaires}}
+        self.words = {}       # sport_key → {mot: {formes du vocabulaire qui le contiennent}}
+        self.resolved = {}    # (sport_key, nom brut) → forme du vocabulaire, ou None
+        self.misses = {}      # sport_key → clés de `resolved` sans correspondance
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(name: str) -> str:
+        text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+        return " ".join(w for w in re.split(r"[^a-z0-9]+", text) if w and w not in TEAM_STOPWORDS) or text
+
+    def canonical(self, name: str) -> str:
+        form = self.forms.get(name)
+        if form is None:
+            form = self._normalize(name)
+            form = self.aliases.get(form, form)
+            if len(self.forms) >= self.MAX_ENTRIES:
+                self.forms.clear()
+            self.forms[name] = form
+        return form
+
+    @staticmethod
+    def _numbers(form: str) -> frozenset:
+        # Les numéros (Schalke 04, Home 1 / Home 10) doivent être identiques
+        return frozenset(w for w in form.split() if w.isdigit())
+
+    def learn(self, sport_key: str, name: str) -> str:
+        form = self.canonical(name)
+        with self.lock:
+            bucket = self.vocabulary.setdefault(sport_key, {}).setdefault(self._numbers(form), set())
+            if form not in bucket:
+                bucket.add(form)
+                words = self.words.setdefault(sport_key, {})
+                for word in form.split():
+                    words.setdefault(word, set()).add(form)
+                for key in self.misses.pop(sport_key, ()):
+                    self.resolved.pop(key, None)
+        return form
+
+    def resolve(self, sport_key: str, name: str):
+        key = (sport_key, name)
+        try:
+            return self.resolved[key]
+        except KeyError:
+            pass
+        form = self.canonical(name)
+        with self.lock:
+            bucket = self.vocabulary.get(sport_key, {}).get(self._numbers(form), ())
+            if form in bucket:
+                candidates = None
+            else:
+                words = self.words.get(sport_key, {})
+                candidates = {c for w in form.split() for c in words.get(w, ()) if c in bucket}
+        match = form if candidates is None else self._fuzzy(form, candidates)
+        with self.lock:
+            if len(self.resolved) >= self.MAX_ENTRIES:
+                self.resolved.clear()
+                self.misses.clear()
+            self.resolved[key] = match
+            if match is None:
+                self.misses.setdefault(sport_key, set()).add(key)
+        return match
+
+    def _fuzzy(self, form: str, candidates: set):
+        # `candidates`: formes de même numéro qui partagent un mot avec
+        # `form`. Nom court contenu dans un seul nom long (Tottenham ⊂
+        # Tottenham Hotspur), sinon difflib. Sans mot commun, pas de
+        # rapprochement: ni faux positif, ni difflib sur toute la ligue.
+        if not candidates:
+            return None
+        words = set(form.split())
+        candidates = sorted(candidates)
+        nested = [c for c in candidates if words <= set(c.split()) or set(c.split()) <= words]
+        if len(nested) == 1:
+            return nested[0]
+        matches = difflib.get_close_matches(form, candidates, n=1, cutoff=self.cutoff)
+        return matches[0] if matches else None
+
+
+team_index = TeamIndex(TEAM_ALIASES)
+
+
+def _commence_ts(raw: dict):
+    commence = _parse_commence(raw.get("commence_time", ""))
+    return commence.timestamp() if commence is not None else None
+
+
+def _collect_feed(provider, sport_key: str) -> list:
+    return [(provider.name, raw) for raw in provider.iter_events(sport_key, min_books=0)]
+
+
+def _feed_index(sport_key: str, futures: list, stop: threading.Event = None) -> dict:
+    # Matchs des sources secondaires par (domicile, extérieur) canoniques:
+    # [instant du coup d'envoi, match, source, déjà rattaché]
+    pending = set(futures)
+    while pending and not (stop is not None and stop.is_set()):
+        _, pending = wait(pending, timeout=1.0)
+    index = {}
+    for future in futures:
+        if not future.done():
+            continue
+        for name, raw in future.result():
+            key = (team_index.learn(sport_key, raw.get("home_team", "")),
+                   team_index.learn(sport_key, raw.get("away_team", "")))
+            index.setdefault(key, []).append([_commence_ts(raw), raw, name, False])
+    return index
+
+
+def _match_event(sport_key: str, raw: dict, index: dict) -> list:
+    # [(match secondaire, domicile/extérieur inversés)], au plus un par source
+    home = team_index.resolve(sport_key, raw.get("home_team", ""))
+    away = team_index.resolve(sport_key, raw.get("away_team", ""))
+    if home is None or away is None:
+        return []
+    commence = _commence_ts(raw)
+    matched, sources = [], set()
+    for key, swapped in (((home, away), False), ((away, home), True)):
+        for candidate in index.get(key, ()):
+            ts, extra, name, taken = candidate
+            if taken or name in sources:
+                continue
+            if ts is not None and commence is not None and abs(ts - commence) > EVENT_MATCH_WINDOW:
+                continue
+            candidate[3] = True
+            sources.add(name)
+            matched.append((extra, swapped))
+    return matched
+
+
+def _rename_outcomes(bookmaker: dict, names: dict) -> dict:
+    return dict(bookmaker, markets=[
+        dict(market, outcomes=[dict(o, name=names.get(o.get("name"), o.get("name"))) for o in market.get("outcomes", [])])
+        for market in bookmaker.get("markets", [])
+    ])
+
+
+def merge_event(raw: dict, extras: list) -> dict:
+    # Bookies des autres sources greffés sur le match; leurs noms d'équipes
+    # (outcomes compris) remplacés par ceux de `raw`, pour que h2h et
+    # handicaps tombent sur les mêmes outcomes et le même côté domicile.
+    bookmakers = list(raw.get("bookmakers", []))
+    seen = {bm.get("key") for bm in bookmakers}
+    for extra, swapped in extras:
+        home, away = (raw.get("away_team"), raw.get("home_team")) if swapped else (raw.get("home_team"), raw.get("away_team"))
+        names = {extra.get("home_team"): home, extra.get("away_team"): away}
+        for bookmaker in extra.get("bookmakers", []):
+            if bookmaker.get("key") not in seen:
+                seen.add(bookmaker.get("key"))
+                bookmakers.append(_rename_outcomes(bookmaker, names))
+    return dict(raw, bookmakers=bookmakers)
+
+
+def iter_league(sport_key: str, recorded: list = None, stop: threading.Event = None, status: dict = None):
+    # Matchs d'une ligue, toutes sources fusionnées. Sans source secondaire,
+    # le flux de l'Odds API tel quel. L'issue (status) est celle de l'Odds
+    # API; une source secondaire en échec n'apporte simplement rien.
+    primary, extras = providers[0], providers[1:]
+    if not extras:
+        yield from primary.iter_events(sport_key, recorded, stop, status)
+        return
+    futures = [provider_pool.submit(_collect_feed, provider, sport_key) for provider in extras]
+    now_utc = datetime.now(timezone.utc)
+    index = None
+    for raw in primary.iter_events(sport_key, None, stop, status, min_books=0):
+        if index is None:
+            index = _feed_index(sport_key, futures, stop)
+        start = time.perf_counter()
+        matched = _match_event(sport_key, raw, index)
+        merged = merge_event(raw, matched) if matched else raw
+        observe("arb_event_match_seconds", time.perf_counter() - start, sport=sport_key)
+        if recorded is not None:
+            recorded.append(merged)
+        if _keep_game(merged, now_utc):
+            yield merged
+    if index is None:
+        index = _feed_index(sport_key, futures, stop)
+
+    # Matchs absents de l'Odds API: fusionnés entre sources secondaires
+    for candidates in index.values():
+        for i, (ts, raw, name, taken) in enumerate(candidates):
+            if taken:
+                continue
+            others = []
+            for other in candidates[i + 1:]:
+                other_ts, extra, other_name, other_taken = other
+                if other_taken or other_name == name:
+                    continue
+                if ts is not None and other_ts is not None and abs(ts - other_ts) > EVENT_MATCH_WINDOW:
+                    continue
+                other[3] = True
+                others.append((extra, False))
+            merged = merge_event(dict(raw, id=f"{name}:{raw.get('id')}"), others)
+            if recorded is not None:
+                recorded.append(merged)
+            if _keep_game(merged, now_utc):
+                yield merged
+
+
+def fetch_odds(sport_key: str) -> list:
+    return list(iter_league(sport_key))
+
+
+late_leagues = {}  # sport_key → (time.time(), [Game]): ligues lues en entier après l'abandon du scan
+
+
+def _stream_league(sport_key: str, out: queue.Queue, stop: threading.Event):
+    # Thread de fetch: lots de STREAM_BATCH matchs compacts poussés dans
+    # `out` dès qu'ils sont décodés, puis un dernier lot portant l'issue de
+    # la ligue ("ok" ou "failed"; None sur les lots intermédiaires). Une
+    # réponse déjà en cours quand le scan est abandonné est payée: elle est
+    # lue jusqu'au bout et gardée pour le scan suivant (late_leagues).
+    recorded = [] if RECORD_PAYLOADS else None
+    status = {}
+    batch = []
+    games = []
+    try:
+        for raw in iter_league(sport_key, recorded, stop, status):
+            game = compact_cached(raw)
+            games.append(game)
+            if stop.is_set():
+                continue
+            batch.append(game)
+            if len(batch) >= STREAM_BATCH:
+                out.put((sport_key, batch, None))
+                batch = []
+        if recorded is not None and status["ok"]:
+            record_payload(sport_key, recorded)
+        if stop.is_set() and status["ok"]:
+            late_leagues[sport_key] = (time.time(), games)
+            log.info(f"[{sport_key}] 📥 Réponse arrivée après l'abandon du scan: {len(games)} matchs gardés")
+    finally:
+        out.put((sport_key, batch, "ok" if status.get("ok") else "failed"))
+
+
+def fetch_all_odds(sports: dict = SPORTS):
+    # Fetch concurrent en flux: rend (sport_key, matchs, issue) lot par
+    # lot, sans attendre la fin des réponses. Une ligue lue en entier après
+    # l'abandon d'un scan récent est rendue telle quelle, sans requête.
+    # Au plus FETCH_CONCURRENCY ligues sont lancées à la fois: à la
+    # deadline (ou au /pause, vérifié chaque seconde) les suivantes ne
+    # partent pas et celles en vol sont abandonnées.
+    now = time.time()
+    queued = deque()
+    for sport_key in sports:
+        late = late_leagues.pop(sport_key, None)
+        if late is not None and now - late[0] < LATE_LEAGUE_MAX_AGE:
+            yield sport_key, late[1], "ok"
+        else:
+            queued.append(sport_key)
+    out = queue.Queue()
+    stop = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix="fetch")
+    deadline = time.monotonic() + SCAN_DEADLINE
+    pending = set(queued)
+    running = 0
+    try:
+        while pending:
+            if state["paused"]:
+                log.info(f"⏸ Pause: {len(pending)} ligue(s) abandonnée(s) en cours de scan")
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                log.warning(f"⏱ Deadline scan ({SCAN_DEADLINE}s) dépassée — ignorées: {', '.join(sorted(pending))}")
+                return
+            while queued and running < FETCH_CONCURRENCY:
+                pool.submit(_stream_league, queued.popleft(), out, stop)
+                running += 1
+            try:
+                sport_key, games, outcome = out.get(timeout=min(1.0, remaining))
+            except queue.Empty:
+                continue
+            if outcome is not None:
+                pending.discard(sport_key)
+                running -= 1
+            yield sport_key, games, outcome
+    finally:
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ─────────────────────────────────────────────────────
+# ⏱️  PLANIFICATION — quota adaptatif par sport
+# ─────────────────────────────────────────────────────
+
+quota = {"remaining": None}
+sport_schedule = {k: {"next_fetch": 0.0, "last_fetch": None, "next_kickoff": None} for k in SPORTS}
+opp_history = {k: [] for k in SPORTS}   # timestamps des opps loggées, par sport
+SPORT_BY_LABEL = {label: key for key, label in SPORTS.items()}
+
+
+def seconds_until_quota_reset(now: float) -> float:
+    dt = datetime.fromtimestamp(now, timezone.utc)
+    day = min(QUOTA_RESET_DAY, 28)
+    if dt.day < day:
+        reset = datetime(dt.year, dt.month, day, tzinfo=timezone.utc)
+    else:
+        year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+        reset = datetime(year, month, day, tzinfo=timezone.utc)
+    return max(reset.timestamp() - now, 60.0)
+
+
+def sport_weight(opps_per_day: float, hours_to_kickoff) -> float:
+    # Rendement historique × urgence: une ligue dont le prochain match est
+    # proche et qui produit des arbs est fetchée plus souvent.
+    if hours_to_kickoff is None:
+        urgency = 0.05
+    else:
+        urgency = 1 / (1 + max(hours_to_kickoff, 0) / KICKOFF_HORIZON_H)
+    return (opps_per_day + OPP_RATE_PRIOR) * urgency
+
+
+def compute_intervals(weights: dict, budget_per_sec: float, cost: int = REQUEST_COST) -> dict:
+    # Répartit le débit de requêtes autorisé au prorata des poids:
+    # somme(cost / interval) == budget_per_sec avant bornage.
+    total = sum(weights.values())
+    intervals = {}
+    for sport_key, weight in weights.items():
+        if weight <= 0 or budget_per_sec <= 0:
+            interval = MAX_SPORT_INTERVAL
+        else:
+            interval = total * cost / (weight * budget_per_sec)
+        intervals[sport_key] = min(max(interval, MIN_SPORT_INTERVAL), MAX_SPORT_INTERVAL)
+    return intervals
+
+
+def _opps_per_day(timestamps: list, now: float) -> float:
+    since = now - OPP_RATE_WINDOW_DAYS * 86400
+    return sum(1 for t in timestamps if since <= t <= now) / OPP_RATE_WINDOW_DAYS
+
+
+def _logged_timestamp(opp: dict):
+    # detected_at est en heure locale, "%Y-%m-%d %H:%M:%S"
+    try:
+        return datetime.fromisoformat(opp["detected_at"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def load_opp_history():
+    if not Path(LOG_FILE).exists():
+        return
+    since = time.time() - OPP_RATE_WINDOW_DAYS * 86400
+    for opp in iter_logged_opportunities():
+        sport_key = SPORT_BY_LABEL.get(opp.get("sport"))
+        ts = _logged_timestamp(opp)
+        if sport_key and ts and ts >= since:
+            opp_history[sport_key].append(ts)
+
+
+def record_opportunity(opp: dict):
+    sport_key = SPORT_BY_LABEL.get(opp["sport"])
+    if sport_key:
+        opp_history[sport_key].append(time.time())
+
+
+def record_fetch(sport_key: str, games: list):
+    now_utc = datetime.now(timezone.utc)
+    kickoffs = [_parse_commence(g.commence_raw) for g in games]
+    upcoming = [k for k in kickoffs if k is not None and k > now_utc]
+    entry = sport_schedule[sport_key]
+    entry["last_fetch"] = time.time()
+    entry["next_kickoff"] = min(upcoming).timestamp() if upcoming else None
+
+
+def plan_next_fetches(sport_keys, now: float = None):
+    now = now or time.time()
+    if not ADAPTIVE_SCHEDULING:
+        for sport_key in sport_keys:
+            sport_schedule[sport_key]["next_fetch"] = now + FLAT_POLL_INTERVAL
+        return
+
+    seconds_left = seconds_until_quota_reset(now)
+    # Le quota est celui du compte: la dernière valeur vue par n'importe quel worker
+    shared_remaining = shared_store().get("quota_remaining")
+    remaining = int(shared_remaining) if shared_remaining is not None else quota["remaining"]
+    if remaining is None:
+        remaining = QUOTA_MONTHLY * seconds_left / (30 * 86400)
+    budget_per_sec = max(remaining - QUOTA_RESERVE, 0) / seconds_left
+
+    weights = {}
+    for sport_key in MY_SPORTS:
+        entry = sport_schedule[sport_key]
+        kickoff = entry["next_kickoff"]
+        hours = None if kickoff is None else (kickoff - now) / 3600
+        # Jamais fetché: on suppose un match proche pour avoir une première mesure
+        if entry["last_fetch"] is None:
+            hours = 0
+        weights[sport_key] = sport_weight(_opps_per_day(opp_history[sport_key], now), hours)
+    intervals = compute_intervals(share_weights(weights), budget_per_sec)
+
+    for sport_key in sport_keys:
+        sport_schedule[sport_key]["next_fetch"] = now + intervals[sport_key]
+    log.info(
+        "🗓 Prochains fetchs: " + " | ".join(
+            f"{k.split('_', 1)[-1]} {int(intervals[k] // 60)}m" for k in sport_keys
+        ) + f" (budget {budget_per_sec * 3600:.1f} req/h)"
+    )
+
+
+def defer_fetches(sport_keys, now: float = None):
+    # Ligues dues mais pas fetchées: elles n'ont rien appris, on les retente
+    # vite au lieu de les repousser d'un intervalle adaptatif complet
+    now = now or time.time()
+    for sport_key in sport_keys:
+        sport_schedule[sport_key]["next_fetch"] = now + FETCH_RETRY_DELAY
+
+
+def share_weights(weights: dict) -> dict:
+    # Publie les poids de notre shard et y ajoute ceux des autres workers:
+    # le budget du compte est réparti sur toutes les ligues, pas par worker.
+    # Un worker arrêté disparaît quand ses poids expirent.
+    if WORKER_COUNT == 1:
+        return weights
+    store = shared_store()
+    for sport_key, weight in weights.items():
+        store.set(f"weight:{sport_key}", weight, ttl=2 * MAX_SPORT_INTERVAL)
+    merged = {k: float(v) for k, v in store.scan("weight:").items() if k in SPORTS}
+    merged.update(weights)
+    return merged
+
+
+def due_sports(now: float = None) -> dict:
+    now = now or time.time()
+    return {k: v for k, v in MY_SPORTS.items() if sport_schedule[k]["next_fetch"] <= now}
+
+
+def seconds_until_next_fetch(now: float = None) -> float:
+    now = now or time.time()
+    return max(min(sport_schedule[k]["next_fetch"] for k in MY_SPORTS) - now, 0.0)
+
+
+def simulate_quota(days: int = 30):
+    # Dry-run: rejoue `days` jours du log d'opportunités avec le planificateur
+    # adaptatif et avec l'intervalle fixe, puis compare requêtes consommées
+    # et opps captées (une opp est captée si son sport est fetché moins de
+    # SIM_OPP_LIFETIME s après sa détection).
+    migrate_legacy_log()
+    if not Path(LOG_FILE).exists():
+        print("Aucun fichier de log trouvé.")
+        return
+
+    opps = {k: [] for k in SPORTS}
+    kickoffs = {k: [] for k in SPORTS}
+    for opp in iter_logged_opportunities():
+        sport_key = SPORT_BY_LABEL.get(opp.get("sport"))
+        ts = _logged_timestamp(opp)
+        if not sport_key or ts is None:
+            continue
+        opps[sport_key].append(ts)
+        try:
+            year = time.localtime(ts).tm_year
+            kickoff = datetime.strptime(f"{year} {opp['commence']}", "%Y %d/%m %H:%M UTC")
+            kickoffs[sport_key].append(kickoff.replace(tzinfo=timezone.utc).timestamp())
+        except (KeyError, ValueError):
+            pass
+    all_ts = [t for ts in opps.values() for t in ts]
+    if not all_ts:
+        print("Aucune opportunité loggée.")
+        return
+    for k in SPORTS:
+        opps[k].sort()
+        kickoffs[k].sort()
+
+    end = max(all_ts) + SIM_OPP_LIFETIME
+    start = max(min(all_ts), end - days * 86400)
+    span = end - start
+    budget = QUOTA_MONTHLY * span / (30 * 86400) - QUOTA_RESERVE
+
+    def captured(fetches: dict) -> dict:
+        result = {}
+        for k, times in fetches.items():
+            times.sort()
+            n = 0
+            for t in opps[k]:
+                if t < start:
+                    continue
+                i = bisect_left(times, t)
+                if i < len(times) and times[i] - t <= SIM_OPP_LIFETIME:
+                    n += 1
+            result[k] = n
+        return result
+
+    # Intervalle fixe (comportement historique)
+    flat = {k: [start + i * FLAT_POLL_INTERVAL for i in range(int(span // FLAT_POLL_INTERVAL) + 1)] for k in SPORTS}
+
+    # Planificateur adaptatif
+    adaptive = {k: [] for k in SPORTS}
+    next_fetch = {k: start for k in SPORTS}
+    last_kickoff = {k: None for k in SPORTS}
+    used = 0
+    while True:
+        sport_key = min(next_fetch, key=next_fetch.get)
+        t = next_fetch[sport_key]
+        if t > end:
+            break
+        adaptive[sport_key].append(t)
+        used += REQUEST_COST
+        upcoming = kickoffs[sport_key][bisect_right(kickoffs[sport_key], t):]
+        last_kickoff[sport_key] = upcoming[0] if upcoming else None
+
+        budget_per_sec = max(budget - used, 0) / max(end - t, 60)
+        weights = {}
+        for k in SPORTS:
+            history = opps[k][:bisect_right(opps[k], t)]
+            kickoff = last_kickoff[k]
+            hours = 0 if not adaptive[k] else (None if kickoff is None else (kickoff - t) / 3600)
+            weights[k] = sport_weight(_opps_per_day(history, t), hours)
+        next_fetch[sport_key] = t + compute_intervals(weights, budget_per_sec)[sport_key]
+
+    flat_captured = captured(flat)
+    adaptive_captured = captured(adaptive)
+    in_window = {k: sum(1 for t in opps[k] if t >= start) for k in SPORTS}
+
+    print(f"\n{'═'*64}")
+    print(f"  SIMULATION QUOTA — {span / 86400:.1f} jours | budget {int(budget)} req")
+    print(f"{'═'*64}")
+    print(f"  {'Sport':<26}{'Opps':>6}{'Fixe req':>10}{'capt.':>7}{'Adapt req':>11}{'capt.':>7}")
+    for k, label in SPORTS.items():
+        print(
+            f"  {label:<26}{in_window[k]:>6}"
+            f"{len(flat[k]) * REQUEST_COST:>10}{flat_captured[k]:>7}"
+            f"{len(adaptive[k]) * REQUEST_COST:>11}{adaptive_captured[k]:>7}"
+        )
+    flat_used = sum(len(v) for v in flat.values()) * REQUEST_COST
+    print(f"\n  Fixe:     {flat_used} req | {sum(flat_captured.values())} opps captées")
+    print(f"  Adaptatif: {used} req | {sum(adaptive_captured.values())} opps captées")
+    print(f"{'═'*64}\n")
+
+
+# ─────────────────────────────────────────────────────
+# 🧱  MODÈLE COMPACT (matchs & cotes)
+# ─────────────────────────────────────────────────────
+
+class MarketLine:
+    # Cotes d'un (marché, ligne) pour un match: matrice bookies × outcomes
+    # aplatie dans un array('d'), 0.0 = cote absente. Noms internés.
+    __slots__ = ("market", "line", "books", "outcomes", "prices")
+
+    def __init__(self, market: str, line, books: tuple, outcomes: tuple, prices: array):
+        self.market = market
+        self.line = line
+        self.books = books
+        self.outcomes = outcomes
+        self.prices = prices
+
+    def price(self, b: int, o: int) -> float:
+        return self.prices[b * len(self.outcomes) + o]
+
+    def odds_for(self, o: int) -> list:
+        # [(bookie, cote)] d'un outcome, dans l'ordre du payload
+        n = len(self.outcomes)
+        return [(book, self.prices[b * n + o]) for b, book in enumerate(self.books) if self.prices[b * n + o]]
+
+
+class Game:
+    # Un match, construit une fois par payload: seul objet lu par la
+    # détection, la watchlist et le cache (le JSON brut est libéré au fetch).
+    __slots__ = ("event_id", "home", "away", "commence_raw", "stamps", "lines")
+
+    def __init__(self, event_id, home: str, away: str, commence_raw: str, stamps: tuple, lines: tuple):
+        self.event_id = event_id
+        self.home = home
+        self.away = away
+        self.commence_raw = commence_raw
+        self.stamps = stamps
+        self.lines = lines
+
+    @property
+    def signature(self):
+        # None si un bookie n'a pas de last_update: impossible de prouver que rien n'a bougé
+        if any(last_update is None for _, last_update in self.stamps):
+            return None
+        return self.stamps
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _book_markets(bookmaker: dict, home: str) -> dict:
+    # Cotes d'un bookie indexées par (marché, ligne): {(market, line): {outcome: price}}.
+    # Over/Under d'un total partagent la ligne `point`; pour un handicap la
+    # ligne est exprimée côté domicile (-1.5 domicile ⇔ +1.5 extérieur).
+    markets = {}
+    for market in bookmaker.get("markets", []):
+        key = market["key"]
+        if key not in ODDS_MARKETS:
+            continue
+        key = _intern(key)
+        if key == "h2h":
+            parsed = {_intern(o["name"]): o["price"] for o in market.get("outcomes", [])}
+            if parsed:
+                markets[("h2h", None)] = parsed
+            continue
+        for o in market.get("outcomes", []):
+            point = o.get("point")
+            if point is None:
+                continue
+            if key == "totals":
+                line, label = point, f"{o['name']} {point:g}"
+            else:
+                line, label = (point if o["name"] == home else -point), f"{o['name']} {point:+g}"
+            markets.setdefault((key, line), {})[_intern(label)] = o["price"]
+    return markets
+
+
+def _book_from_game(game: Game, bookie: str) -> dict:
+    # Cotes d'un bookie reprises d'un modèle déjà construit (même format que _book_markets)
+    markets = {}
+    for ml in game.lines:
+        if bookie not in ml.books:
+            continue
+        b = ml.books.index(bookie)
+        odds = {label: ml.price(b, o) for o, label in enumerate(ml.outcomes) if ml.price(b, o)}
+        if odds:
+            markets[(ml.market, ml.line)] = odds
+    return markets
+
+
+def compact_game(raw: dict, previous: Game = None) -> Game:
+    # Une passe sur le JSON brut d'un match. `previous` = modèle du scan
+    # précédent: un bookie dont le last_update n'a pas bougé n'est pas re-parsé.
+    home = raw.get("home_team")
+    stamps = []
+    by_line = {}  # (market, line) → {bookie: {outcome: price}}
+    for bookmaker in raw.get("bookmakers", []):
+        bookie = _intern(bookmaker.get("key"))
+        last_update = bookmaker.get("last_update")
+        stamps.append((bookie, last_update))
+        if bookie not in BOOKS:
+            continue
+        if previous is not None and last_update is not None and (bookie, last_update) in previous.stamps:
+            book = _book_from_game(previous, bookie)
+        else:
+            book = _book_markets(bookmaker, home)
+        for market_line, odds in book.items():
+            by_line.setdefault(market_line, {})[bookie] = odds
+
+    lines = []
+    for (market, line), bookie_odds in by_line.items():
+        outcomes = {}
+        for odds in bookie_odds.values():
+            for label in odds:
+                outcomes.setdefault(label, len(outcomes))
+        n = len(outcomes)
+        prices = array("d", [0.0]) * (len(bookie_odds) * n)
+        for b, odds in enumerate(bookie_odds.values()):
+            for label, price in odds.items():
+                prices[b * n + outcomes[label]] = price or 0.0
+        lines.append(MarketLine(market, line, tuple(bookie_odds), tuple(outcomes), prices))
+
+    return Game(
+        raw.get("id"),
+        _intern(raw.get("home_team", "Home")),
+        _intern(raw.get("away_team", "Away")),
+        raw.get("commence_time", ""),
+        tuple(stamps),
+        tuple(lines),
+    )
+
+
+def _raw_stamps(raw: dict) -> tuple:
+    return tuple((bm.get("key"), bm.get("last_update")) for bm in raw.get("bookmakers", []))
+
+
+def compact_cached(raw: dict) -> Game:
+    # Un match inchangé depuis le scan précédent reprend tel quel l'objet
+    # du cache de snapshots.
+    entry = snapshot_cache.get(raw.get("id"))
+    previous = entry["game"] if entry else None
+    if previous is not None and previous.signature is not None and previous.stamps == _raw_stamps(raw):
+        return previous
+    return compact_game(raw, previous)
+
+
+def compact_payload(games: list, use_cache: bool = True) -> list:
+    # Modèle compact d'une réponse de ligue entière (replay, bench)
+    if use_cache:
+        return [compact_cached(raw) for raw in games]
+    return [compact_game(raw) for raw in games]
+
+
+# ─────────────────────────────────────────────────────
+# 🔍  DÉTECTION D'ARB
+# ─────────────────────────────────────────────────────
+
+def _time_left(commence_dt: datetime, now_utc: datetime) -> str:
+    delta = commence_dt - now_utc
+    hours_left = int(delta.total_seconds() // 3600)
+    mins_left = int((delta.total_seconds() % 3600) // 60)
+    return f"{hours_left}h {mins_left}m"
+
+
+def _parse_commence(commence_raw: str):
+    try:
+        return datetime.fromisoformat(commence_raw.replace("Z", "+00:00"))
+    except Exception:
+        return None
+
+
+def _commence_info(commence_raw: str, now_utc: datetime = None):
+    # Filtre pré-match: None si le match a déjà commencé
+    try:
+        commence_dt = datetime.fromisoformat(commence_raw.replace("Z", "+00:00"))
+        now_utc = now_utc or datetime.now(timezone.utc)
+        if commence_dt <= now_utc:
+            return None
+        commence_str = commence_dt.strftime("%d/%m %H:%M UTC")
+        time_left = _time_left(commence_dt, now_utc)
+    except Exception:
+        commence_str = commence_raw
+        time_left = "?"
+    return commence_str, time_left
+
+
+class Opportunity:
+    # Opp détectée: référence la MarketLine au lieu de copier les cotes.
+    # to_dict() produit la ligne du log (format JSONL inchangé).
+    __slots__ = ("sport", "event_id", "home", "away", "commence", "time_left", "line_odds", "legs",
+                 "total_prob", "profit_pct", "profit", "detected_at", "allocation")
+
+    def __init__(self, sport: str, event_id, home: str, away: str, commence: str, time_left: str,
+                 line_odds: MarketLine, legs: tuple, total_prob: float, profit_pct: float,
+                 profit: float, detected_at: str):
+        self.sport = sport
+        self.event_id = event_id
+        self.home = home
+        self.away = away
+        self.commence = commence
+        self.time_left = time_left
+        self.line_odds = line_odds
+        self.legs = legs  # ((outcome, bookie), ...) en indices de line_odds
+        self.total_prob = total_prob
+        self.profit_pct = profit_pct
+        self.profit = profit
+        self.detected_at = detected_at
+        self.allocation = None  # (mises, profit garanti) du portefeuille, mises = () si non financée
+
+    @property
+    def market(self) -> str:
+        return self.line_odds.market
+
+    @property
+    def line(self):
+        return self.line_odds.line
+
+    def sides(self) -> list:
+        # [(indice outcome, outcome, bookie, cote, mise)]
+        ml = self.line_odds
+        sides = []
+        for o, b in self.legs:
+            odd = ml.price(b, o)
+            sides.append((o, ml.outcomes[o], ml.books[b], odd, round((BANKROLL * (1 / odd)) / self.total_prob, 2)))
+        return sides
+
+    def stakes(self) -> list:
+        # Mises à jouer: celles du portefeuille si l'opp est financée, sinon sur BANKROLL seul
+        if self.allocation is not None and self.allocation[0]:
+            return list(self.allocation[0])
+        return [stake for *_, stake in self.sides()]
+
+    @property
+    def risky_involved(self) -> list:
+        books = self.line_odds.books
+        return [BOOK_LABELS.get(books[b], books[b]) for _, b in self.legs if books[b] in RISKY_BOOKS]
+
+    def refreshed(self, time_left: str, detected_at: str) -> "Opportunity":
+        return Opportunity(self.sport, self.event_id, self.home, self.away, self.commence, time_left,
+                           self.line_odds, self.legs, self.total_prob, self.profit_pct,
+                           self.profit, detected_at)
+
+    def to_dict(self) -> dict:
+        return {
+            "sport": self.sport,
+            "home": self.home,
+            "away": self.away,
+            "commence": self.commence,
+            "time_left": self.time_left,
+            "market": self.market,
+            "line": self.line,
+            "sides": [
+                {
+                    "team": team,
+                    "odd": odd,
+                    "bookie": bookie,
+                    "stake": stake,
+                    "all_odds": dict(self.line_odds.odds_for(o)),
+                    "is_safe": bookie in SAFE_BOOKS,
+                }
+                for o, team, bookie, odd, stake in self.sides()
+            ],
+            "profit_pct": self.profit_pct,
+            "profit": self.profit,
+            "risky_involved": self.risky_involved,
+            "detected_at": self.detected_at,
+            **({"allocation": {"stakes": list(self.allocation[0]), "profit": self.allocation[1]}}
+               if self.allocation is not None else {}),
+        }
+
+
+def _detectable(ml: MarketLine) -> bool:
+    return len(ml.books) >= 2 and len(ml.outcomes) >= 2
+
+
+def _best_legs(ml: MarketLine) -> tuple:
+    # Meilleure cote par outcome → ((outcome, bookie), ...); à égalité le
+    # premier bookie du payload l'emporte.
+    n = len(ml.outcomes)
+    legs = []
+    for o in range(n):
+        best_price = 0
+        best_b = None
+        for b in range(len(ml.books)):
+            price = ml.prices[b * n + o]
+            if price > best_price:
+                best_price = price
+                best_b = b
+        if best_b is not None:
+            legs.append((o, best_b))
+    return tuple(legs)
+
+
+def _build_opportunity(game: Game, sport_label: str, commence: tuple, ml: MarketLine, legs: tuple,
+                       total_prob: float, profit_pct: float, now_utc: datetime = None) -> Opportunity:
+    commence_str, time_left = commence
+    return Opportunity(
+        sport_label, game.event_id, game.home, game.away, commence_str, time_left, ml, legs, total_prob,
+        round(profit_pct, 2),
+        round(BANKROLL * (1 / total_prob - 1), 2),
+        (now_utc.astimezone() if now_utc else datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+    )
+
+
+def _detect_line(game: Game, commence: tuple, ml: MarketLine, sport_label: str, now_utc: datetime = None):
+    legs = _best_legs(ml)
+    if len(legs) < 2:
+        return None
+
+    total_prob = sum(1 / ml.price(b, o) for o, b in legs)
+    if total_prob >= 1.0:
+        return None
+
+    profit_pct = (1 / total_prob - 1) * 100
+    if profit_pct < MIN_PROFIT_PCT:
+        return None
+
+    return _build_opportunity(game, sport_label, commence, ml, legs, total_prob, profit_pct, now_utc)
+
+
+def find_arb_opportunities(game: Game, sport_label: str, now_utc: datetime = None) -> list:
+    commence = _commence_info(game.commence_raw, now_utc)
+    if commence is None:
+        return []
+    opps = []
+    for ml in game.lines:
+        if not _detectable(ml):
+            continue
+        opp = _detect_line(game, commence, ml, sport_label, now_utc)
+        if opp:
+            opps.append(opp)
+    return opps
+
+
+def _detect_lines(items: list, sport_label: str, now_utc: datetime = None) -> list:
+    # items: [(game, commence, MarketLine)] → une opp (ou None) par item.
+    # Meilleures cotes / somme des probas / profit calculés en une passe sur
+    # un tenseur lignes × bookies × outcomes rempli directement depuis les
+    # buffers des MarketLine (0 = cote absente).
+    if np is None:
+        return [_detect_line(game, commence, ml, sport_label, now_utc) for game, commence, ml in items]
+    if not items:
+        return []
+
+    n_books = max(len(ml.books) for _, _, ml in items)
+    n_outcomes = max(len(ml.outcomes) for _, _, ml in items)
+    tensor = np.zeros((len(items), n_books, n_outcomes))
+    for g, (_, _, ml) in enumerate(items):
+        tensor[g, :len(ml.books), :len(ml.outcomes)] = np.frombuffer(ml.prices).reshape(len(ml.books), -1)
+
+    # L'axe bookies suit l'ordre du payload: argmax garde le premier
+    # bookie en cas d'égalité, comme _best_legs.
+    best_idx = tensor.argmax(axis=1)
+    best_price = np.take_along_axis(tensor, best_idx[:, None, :], axis=1)[:, 0, :]
+    has_best = best_price > 0
+    inv = np.where(has_best, 1.0 / np.where(has_best, best_price, 1.0), 0.0)
+
+    # Somme outcome par outcome (ordre identique à sum() sur les legs)
+    total_prob = np.zeros(len(items))
+    for o in range(n_outcomes):
+        total_prob += inv[:, o]
+
+    candidate = (has_best.sum(axis=1) >= 2) & (total_prob < 1.0)
+    profit_pct = np.full(len(items), -np.inf)
+    profit_pct[candidate] = (1 / total_prob[candidate] - 1) * 100
+    hits = np.flatnonzero(candidate & (profit_pct >= MIN_PROFIT_PCT))
+
+    results = [None] * len(items)
+    for g in hits:
+        game, commence, ml = items[g]
+        legs = tuple((o, int(best_idx[g, o])) for o in range(len(ml.outcomes)) if has_best[g, o])
+        results[g] = _build_opportunity(game, sport_label, commence, ml, legs,
+                                        float(total_prob[g]), float(profit_pct[g]), now_utc)
+    return results
+
+
+def find_arb_opportunities_batch(games: list, sport_label: str, now_utc: datetime = None) -> list:
+    # Même résultat que find_arb_opportunities appelé match par match.
+    # `now_utc` permet de rejouer un payload enregistré à son heure de fetch.
+    items = []
+    for game in games:
+        commence = _commence_info(game.commence_raw, now_utc)
+        if commence is None:
+            continue
+        items.extend((game, commence, ml) for ml in game.lines if _detectable(ml))
+    return [opp for opp in _detect_lines(items, sport_label, now_utc) if opp]
+
+
+# ─────────────────────────────────────────────────────
+# 👀  WATCHLIST — middles & quasi-arbs
+# ─────────────────────────────────────────────────────
+
+watchlist = {}  # clé → dernière entrée vue (commande /watch)
+watch_lock = threading.Lock()  # /watch la lit depuis le thread Telegram
+
+
+def _is_half_line(line: float) -> bool:
+    # Middle seulement sur des lignes .5: pas de push possible aux bornes
+    return line % 1 == 0.5
+
+
+def _line_legs(market: str, game: Game):
+    # Meilleure cote par seuil pour chaque côté d'un marché à lignes, sur la
+    # variable de résultat (total de buts, écart domicile − extérieur):
+    # la jambe "haute" (Over / domicile) gagne si résultat > seuil, la jambe
+    # "basse" (Under / extérieur) si résultat < seuil.
+    up, down = {}, {}
+    for ml in game.lines:
+        if ml.market != market:
+            continue
+        if market == "totals":
+            threshold, up_label = ml.line, f"Over {ml.line:g}"
+        else:
+            threshold, up_label = -ml.line, f"{game.home} {ml.line:+g}"
+        for o, label in enumerate(ml.outcomes):
+            legs = up if label == up_label else down
+            for b, bookie in enumerate(ml.books):
+                price = ml.price(b, o)
+                if price > legs.get(threshold, (0,))[0]:
+                    legs[threshold] = (price, bookie, label)
+    return up, down
+
+
+def _watch_entry(kind: str, game: Game, sport_label: str, commence: tuple, market: str, line,
+                 legs: list, now_utc: datetime = None, window: tuple = None) -> dict:
+    total_prob = sum(1 / price for price, _, _ in legs)
+    return {
+        "kind": kind,
+        "sport": sport_label,
+        "home": game.home,
+        "away": game.away,
+        "commence": commence[0],
+        "time_left": commence[1],
+        "market": market,
+        "line": line,
+        "window": window,
+        "sides": [
+            {"team": label, "odd": price, "bookie": bookie,
+             "stake": round((BANKROLL / price) / total_prob, 2)}
+            for price, bookie, label in legs
+        ],
+        # pire cas: un seul pari passe; middle: les deux passent
+        "profit_pct": round((1 / total_prob - 1) * 100, 2),
+        "middle_pct": round((2 / total_prob - 1) * 100, 2) if kind == "middle" else None,
+        "detected_at": (now_utc.astimezone() if now_utc else datetime.now()).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def _scan_watchlist(game: Game, sport_label: str, commence: tuple, now_utc: datetime = None) -> list:
+    entries = []
+
+    # Quasi-arbs: même ligne, juste sous le seuil d'alerte
+    for ml in game.lines:
+        if len(ml.books) < 2:
+            continue
+        legs = _best_legs(ml)
+        if len(legs) < 2:
+            continue
+        best = [(ml.price(b, o), ml.books[b], ml.outcomes[o]) for o, b in legs]
+        profit_pct = (1 / sum(1 / price for price, _, _ in best) - 1) * 100
+        if MIN_PROFIT_PCT - NEAR_ARB_MARGIN <= profit_pct < MIN_PROFIT_PCT:
+            entries.append(_watch_entry("near", game, sport_label, commence, ml.market, ml.line,
+                                        best, now_utc))
+
+    # Middles: jambe haute au seuil t1 + jambe basse au seuil t2 > t1, les
+    # deux gagnent si le résultat tombe entre les deux. Jambes hautes triées
+    # par seuil + maximum préfixe des cotes: pour chaque jambe basse, la
+    # meilleure jambe haute de seuil inférieur est trouvée par bisection,
+    # O(n log n) au lieu de tester toutes les paires de lignes.
+    for market in ("totals", "spreads"):
+        up, down = _line_legs(market, game)
+        ups = sorted((t, leg) for t, leg in up.items() if _is_half_line(t))
+        if not ups:
+            continue
+        thresholds = [t for t, _ in ups]
+        prefix_best = []
+        for t, leg in ups:
+            if not prefix_best or leg[0] > prefix_best[-1][1][0]:
+                prefix_best.append((t, leg))
+            else:
+                prefix_best.append(prefix_best[-1])
+        for t2, low in sorted(down.items()):
+            if not _is_half_line(t2):
+                continue
+            i = bisect_left(thresholds, t2)
+            if i == 0:
+                continue
+            t1, high = prefix_best[i - 1]
+            total_prob = 1 / high[0] + 1 / low[0]
+            if (1 / total_prob - 1) * 100 < -MIDDLE_MAX_LOSS_PCT:
+                continue
+            entries.append(_watch_entry("middle", game, sport_label, commence, market, None,
+                                        [high, low], now_utc, window=(t1, t2)))
+    return entries
+
+
+def find_watchlist(game: Game, sport_label: str, now_utc: datetime = None) -> list:
+    commence = _commence_info(game.commence_raw, now_utc)
+    if commence is None:
+        return []
+    return _scan_watchlist(game, sport_label, commence, now_utc)
+
+
+def _watch_key(entry: dict) -> tuple:
+    return (entry["sport"], entry["home"], entry["away"], entry["kind"],
+            tuple((side["team"], side["bookie"]) for side in entry["sides"]))
+
+
+def update_watchlist(sport_label: str, entries: list) -> list:
+    # Remplace les entrées de la ligue re-scannée; renvoie celles absentes du scan précédent
+    new = []
+    with watch_lock:
+        previous = {key for key in watchlist if key[0] == sport_label}
+        for key in previous:
+            del watchlist[key]
+        for entry in entries:
+            key = _watch_key(entry)
+            if key not in previous:
+                new.append(entry)
+            watchlist[key] = entry
+    return new
+
+
+# ─────────────────────────────────────────────────────
+# 🗃️  CACHE DE SNAPSHOTS (ré-évaluation incrémentale)
+# ─────────────────────────────────────────────────────
+
+snapshot_cache = {}
+cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def evict_snapshots(now_utc: datetime = None):
+    # Un match commencé ne sera plus jamais évalué; un match sans date
+    # lisible sort du cache s'il n'a pas été revu depuis SNAPSHOT_STALE_AFTER.
+    now_utc = now_utc or datetime.now(timezone.utc)
+    now = time.time()
+    for event_id in list(snapshot_cache):
+        entry = snapshot_cache[event_id]
+        commence_dt = entry["commence_dt"]
+        if commence_dt is None:
+            expired = now - entry["seen_at"] > SNAPSHOT_STALE_AFTER
+        else:
+            expired = commence_dt <= now_utc
+        if expired:
+            del snapshot_cache[event_id]
+            cache_stats["evictions"] += 1
+
+
+def find_arb_opportunities_cached(games: list, sport_label: str, watch: list = None) -> list:
+    # `games`: modèle compact (compact_payload). Un match dont aucun bookie
+    # n'a changé (même id, mêmes last_update) est servi depuis le cache;
+    # pour un match modifié, seuls les bookies modifiés ont été re-parsés.
+    # `watch` reçoit les entrées de watchlist (middles, quasi-arbs).
+    now_utc = datetime.now(timezone.utc)
+    results = []  # par match, dans l'ordre du payload: ("opps", [...]) ou ("items", range)
+    items = []
+    item_events = []
+    for game in games:
+        event_id = game.event_id
+        signature = game.signature
+        entry = snapshot_cache.get(event_id) if event_id is not None else None
+
+        if entry is not None and signature is not None and entry["game"].stamps == signature:
+            commence_dt = entry["commence_dt"]
+            if commence_dt is not None and commence_dt <= now_utc:
+                del snapshot_cache[event_id]
+                cache_stats["evictions"] += 1
+                continue
+            cache_stats["hits"] += 1
+            entry["seen_at"] = time.time()
+            entry["game"] = game
+            detected_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            results.append(("opps", [
+                opp.refreshed(_time_left(commence_dt, now_utc) if commence_dt else opp.time_left, detected_at)
+                for opp in entry["opps"]
+            ]))
+            if watch is not None:
+                watch.extend(
+                    dict(w, time_left=_time_left(commence_dt, now_utc) if commence_dt else w["time_left"],
+                         detected_at=detected_at)
+                    for w in entry["watch"]
+                )
+            continue
+
+        cache_stats["misses"] += 1
+        commence = _commence_info(game.commence_raw)
+        if commence is None:
+            if entry is not None:
+                del snapshot_cache[event_id]
+                cache_stats["evictions"] += 1
+            continue
+        game_watch = _scan_watchlist(game, sport_label, commence, now_utc)
+        if watch is not None:
+            watch.extend(game_watch)
+        if event_id is not None:
+            snapshot_cache[event_id] = {
+                "game": game,
+                "commence_dt": _parse_commence(game.commence_raw),
+                "opps": [],
+                "watch": game_watch,
+                "seen_at": time.time(),
+            }
+        game_items = [(game, commence, ml) for ml in game.lines if _detectable(ml)]
+        results.append(("items", range(len(items), len(items) + len(game_items))))
+        items.extend(game_items)
+        item_events.extend([event_id] * len(game_items))
+
+    detected = _detect_lines(items, sport_label)
+    for event_id, opp in zip(item_events, detected):
+        if opp is not None and event_id is not None:
+            snapshot_cache[event_id]["opps"].append(opp)
+
+    opps = []
+    for kind, result in results:
+        if kind == "opps":
+            opps.extend(result)
+        else:
+            opps.extend(detected[i] for i in result if detected[i] is not None)
+    return opps
+
+
+# ─────────────────────────────────────────────────────
+# 📉  HISTORIQUE DES COTES (anneaux mappés en mémoire)
+# ─────────────────────────────────────────────────────
+# Une série par (match, marché, ligne, bookie, outcome): les derniers
+# changements de cote dans un anneau de taille fixe. Toutes les séries
+# vivent dans un fichier mappé de taille fixe; la série la moins récemment
+# vue est recyclée quand il est plein. Mémoire et disque bornés quel que
+# soit l'uptime, et l'historique survit aux redémarrages.
+
+class OddsHistory:
+    MAGIC = 0x545349485344444F   # "ODDSHIST"
+    VERSION = 1
+    HEADER_WORDS = 4          # magic, version, séries, ticks
+    SLOT_HEADER = 4           # clé (hash 64 bits, 0 = libre), tête, nb de ticks, vue le
+
+    def __init__(self, path: str, series: int, ticks: int):
+        self.series, self.ticks = series, ticks
+        self.slot_words = self.SLOT_HEADER + 2 * ticks   # + ticks × (instant, cote)
+        size = 8 * (self.HEADER_WORDS + series * self.slot_words)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        # Deux vues du même mapping, sans copie: entiers (en-têtes) et flottants (ticks)
+        self.words = memoryview(self.map).cast("q")
+        self.floats = memoryview(self.map).cast("d")
+        header = (self.MAGIC, self.VERSION, series, ticks)
+        if tuple(self.words[:self.HEADER_WORDS]) != header:
+            self.map[:] = bytes(size)
+            for i, value in enumerate(header):
+                self.words[i] = value
+        self.lock = threading.Lock()
+        self.index = OrderedDict()   # clé → slot, de la moins à la plus récemment vue
+        self.free = []
+        used = []
+        for slot in range(series - 1, -1, -1):
+            base = self._base(slot)
+            if self.words[base]:
+                used.append((self.floats[base + 3], self.words[base], slot))
+            else:
+                self.free.append(slot)
+        for _, key, slot in sorted(used):
+            self.index[key] = slot
+
+    def _base(self, slot: int) -> int:
+        return self.HEADER_WORDS + slot * self.slot_words
+
+    @staticmethod
+    def key(event_id, market: str, line, bookie: str, outcome: str) -> int:
+        # Hash stable d'un processus à l'autre (hash() est salé)
+        digest = hashlib.blake2b(f"{event_id}|{market}|{line}|{bookie}|{outcome}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little", signed=True) or 1
+
+    def append(self, key: int, ts: float, price: float, now: float = None) -> bool:
+        # O(1). Un tick seulement si la cote a changé, sinon seul "vue le" bouge.
+        with self.lock:
+            slot = self.index.get(key)
+            if slot is None:
+                slot = self.free.pop() if self.free else self.index.popitem(last=False)[1]
+                base = self._base(slot)
+                self.words[base], self.words[base + 1], self.words[base + 2] = key, 0, 0
+                self.index[key] = slot
+            else:
+                self.index.move_to_end(key)
+                base = self._base(slot)
+            head, count = self.words[base + 1], self.words[base + 2]
+            self.floats[base + 3] = now or time.time()
+            if count and self.floats[base + self.SLOT_HEADER + 2 * ((head - 1) % self.ticks) + 1] == price:
+                return False
+            at = base + self.SLOT_HEADER + 2 * head
+            self.floats[at], self.floats[at + 1] = ts, price
+            self.words[base + 1] = (head + 1) % self.ticks
+            self.words[base + 2] = min(count + 1, self.ticks)
+            return True
+
+    def last_ticks(self, key: int, n: int = None) -> list:
+        # [(instant, cote)] des n derniers changements, du plus ancien au plus récent
+        with self.lock:
+            slot = self.index.get(key)
+            if slot is None:
+                return []
+            base = self._base(slot)
+            head, count = self.words[base + 1], self.words[base + 2]
+            n = count if n is None else min(n, count)
+            ring = self.floats[base + self.SLOT_HEADER:base + self.slot_words]
+            positions = ((head - n + k) % self.ticks for k in range(n))
+            return [(ring[2 * p], ring[2 * p + 1]) for p in positions]
+
+    def last_change(self, key: int):
+        # (instant, cote précédente ou None, cote actuelle) du dernier changement
+        ticks = self.last_ticks(key, 2)
+        if not ticks:
+            return None
+        ts, price = ticks[-1]
+        return ts, (ticks[0][1] if len(ticks) == 2 else None), price
+
+    def rate_of_change(self, key: int, n: int = None):
+        # Variation de la cote en %/h sur les n derniers ticks (None si < 2)
+        ticks = self.last_ticks(key, n)
+        if len(ticks) < 2 or ticks[-1][0] <= ticks[0][0]:
+            return None
+        return (ticks[-1][1] / ticks[0][1] - 1) * 100 / ((ticks[-1][0] - ticks[0][0]) / 3600)
+
+    def flush(self):
+        self.map.flush()
+
+    def close(self):
+        with self.lock:
+            self.words.release()
+            self.floats.release()
+            self.map.close()
+
+
+history = {"store": None, "opened": False}
+
+
+def odds_history():
+    # None si désactivé (ODDS_HISTORY_SERIES=0) ou fichier inutilisable
+    if not history["opened"]:
+        history["opened"] = True
+        if ODDS_HISTORY_SERIES > 0:
+            try:
+                history["store"] = OddsHistory(ODDS_HISTORY_FILE, ODDS_HISTORY_SERIES, ODDS_HISTORY_TICKS)
+            except (OSError, ValueError) as e:
+                log.warning(f"Historique des cotes désactivé ({ODDS_HISTORY_FILE}): {e}")
+    return history["store"]
+
+
+def _stamp_epoch(last_update, default: float) -> float:
+    parsed = _parse_commence(last_update) if last_update else None
+    return parsed.timestamp() if parsed is not None else default
+
+
+def record_odds_history(games: list, now: float = None) -> int:
+    # À appeler avant la détection: un match que le cache de snapshots va
+    # servir tel quel n'a aucune cote nouvelle et est sauté, un match sans
+    # id aussi. Un tick est daté du last_update du bookie. Rend le nombre
+    # de cotes qui ont bougé.
+    store = odds_history()
+    if store is None:
+        return 0
+    now = now or time.time()
+    moved = 0
+    for game in games:
+        if game.event_id is None:
+            continue  # sans id, des matchs différents partageraient la même série
+        entry = snapshot_cache.get(game.event_id)
+        if entry is not None and game.signature is not None and entry["game"].stamps == game.signature:
+            continue
+        updated = {bookie: _stamp_epoch(last_update, now) for bookie, last_update in game.stamps}
+        for ml in game.lines:
+            n = len(ml.outcomes)
+            for b, bookie in enumerate(ml.books):
+                ts = updated.get(bookie, now)
+                for o, outcome in enumerate(ml.outcomes):
+                    price = ml.prices[b * n + o]
+                    if price:
+                        key = store.key(game.event_id, ml.market, ml.line, bookie, outcome)
+                        moved += store.append(key, ts, price, now)
+    return moved
+
+
+def leg_changes(opp) -> list:
+    # [(dernier changement ou None, outcome, bookie)] pour chaque jambe d'une opp
+    store = odds_history()
+    if store is None or opp.event_id is None:
+        return []
+    return [
+        (store.last_change(store.key(opp.event_id, opp.market, opp.line, bookie, team)), team, bookie)
+        for _, team, bookie, _, _ in opp.sides()
+    ]
+
+
+# ─────────────────────────────────────────────────────
+# 💼  ALLOCATION DE PORTEFEUILLE (opps simultanées)
+# ─────────────────────────────────────────────────────
+# Chaque opp seule est dimensionnée sur BANKROLL; quand plusieurs sont live
+# en même temps, leurs mises cumulées dépassent ce qu'on a sur les comptes.
+# L'allocation finance les plus rentables d'abord, chacune au plus ce que
+# permettent les soldes restants, les mises max de ses bookies et
+# STAKE_MAX_SHARE du solde de chaque bookie (sans ce plafond, la meilleure
+# opp viderait les comptes qu'elle touche), puis arrondit chaque mise à
+# l'incrément du bookie sans perdre le profit garanti.
+
+live_opps = {}  # sport_key → [Opportunity] du dernier scan complet de la ligue
+committed = {}  # _opp_id → {"books", "stakes", "allocation", "release_at"}: mises déjà alertées
+
+
+def _account(bookie: str, accounts: dict) -> dict:
+    return accounts.get(bookie) or {"balance": BANKROLL / max(len(BOOKS), 1), "max_stake": None, "unit": 1.0}
+
+
+def _round_stakes(targets: list, odds: list, books: list, units: list, max_stakes: list, slack: dict,
+                  share: dict):
+    # Mises arrondies à l'incrément inférieur, puis la jambe au plus petit
+    # gain est montée d'un incrément tant que le profit garanti augmente
+    # (et que solde, mise max et part max par opp le permettent). None si profit ≤ 0.
+    stakes = [int(t / u + 1e-9) * u for t, u in zip(targets, units)]
+    used = {}
+    for stake, bookie in zip(stakes, books):
+        slack[bookie] -= stake
+        used[bookie] = used.get(bookie, 0.0) + stake
+    profit = min(s * d for s, d in zip(stakes, odds)) - sum(stakes)
+    while True:
+        i = min(range(len(stakes)), key=lambda k: stakes[k] * odds[k])
+        bumped = stakes[i] + units[i]
+        if (slack[books[i]] < units[i] - 1e-9 or bumped > max_stakes[i] + 1e-9
+                or used[books[i]] + units[i] > share[books[i]] + 1e-9):
+            break
+        new_profit = min(bumped * odds[k] if k == i else stakes[k] * odds[k] for k in range(len(stakes))) \
+            - sum(stakes) - units[i]
+        if new_profit <= profit:
+            break
+        stakes[i], profit = bumped, new_profit
+        slack[books[i]] -= units[i]
+        used[books[i]] += units[i]
+    if profit <= 1e-9:
+        for stake, bookie in zip(stakes, books):
+            slack[bookie] += stake
+        return None
+    return stakes, profit
+
+
+def allocate_stakes(opps: list, accounts: dict = None) -> list:
+    # Pose opp.allocation = (mises, profit garanti) sur toutes les opps,
+    # mises = () pour une opp que les soldes ne permettent plus de financer.
+    # Calcul par jambe vectorisé (numpy); sans numpy chaque opp garde sa
+    # mise sur BANKROLL (allocation None).
+    accounts = BOOK_ACCOUNTS if accounts is None else accounts
+    if np is None or not opps:
+        for opp in opps:
+            opp.allocation = None
+        return opps
+
+    sides = [opp.sides() for opp in opps]
+    counts = np.fromiter((len(s) for s in sides), dtype=np.intp, count=len(opps))
+    starts = np.zeros(len(opps), dtype=np.intp)
+    np.cumsum(counts[:-1], out=starts[1:])
+    odds = np.fromiter((side[3] for s in sides for side in s), dtype=np.float64, count=int(counts.sum()))
+    books = [side[2] for s in sides for side in s]
+    book_ids = {bookie: i for i, bookie in enumerate(dict.fromkeys(books))}
+    leg_book = np.fromiter((book_ids[bookie] for bookie in books), dtype=np.intp, count=len(books))
+    book_accounts = [_account(bookie, accounts) for bookie in book_ids]
+    units = np.array([a["unit"] for a in book_accounts])[leg_book]
+    max_stakes = np.array([a["max_stake"] or np.inf for a in book_accounts])[leg_book]
+
+    # Part de la mise totale par jambe, rendement et mise totale max (mises max) par opp
+    inverse = 1.0 / odds
+    total_prob = np.add.reduceat(inverse, starts)
+    weights = inverse / np.repeat(total_prob, counts)
+    rates = 1.0 / total_prob - 1.0
+    caps = np.minimum.reduceat(max_stakes / weights, starts)
+
+    slack = {bookie: float(book_accounts[i]["balance"]) for bookie, i in book_ids.items()}
+    share = {bookie: max(balance, 0.0) * STAKE_MAX_SHARE for bookie, balance in slack.items()}
+    weights, odds, units, max_stakes = weights.tolist(), odds.tolist(), units.tolist(), max_stakes.tolist()
+    starts, counts, caps = starts.tolist(), counts.tolist(), caps.tolist()
+    for j in np.argsort(-rates, kind="stable").tolist():
+        legs = range(starts[j], starts[j] + counts[j])
+        need = {}
+        for k in legs:
+            need[books[k]] = need.get(books[k], 0.0) + weights[k]
+        total = min(caps[j], min(min(max(slack[bookie], 0.0), share[bookie]) / w for bookie, w in need.items()))
+        rounded = _round_stakes([total * weights[k] for k in legs], odds[legs.start:legs.stop],
+                                books[legs.start:legs.stop], units[legs.start:legs.stop],
+                                max_stakes[legs.start:legs.stop], slack, share) if total > 0 else None
+        if rounded is None:
+            opps[j].allocation = ((), 0.0)
+        else:
+            stakes, profit = rounded
+            opps[j].allocation = (tuple(round(s, 2) for s in stakes), round(profit, 2))
+    return opps
+
+
+def _opp_id(opp) -> tuple:
+    return opp.event_id or (opp.home, opp.away), opp.market, opp.line
+
+
+def _still_live(opp, now_utc: datetime) -> bool:
+    # Encore dans le cache de snapshots, match pas commencé, revu récemment
+    # et toujours détectée à la dernière évaluation de son match
+    entry = snapshot_cache.get(opp.event_id) if opp.event_id is not None else None
+    if entry is None or time.time() - entry["seen_at"] > LIVE_OPP_MAX_AGE:
+        return False
+    if entry["commence_dt"] is not None and entry["commence_dt"] <= now_utc:
+        return False
+    key = _opp_id(opp)
+    return any(_opp_id(o) == key for o in entry["opps"])
+
+
+def commit_allocation(opp):
+    # Appelé à l'envoi de l'alerte: ces mises sont désormais chez le
+    # parieur, elles sortent des soldes jusqu'au règlement du match
+    if opp.allocation is None or not opp.allocation[0]:
+        return
+    entry = snapshot_cache.get(opp.event_id) if opp.event_id is not None else None
+    commence_dt = entry["commence_dt"] if entry is not None else None
+    release_at = (commence_dt.timestamp() + STAKE_SETTLE_AFTER if commence_dt is not None
+                  else time.time() + SNAPSHOT_STALE_AFTER)
+    committed[_opp_id(opp)] = {
+        "books": [bookie for _, _, bookie, _, _ in opp.sides()],
+        "stakes": opp.allocation[0],
+        "allocation": opp.allocation,
+        "release_at": release_at,
+    }
+
+
+def _available_accounts(now: float) -> dict:
+    # Soldes diminués des mises engagées encore non réglées
+    for key in [k for k, c in committed.items() if c["release_at"] <= now]:
+        del committed[key]
+    accounts = {bookie: dict(account) for bookie, account in BOOK_ACCOUNTS.items()}
+    for entry in committed.values():
+        for bookie, stake in zip(entry["books"], entry["stakes"]):
+            account = accounts.setdefault(bookie, dict(_account(bookie, BOOK_ACCOUNTS)))
+            account["balance"] -= stake
+    return accounts
+
+
+def allocate_live(batch: list) -> list:
+    # Portefeuille = opps du lot + opps encore live des derniers scans
+    # complets (celles re-détectées dans le lot sont remplacées). Les opps
+    # déjà alertées gardent leurs mises, réservées avant tout le reste.
+    now_utc = datetime.now(timezone.utc)
+    accounts = _available_accounts(now_utc.timestamp())
+    fresh = {_opp_id(opp) for opp in batch}
+    pending = []
+    for opp in batch:
+        entry = committed.get(_opp_id(opp))
+        if entry is not None:
+            opp.allocation = entry["allocation"]
+        else:
+            pending.append(opp)
+    live = [opp for league in live_opps.values() for opp in league
+            if _opp_id(opp) not in fresh and _opp_id(opp) not in committed and _still_live(opp, now_utc)]
+    allocate_stakes(live + pending, accounts)
+    return batch
+
+
+# ─────────────────────────────────────────────────────
+# 💬  FORMAT ALERTE
+# ─────────────────────────────────────────────────────
+
+def _ago(seconds: float) -> str:
+    seconds = max(seconds, 0)
+    if seconds < 3600:
+        return f"{int(seconds // 60)} min"
+    return f"{int(seconds // 3600)}h {int(seconds % 3600 // 60)}m"
+
+
+def format_alert(opp: Opportunity) -> str:
+    mode_tag = "📄 PAPER" if PAPER_TRADING else "💰 LIVE"
+    p = opp.profit_pct
+    profit_emoji = "🤑" if p >= 5 else "💰" if p >= 3 else "✅" if p >= 2 else "⚡" if p >= 1 else "🔹"
+
+    msg = (
+        f"{profit_emoji} <b>ARB DETECTED [{mode_tag}] — {opp.sport}</b>\n"
+        f"<b>{opp.away} @ {opp.home}</b>\n"
+        f"🕐 {opp.commence} (<b>{opp.time_left} restant</b>)\n"
+    )
+    if opp.market != "h2h":
+        line = f" {opp.line:g}" if opp.market == "totals" else ""
+        msg += f"📐 {MARKET_LABELS.get(opp.market, opp.market)}{line}\n"
+    msg += "━━━━━━━━━━━━━━━━━━━━\n"
+
+    for (o, team, bookie, odd, _), stake in zip(opp.sides(), opp.stakes()):
+        label = BOOK_LABELS.get(bookie, bookie.upper())
+        others = ", ".join(
+            f"{BOOK_LABELS.get(bk, bk).split()[-1]}: {other}"
+            for bk, other in opp.line_odds.odds_for(o)
+            if bk != bookie
+        )
+        msg += f"{label}\n"
+        msg += f"   {team} @ <b>{odd}</b> ← meilleure\n"
+        if others:
+            msg += f"   (autres: {others})\n"
+        msg += f"   Mise: <b>${stake:g}</b>\n\n"
+
+    # Jambe qui a bougé en dernier vs jambe figée depuis longtemps: une cote
+    # ancienne face à une ligne qui bouge vite est souvent périmée
+    changes = sorted((c for c in leg_changes(opp) if c[0] is not None), key=lambda c: c[0][0])
+    moves = [c for c in changes if c[0][1] is not None]
+    if moves:
+        now = time.time()
+        (latest, before, after), team, bookie = moves[-1]
+        msg += f"📈 Dernier mouvement: {BOOK_LABELS.get(bookie, bookie)} ({team}) {before} → {after}, il y a {_ago(now - latest)}\n"
+        (oldest, _, _), team, bookie = changes[0]
+        if oldest < latest:
+            msg += f"🧊 Inchangée depuis {_ago(now - oldest)}: {BOOK_LABELS.get(bookie, bookie)} ({team})\n"
+
+    msg += "━━━━━━━━━━━━━━━━━━━━\n"
+    if opp.allocation is not None and opp.allocation[0]:
+        stakes, profit = opp.allocation
+        msg += (
+            f"{profit_emoji} Profit garanti: <b>${profit}</b> (<b>{opp.profit_pct}%</b>)\n"
+            f"   Sur ${sum(stakes):g} engagés (portefeuille des opps live)\n"
+        )
+    else:
+        msg += (
+            f"{profit_emoji} Profit garanti: <b>${opp.profit}</b> (<b>{opp.profit_pct}%</b>)\n"
+            f"   Sur bankroll de ${BANKROLL}\n"
+        )
+        if opp.allocation is not None:
+            msg += "   ⚠️ Soldes/limites des bookies épuisés par les opps live: mises indicatives\n"
+    msg += f"⏱ Détecté: {opp.detected_at}\n"
+
+    risky_involved = opp.risky_involved
+    if risky_involved and not PAPER_TRADING:
+        risky_str = ", ".join(risky_involved)
+        msg += f"\n⚠️ <b>Anti-flag:</b> varie ta mise ±1-2€ sur {risky_str}"
+    elif PAPER_TRADING:
+        msg += "\n📄 <i>Paper trade — aucun vrai pari placé</i>"
+
+    return msg
+
+
+def format_watch(entry: dict) -> str:
+    if entry["kind"] == "middle":
+        t1, t2 = entry["window"]
+        head = (f"🎯 <b>MIDDLE — {entry['sport']}</b> ({MARKET_LABELS.get(entry['market'], entry['market'])}, "
+                f"fenêtre {t1:g}–{t2:g})")
+        outcome = f"Pire cas: <b>{entry['profit_pct']}%</b> | Middle: <b>{entry['middle_pct']}%</b>"
+    else:
+        line = f" {entry['line']:g}" if entry["market"] == "totals" else ""
+        head = f"👀 <b>QUASI-ARB — {entry['sport']}</b> ({MARKET_LABELS.get(entry['market'], entry['market'])}{line})"
+        outcome = f"Profit: <b>{entry['profit_pct']}%</b> (seuil {MIN_PROFIT_PCT}%)"
+    legs = "\n".join(
+        f"   {side['team']} @ <b>{side['odd']}</b> — {BOOK_LABELS.get(side['bookie'], side['bookie'].upper())}"
+        f" (${side['stake']})"
+        for side in entry["sides"]
+    )
+    return (
+        f"{head}\n"
+        f"<b>{entry['away']} @ {entry['home']}</b> — {entry['commence']} ({entry['time_left']})\n"
+        f"{legs}\n"
+        f"{outcome}"
+    )
+
+
+# ─────────────────────────────────────────────────────
+# 💾  LOG
+# ─────────────────────────────────────────────────────
+
+log_writer = {"fh": None, "pending": 0, "last_sync": 0.0, "timer": None}
+log_lock = threading.Lock()
+
+
+def _open_log_for_append():
+    log_path = Path(LOG_FILE)
+    fh = open(log_path, "a", encoding="utf-8")
+    # Une écriture interrompue (crash) peut laisser une ligne tronquée sans \n:
+    # on repart sur une ligne neuve pour ne pas coller le prochain record dessus.
+    if log_path.stat().st_size > 0:
+        with open(log_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                fh.write("\n")
+    return fh
+
+
+def _fsync_log():
+    # Appelé sous log_lock
+    if log_writer["fh"] is not None and log_writer["pending"]:
+        os.fsync(log_writer["fh"].fileno())
+    log_writer["pending"] = 0
+    log_writer["last_sync"] = time.time()
+
+
+def _fsync_log_timer():
+    # Les lignes en attente sont fsyncées au plus tard LOG_FSYNC_INTERVAL
+    # après leur écriture, même si aucune opp ne suit
+    with log_lock:
+        log_writer["timer"] = None
+        _fsync_log()
+
+
+def log_opportunity(opp: dict):
+    with log_lock:
+        if log_writer["fh"] is None:
+            log_writer["fh"] = _open_log_for_append()
+            log_writer["last_sync"] = time.time()
+        fh = log_writer["fh"]
+        fh.write(json.dumps(opp, ensure_ascii=False) + "\n")
+        fh.flush()
+        log_writer["pending"] += 1
+        if (log_writer["pending"] >= LOG_FSYNC_EVERY
+                or time.time() - log_writer["last_sync"] >= LOG_FSYNC_INTERVAL):
+            _fsync_log()
+        elif log_writer["timer"] is None:
+            timer = threading.Timer(LOG_FSYNC_INTERVAL, _fsync_log_timer)
+            timer.daemon = True
+            timer.start()
+            log_writer["timer"] = timer
+
+
+def close_opportunity_log():
+    with log_lock:
+        fh = log_writer["fh"]
+        if log_writer["timer"] is not None:
+            log_writer["timer"].cancel()
+        if fh is None:
+            return
+        fh.flush()
+        os.fsync(fh.fileno())
+        fh.close()
+        log_writer.update(fh=None, pending=0, timer=None)
+
+
+def iter_logged_opportunities(path: str = LOG_FILE):
+    # Lecture en flux: une ligne corrompue (crash en cours d'écriture) est ignorée.
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+    if skipped:
+        log.warning(f"{skipped} ligne(s) illisible(s) ignorée(s) dans {path}")
+
+
+def migrate_legacy_log():
+    # Migration one-shot: tableau JSON → JSONL. Les lignes déjà présentes dans
+    # le JSONL sont conservées après l'historique, puis l'ancien fichier est renommé.
+    legacy_path = Path(LEGACY_LOG_FILE)
+    if not legacy_path.exists():
+        return
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+    except Exception as e:
+        log.error(f"Migration log impossible ({legacy_path}): {e}")
+        return
+
+    log_path = Path(LOG_FILE)
+    lines = [json.dumps(opp, ensure_ascii=False) + "\n" for opp in legacy]
+    if lines and log_path.exists():
+        with open(log_path, "r", encoding="utf-8") as f:
+            already = list(islice(f, len(lines))) == lines
+        if already:
+            # Crash entre os.replace et le renommage: le JSONL commence déjà
+            # par l'historique, le re-migrer le dupliquerait
+            legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+            log.info(f"📦 {legacy_path} déjà migré vers {log_path}: renommé")
+            return
+
+    tmp_path = log_path.with_name(log_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        out.writelines(lines)
+        if log_path.exists():
+            for opp in iter_logged_opportunities(str(log_path)):
+                out.write(json.dumps(opp, ensure_ascii=False) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, log_path)
+    legacy_path.rename(legacy_path.with_name(legacy_path.name + ".migrated"))
+    log.info(f"📦 {len(legacy)} opp(s) migrée(s) de {legacy_path} vers {log_path}")
+
+
+# ─────────────────────────────────────────────────────
+# 🗄️  STORE SQLITE (index + agrégats incrémentaux du log)
+# ─────────────────────────────────────────────────────
+
+# Le JSONL reste la source de vérité; la base SQLite l'indexe par lots.
+# L'offset du JSONL déjà ingéré est commité dans la même transaction que
+# les lignes, donc un crash ne duplique ni ne perd rien.
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS opportunities (
+    id          INTEGER PRIMARY KEY,
+    detected_ts REAL NOT NULL,
+    hour        TEXT NOT NULL,
+    sport       TEXT NOT NULL,
+    event       TEXT NOT NULL,
+    book_pair   TEXT NOT NULL,
+    profit_pct  REAL NOT NULL,
+    profit      REAL NOT NULL,
+    payload     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_opp_time  ON opportunities(detected_ts);
+CREATE INDEX IF NOT EXISTS idx_opp_sport ON opportunities(sport, detected_ts);
+CREATE INDEX IF NOT EXISTS idx_opp_event ON opportunities(event, detected_ts);
+CREATE TABLE IF NOT EXISTS opportunity_books (
+    opp_id      INTEGER NOT NULL,
+    bookie      TEXT NOT NULL,
+    detected_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_books_bookie ON opportunity_books(bookie, detected_ts);
+CREATE TABLE IF NOT EXISTS agg_hourly (
+    hour TEXT, sport TEXT, book_pair TEXT,
+    n INTEGER, sum_pct REAL, max_pct REAL, min_pct REAL, sum_profit REAL,
+    PRIMARY KEY (hour, sport, book_pair)
+);
+CREATE TABLE IF NOT EXISTS agg_hourly_book (
+    hour TEXT, sport TEXT, bookie TEXT,
+    n INTEGER, sum_pct REAL, max_pct REAL, min_pct REAL, sum_profit REAL,
+    PRIMARY KEY (hour, sport, bookie)
+);
+CREATE TABLE IF NOT EXISTS agg_events (
+    event TEXT PRIMARY KEY, sport TEXT,
+    first_seen REAL, last_seen REAL, n INTEGER, best_pct REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_first ON agg_events(first_seen);
+"""
+
+ANALYZE_GROUPS = ("sport", "bookmaker", "pair", "day", "hour", "lifetime")
+
+store = {"conn": None, "last_sync": 0.0}
+
+
+def open_store(path: str = STORE_FILE) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+
+def _event_key(opp: dict) -> str:
+    market = opp.get("market", "h2h")
+    if opp.get("line") is not None:
+        market = f"{market} {opp['line']:g}"
+    return f"{opp['sport']}|{opp['away']} @ {opp['home']}|{opp['commence']}|{market}"
+
+
+def _merge_agg(aggs: dict, key: tuple, pct: float, profit: float):
+    agg = aggs.get(key)
+    if agg is None:
+        aggs[key] = [1, pct, pct, pct, profit]
+    else:
+        agg[0] += 1
+        agg[1] += pct
+        agg[2] = max(agg[2], pct)
+        agg[3] = min(agg[3], pct)
+        agg[4] += profit
+
+
+def _ingest_batch(conn: sqlite3.Connection, lines: list, offset: int):
+    # lines: [(opp, ligne JSON brute)]
+    hourly, hourly_book, events = {}, {}, {}
+    rows, book_rows = [], []
+    with conn:
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM opportunities").fetchone()[0]
+        for opp, raw in lines:
+            ts = _logged_timestamp(opp)
+            if ts is None:
+                continue
+            hour = opp["detected_at"][:13]
+            bookies = sorted({side["bookie"] for side in opp.get("sides", [])})
+            pair = "+".join(bookies)
+            event = _event_key(opp)
+            pct, profit = opp["profit_pct"], opp["profit"]
+            rows.append((next_id, ts, hour, opp["sport"], event, pair, pct, profit, raw))
+            book_rows.extend((next_id, bookie, ts) for bookie in bookies)
+            next_id += 1
+            _merge_agg(hourly, (hour, opp["sport"], pair), pct, profit)
+            for bookie in bookies:
+                _merge_agg(hourly_book, (hour, opp["sport"], bookie), pct, profit)
+            ev = events.get(event)
+            if ev is None:
+                events[event] = [opp["sport"], ts, ts, 1, pct]
+            else:
+                ev[1], ev[2], ev[3], ev[4] = min(ev[1], ts), max(ev[2], ts), ev[3] + 1, max(ev[4], pct)
+
+        conn.executemany(
+            "INSERT INTO opportunities (id, detected_ts, hour, sport, event, book_pair, profit_pct, profit, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.executemany("INSERT INTO opportunity_books (opp_id, bookie, detected_ts) VALUES (?, ?, ?)", book_rows)
+        for table, column, aggs in (("agg_hourly", "book_pair", hourly), ("agg_hourly_book", "bookie", hourly_book)):
+            conn.executemany(
+                f"INSERT INTO {table} (hour, sport, {column}, n, sum_pct, max_pct, min_pct, sum_profit) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (hour, sport, {column}) DO UPDATE SET "
+                f"n = n + excluded.n, sum_pct = sum_pct + excluded.sum_pct, "
+                f"max_pct = MAX(max_pct, excluded.max_pct), min_pct = MIN(min_pct, excluded.min_pct), "
+                f"sum_profit = sum_profit + excluded.sum_profit",
+                [key + tuple(agg) for key, agg in aggs.items()],
+            )
+        conn.executemany(
+            "INSERT INTO agg_events (event, sport, first_seen, last_seen, n, best_pct) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (event) DO UPDATE SET "
+            "first_seen = MIN(first_seen, excluded.first_seen), last_seen = MAX(last_seen, excluded.last_seen), "
+            "n = n + excluded.n, best_pct = MAX(best_pct, excluded.best_pct)",
+            [(event,) + tuple(ev) for event, ev in events.items()],
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('jsonl_offset', ?)", (str(offset),))
+
+
+def sync_store(conn: sqlite3.Connection = None) -> int:
+    # Ingère les lignes du JSONL ajoutées depuis le dernier sync, par lots de
+    # STORE_BATCH_SIZE (une transaction par lot). Retourne le nombre d'opps.
+    log_path = Path(LOG_FILE)
+    if not log_path.exists():
+        return 0
+    conn = conn or store["conn"] or open_store()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'jsonl_offset'").fetchone()
+    offset = int(row[0]) if row else 0
+    if log_path.stat().st_size < offset:
+        log.warning(f"{LOG_FILE} plus court que l'offset ingéré: réindexation complète")
+        with conn:
+            for table in ("opportunities", "opportunity_books", "agg_hourly", "agg_hourly_book", "agg_events"):
+                conn.execute(f"DELETE FROM {table}")
+        offset = 0
+
+    ingested = 0
+    batch = []
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # ligne en cours d'écriture: reprise au prochain sync
+            offset += len(raw)
+            try:
+                batch.append((json.loads(raw), raw.decode("utf-8").rstrip("\n")))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+            if len(batch) >= STORE_BATCH_SIZE:
+                _ingest_batch(conn, batch, offset)
+                ingested += len(batch)
+                batch = []
+    _ingest_batch(conn, batch, offset)
+    return ingested + len(batch)
+
+
+def maybe_sync_store(force: bool = False):
+    # Appelé par la boucle de scan: les écritures SQLite sont groupées
+    if not force and time.time() - store["last_sync"] < STORE_SYNC_INTERVAL:
+        return
+    try:
+        if store["conn"] is None:
+            store["conn"] = open_store()
+        sync_store(store["conn"])
+    except sqlite3.Error as e:
+        log.error(f"Store SQLite: {e}")
+    store["last_sync"] = time.time()
+
+
+# ─────────────────────────────────────────────────────
+# 🎞️  ENREGISTREMENT & REPLAY
+# ─────────────────────────────────────────────────────
+
+# Paramètres balayables en replay: NOM=v1,v2,... (BOOKS: bookies séparés par +)
+SWEEP_PARAMS = {
+    "MIN_PROFIT_PCT": float,
+    "BANKROLL": float,
+    "BOOKS": lambda v: v.split("+"),
+}
+
+
+def record_payload(sport_key: str, games: list, fetched_at: float = None):
+    # Un segment gzip par jour (UTC), une ligne par réponse de ligue.
+    # Chaque append ajoute un membre gzip: un crash ne corrompt que la fin.
+    if not RECORD_PAYLOADS:
+        return
+    fetched_at = fetched_at or time.time()
+    day = datetime.fromtimestamp(fetched_at, timezone.utc).strftime("%Y-%m-%d")
+    path = Path(RECORD_DIR) / f"{day}.jsonl.gz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps({"ts": fetched_at, "sport": sport_key, "games": games}, ensure_ascii=False)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def snapshot_files(start: str = None, end: str = None) -> list:
+    # Index temporel = nom du segment (YYYY-MM-DD), bornes incluses
+    files = []
+    for path in sorted(Path(RECORD_DIR).glob("*.jsonl.gz")):
+        day = path.name[:10]
+        if (start and day < start) or (end and day > end):
+            continue
+        files.append(str(path))
+    return files
+
+
+def iter_snapshots(path: str):
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    snap = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield snap["ts"], snap["sport"], snap["games"]
+    except (EOFError, OSError, zlib.error) as e:
+        log.warning(f"Segment tronqué {path}: {e}")
+
+
+def _replay_segment(path: str, overrides: dict) -> dict:
+    # Tourne dans un process du pool: les overrides ne touchent que ce process
+    globals().update(overrides)
+    result = {"scans": 0, "games": 0, "opps": 0, "profits": [], "events": set(), "by_sport": {}}
+    for ts, sport_key, games in iter_snapshots(path):
+        now_utc = datetime.fromtimestamp(ts, timezone.utc)
+        sport_label = SPORTS.get(sport_key, sport_key)
+        result["scans"] += 1
+        result["games"] += len(games)
+        for opp in find_arb_opportunities_batch(compact_payload(games, use_cache=False), sport_label, now_utc):
+            result["opps"] += 1
+            result["profits"].append(opp.profit_pct)
+            result["events"].add((opp.sport, opp.home, opp.away, opp.commence, opp.market, opp.line))
+            result["by_sport"][sport_label] = result["by_sport"].get(sport_label, 0) + 1
+    return result
+
+
+def _parse_sweep(args: list):
+    start = end = None
+    grid = {}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("--from", "--to") and i + 1 < len(args):
+            if arg == "--from":
+                start = args[i + 1]
+            else:
+                end = args[i + 1]
+            i += 2
+            continue
+        name, _, values = arg.partition("=")
+        if name not in SWEEP_PARAMS or not values:
+            raise ValueError(f"Paramètre inconnu: {arg} (attendus: {', '.join(SWEEP_PARAMS)})")
+        grid[name] = [SWEEP_PARAMS[name](v) for v in values.split(",")]
+        i += 1
+    names = list(grid)
+    configs = [dict(zip(names, combo)) for combo in product(*grid.values())] if names else [{}]
+    return start, end, configs
+
+
+def replay(args: list):
+    # python arb_scanner_v2.py replay [--from YYYY-MM-DD] [--to YYYY-MM-DD] [MIN_PROFIT_PCT=0.5,1 ...]
+    try:
+        start, end, configs = _parse_sweep(args)
+    except ValueError as e:
+        print(e)
+        return
+    files = snapshot_files(start, end)
+    if not files:
+        print(f"Aucun snapshot dans {RECORD_DIR}/.")
+        return
+
+    t0 = time.time()
+    merged = [{"scans": 0, "games": 0, "opps": 0, "profits": [], "events": set(), "by_sport": {}}
+              for _ in configs]
+    with ProcessPoolExecutor() as pool:
+        futures = {
+            pool.submit(_replay_segment, path, config): c
+            for c, config in enumerate(configs) for path in files
+        }
+        for future in as_completed(futures):
+            part = future.result()
+            total = merged[futures[future]]
+            for key in ("scans", "games", "opps"):
+                total[key] += part[key]
+            total["profits"].extend(part["profits"])
+            total["events"] |= part["events"]
+            for sport, n in part["by_sport"].items():
+                total["by_sport"][sport] = total["by_sport"].get(sport, 0) + n
+    elapsed = time.time() - t0
+
+    scans = merged[0]["scans"]
+    games = merged[0]["games"]
+    print(f"\n{'═'*64}")
+    print(f"  REPLAY — {len(files)} segment(s), {scans} scans, {games} matchs")
+    print(f"  {len(configs)} config(s) en {elapsed:.2f}s "
+          f"({games * len(configs) / max(elapsed, 1e-9):,.0f} matchs/s)")
+    print(f"{'═'*64}")
+    ranked = sorted(zip(configs, merged), key=lambda cm: -sum(cm[1]["profits"]))
+    for config, total in ranked:
+        label = " ".join(
+            f"{k}={'+'.join(v) if isinstance(v, list) else v}" for k, v in config.items()
+        ) or "config actuelle"
+        profits = total["profits"]
+        avg = sum(profits) / len(profits) if profits else 0.0
+        print(f"\n⚙️  {label}")
+        print(f"   🎯 {total['opps']} détections | {len(total['events'])} matchs uniques | "
+              f"profit moyen {avg:.2f}%")
+        for sport, n in sorted(total["by_sport"].items(), key=lambda x: -x[1]):
+            print(f"      {sport}: {n}")
+    print(f"{'═'*64}\n")
+
+
+# ─────────────────────────────────────────────────────
+# ♻️  CHECKPOINT (redémarrage rapide)
+# ─────────────────────────────────────────────────────
+
+CHECKPOINT_VERSION = 1
+checkpoint = {"last": 0.0, "dirty": False, "fingerprint": None}
+last_payloads = {}  # sport_key → (instant du fetch, [Game]) du dernier scan complet
+
+
+def _game_to_json(game: Game) -> list:
+    return [
+        game.event_id, game.home, game.away, game.commence_raw,
+        [list(stamp) for stamp in game.stamps],
+        [[ml.market, ml.line, list(ml.books), list(ml.outcomes), ml.prices.tolist()] for ml in game.lines],
+    ]
+
+
+def _game_from_json(data: list) -> Game:
+    event_id, home, away, commence_raw, stamps, lines = data
+    return Game(
+        event_id, _intern(home), _intern(away), commence_raw,
+        tuple((_intern(bookie), last_update) for bookie, last_update in stamps),
+        tuple(
+            MarketLine(_intern(market), line, tuple(map(_intern, books)), tuple(map(_intern, outcomes)),
+                       array("d", prices))
+            for market, line, books, outcomes, prices in lines
+        ),
+    )
+
+
+def _checkpoint_fingerprint(stats: dict, seen: dict) -> str:
+    # Tout ce que le checkpoint restaure, hors TTL restants (qui baissent
+    # d'eux-mêmes) et matchs (identifiés par l'instant de leur fetch)
+    return hashlib.blake2b(json.dumps([
+        stats, state["paused"], state["last_update_id"], quota["remaining"], sorted(seen),
+        {k: sport_schedule[k] for k in MY_SPORTS},
+        {k: fetched_at for k, (fetched_at, _) in list(last_payloads.items())},
+    ], sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def save_checkpoint(path: str = CHECKPOINT_FILE) -> bool:
+    # Écriture atomique: fichier temporaire fsyncé puis os.replace, un
+    # crash en cours d'écriture laisse le checkpoint précédent intact.
+    # Rien n'est réécrit si l'état restaurable n'a pas changé (False).
+    now = time.time()
+    with stats_lock:
+        stats = dict(session_stats)
+    seen = shared_store().ttls("seen:")
+    fingerprint = _checkpoint_fingerprint(stats, seen)
+    if fingerprint == checkpoint["fingerprint"] and Path(path).exists():
+        checkpoint.update(last=now, dirty=False)
+        return False
+    data = {
+        "version": CHECKPOINT_VERSION,
+        "saved_at": now,
+        "session_stats": stats,
+        "state": {"paused": state["paused"], "last_update_id": state["last_update_id"]},
+        "quota_remaining": quota["remaining"],
+        "seen": seen,
+        "schedule": {k: sport_schedule[k] for k in MY_SPORTS},
+        "payloads": {
+            sport_key: {"fetched_at": fetched_at, "games": [_game_to_json(g) for g in games]}
+            for sport_key, (fetched_at, games) in list(last_payloads.items())
+        },
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=1) as gz:
+            gz.write(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if history["store"] is not None:
+        history["store"].flush()
+    checkpoint.update(last=now, dirty=False, fingerprint=fingerprint)
+    return True
+
+
+def maybe_checkpoint(force: bool = False):
+    if not force and not checkpoint["dirty"] and time.time() - checkpoint["last"] < CHECKPOINT_INTERVAL:
+        return
+    try:
+        save_checkpoint()
+    except Exception as e:
+        log.error(f"Checkpoint impossible: {e}")
+
+
+def restore_checkpoint(path: str = CHECKPOINT_FILE):
+    # Rien n'est ré-alerté (clés de dédoublonnage restaurées avec leur TTL
+    # restant), l'offset Telegram repart du dernier update traité, et une
+    # ligue dont le prochain fetch n'est pas encore dû ne consomme pas de
+    # quota: ses derniers matchs remplissent le cache et la watchlist.
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, zlib.error) as e:
+        log.warning(f"Checkpoint illisible ({path}): {e} — démarrage à froid")
+        return None
+    if data.get("version") != CHECKPOINT_VERSION:
+        log.warning(f"Checkpoint version {data.get('version')} ignoré — démarrage à froid")
+        return None
+
+    now = time.time()
+    age = now - data["saved_at"]
+    store = shared_store()
+    session_stats.update(data["session_stats"])
+    # Le flag partagé fait foi: un worker qui redémarre ne doit pas mettre
+    # en pause (ou relancer) tout le cluster avec sa valeur sauvegardée
+    shared_paused = store.get("paused")
+    if shared_paused is None:
+        state["paused"] = data["state"]["paused"]
+        store.set("paused", "1" if state["paused"] else "0")
+    else:
+        state["paused"] = shared_paused == "1"
+    # /resume déjà appliqué avant l'arrêt: sans ce compteur, le premier
+    # sync_shared_state rendrait dues toutes les ligues restaurées
+    state["resume_epoch"] = store.get("resume_epoch")
+    offset = store.get("telegram_offset")
+    state["last_update_id"] = max(data["state"]["last_update_id"], int(offset) if offset is not None else 0)
+    store.set("telegram_offset", state["last_update_id"])
+    if quota["remaining"] is None:
+        quota["remaining"] = data["quota_remaining"]
+    for key, ttl in data["seen"].items():
+        if ttl - age > 0:
+            store.claim(f"seen:{key}", ttl - age)
+
+    fresh = 0
+    for sport_key, entry in data["schedule"].items():
+        if sport_key not in MY_SPORTS:
+            continue
+        sport_schedule[sport_key].update(entry)
+        if entry["next_fetch"] > now:
+            fresh += 1
+    for sport_key, payload in data["payloads"].items():
+        if sport_key not in MY_SPORTS:
+            continue
+        games = [_game_from_json(g) for g in payload["games"]]
+        watch = []
+        live_opps[sport_key] = find_arb_opportunities_cached(games, SPORTS[sport_key], watch)
+        update_watchlist(SPORTS[sport_key], watch)
+        last_payloads[sport_key] = (payload["fetched_at"], games)
+    evict_snapshots()
+    cache_stats.update(hits=0, misses=0, evictions=0)
+    checkpoint["last"] = now
+    log.info(f"♻️ Checkpoint restauré ({int(age)}s): {fresh}/{len(MY_SPORTS)} ligues fraîches, "
+             f"{len(snapshot_cache)} matchs en cache, offset Telegram {state['last_update_id']}")
+    return {"age": age, "fresh": fresh}
+
+
+def _on_sigterm(signum, frame):
+    # Render envoie SIGTERM au redéploiement: même sortie propre que Ctrl+C
+    raise KeyboardInterrupt
+
+
+# ─────────────────────────────────────────────────────
+# 🔄  BOUCLE PRINCIPALE
+# ─────────────────────────────────────────────────────
+
+def dispatch_opportunities(opps: list, detected: float) -> int:
+    # Alerte + log des opps d'un lot, meilleures d'abord; une même opp
+    # n'est renvoyée qu'après POLL_INTERVAL, tous workers confondus. Les
+    # mises sont réparties avec les opps encore live (allocate_live).
+    sent = 0
+    if opps:
+        allocate_live(opps)
+    for opp in sorted(opps, key=lambda o: o.profit_pct, reverse=True):
+        key = f"seen:{opp.home}-{opp.away}-{opp.market}-{opp.line}-{opp.profit_pct}"
+        if not shared_store().claim(key, POLL_INTERVAL):
+            continue
+        sent += 1
+        commit_allocation(opp)
+        session_stats["opps_found"] += 1
+        shared_store().incr("stats:opps_found")
+        if opp.profit_pct > session_stats["best_profit_pct"]:
+            session_stats["best_profit_pct"] = opp.profit_pct
+        with timed("arb_format_alert_seconds"):
+            alert = format_alert(opp)
+        send_telegram(alert, coalesce=True, detected=detected)
+        logged = opp.to_dict()
+        log_opportunity(logged)
+        record_opportunity(logged)
+        log.info(f"✅ {opp.profit_pct}% | {opp.away} @ {opp.home} | {opp.time_left}")
+    return sent
+
+
+def run_scanner():
+    log.info("🚀 ARB SCANNER v9 STARTED")
+    if not MY_SPORTS:
+        log.error(f"Shard vide: WORKER_INDEX={WORKER_INDEX} pour WORKER_COUNT={WORKER_COUNT} ({len(SPORTS)} ligues)")
+        return
+    if WORKER_COUNT > 1:
+        log.info(f"🤝 Worker {WORKER_INDEX + 1}/{WORKER_COUNT} ({WORKER_ID}): {', '.join(MY_SPORTS)}")
+    if len(providers) > 1:
+        log.info(f"🔗 Sources: {', '.join(p.name for p in providers)} | bookies: {', '.join(BOOKS)}")
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _on_sigterm)
+    migrate_legacy_log()
+    load_opp_history()
+    restored = restore_checkpoint()
+    send_startup_message(restored)
+    start_command_listener()
+    start_metrics_server()
+
+    last_report = time.time()
+    REPORT_INTERVAL = 3600
+
+    while True:
+        try:
+            sync_shared_state()
+            if state["paused"]:
+                log.info("⏸ En pause...")
+                wait_for_wakeup(60)
+                wake_event.clear()
+                continue
+
+            wake_event.clear()
+            due = due_sports()
+            if not due:
+                wait_for_wakeup(seconds_until_next_fetch())
+                continue
+
+            session_stats["scans"] += 1
+            log.info(f"─── Scan #{session_stats['scans']} ({len(due)}/{len(MY_SPORTS)} ligues) ───")
+
+            # Chaque lot de matchs est détecté et alerté dès sa sortie du flux;
+            # le planning et la watchlist d'une ligue attendent sa fin.
+            n_opps = 0
+            new_watch = []
+            league_games = {}
+            league_watch = {}
+            league_opps = {}
+            fetched = []
+            for sport_key, games, outcome in fetch_all_odds(due):
+                league_games.setdefault(sport_key, []).extend(games)
+                watch = league_watch.setdefault(sport_key, [])
+                record_odds_history(games)
+                with timed("arb_detect_seconds", sport=sport_key):
+                    batch_opps = find_arb_opportunities_cached(games, SPORTS[sport_key], watch)
+                league_opps.setdefault(sport_key, []).extend(batch_opps)
+                n_opps += dispatch_opportunities(batch_opps, time.perf_counter())
+                if outcome == "ok":
+                    fetched.append(sport_key)
+                    live_opps[sport_key] = league_opps.pop(sport_key)
+                    last_payloads[sport_key] = (time.time(), league_games[sport_key])
+                    record_fetch(sport_key, league_games.pop(sport_key))
+                    new_watch.extend(update_watchlist(SPORTS[sport_key], league_watch.pop(sport_key)))
+                elif outcome == "failed":
+                    # Ligue incomplète: planning et watchlist restent ceux du dernier fetch réussi
+                    league_games.pop(sport_key)
+                    league_watch.pop(sport_key)
+                    league_opps.pop(sport_key)
+            evict_snapshots()
+            log.info(
+                f"🗃 Cache: {cache_stats['hits']} hits | {cache_stats['misses']} misses | "
+                f"{cache_stats['evictions']} evictions ({len(snapshot_cache)} matchs)"
+            )
+            cache_stats.update(hits=0, misses=0, evictions=0)
+            # Seules les ligues fetchées en entier sont replanifiées; les
+            # abandonnées (deadline, /pause) ou en échec restent quasi dues
+            if fetched:
+                plan_next_fetches(fetched)
+            defer_fetches(k for k in due if k not in fetched)
+
+            if n_opps:
+                log.info(f"🎯 {n_opps} opportunité(s)")
+            else:
+                log.info("❌ Aucune opportunité.")
+
+            with watch_lock:
+                watched = len(watchlist)
+                middles = sum(1 for e in watchlist.values() if e["kind"] == "middle")
+            log.info(f"👀 Watchlist: {watched - middles} quasi-arbs | {middles} middles ({len(new_watch)} nouveaux)")
+            for entry in new_watch:
+                if entry["kind"] == "middle" and entry["profit_pct"] >= WATCH_ALERT_MIN_PCT:
+                    send_telegram(format_watch(entry), silent=True, coalesce=True)
+
+            if time.time() - last_report > REPORT_INTERVAL:
+                if is_leader():
+                    send_stats_update()
+                last_report = time.time()
+
+            shared_store().purge()
+            if is_leader():
+                maybe_sync_store()
+            maybe_checkpoint()
+
+            # Réveil anticipé sur /pause ou /resume
+            wait_for_wakeup(seconds_until_next_fetch())
+
+        except KeyboardInterrupt:
+            log.info("Arrêt manuel.")
+            maybe_checkpoint(force=True)
+            if history["store"] is not None:
+                history["store"].close()
+                history["store"] = None
+            close_opportunity_log()
+            maybe_sync_store(force=True)
+            send_stats_update()
+            send_telegram("⛔ <b>Scanner arrêté.</b>")
+            flush_telegram()
+            break
         except Exception as e:
             log.error(f"Erreur: {e}")
             time.sleep(30)
 
 
+# ─────────────────────────────────────────────────────
+# 🧮  COLONNES D'ANALYSE (cache binaire du log)
+# ─────────────────────────────────────────────────────
+
+# `analyze` travaille sur des colonnes numpy plutôt que sur les dicts du
+# JSONL: une ligne par opp, une ligne par (opp, bookie) pour les legs, et
+# les chaînes (ligue, match, paire, bookie) encodées par dictionnaire.
+# Les colonnes sont gardées dans un fichier à côté du log et relues par
+# mmap: un rerun ne parse que les lignes ajoutées depuis le précédent.
+ANALYZE_CACHE_MAGIC = b"ARBCOLS1"
+ANALYZE_CACHE_VERSION = 1
+ANALYZE_ROW_COLUMNS = (
+    ("ts", "<f8"), ("pct", "<f8"), ("profit", "<f8"),
+    ("sport", "<i4"), ("event", "<i4"), ("pair", "<i4"),
+    ("day", "<i4"), ("hour", "u1"), ("weekday", "u1"),
+)
+ANALYZE_LEG_COLUMNS = (("leg_row", "<i4"), ("leg_book", "<i4"))
+ANALYZE_DICTS = ("sport", "event", "pair", "book")
+ANALYZE_HEAD_BYTES = 4096  # début du log haché pour détecter une réécriture (migration)
+
+analysis = {"path": None, "cols": None}  # colonnes relues par un process du pool
+
+
+def _empty_columns() -> dict:
+    cols = {name: np.empty(0, dtype) for name, dtype in ANALYZE_ROW_COLUMNS + ANALYZE_LEG_COLUMNS}
+    cols.update(dicts={name: [] for name in ANALYZE_DICTS}, offset=0, head="", head_len=0, path=None)
+    return cols
+
+
+def _log_head(path: str, length: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(length), digest_size=8).hexdigest()
+
+
+def _align(n: int) -> int:
+    return (n + 63) & ~63
+
+
+def save_log_columns(cols: dict, path: str = ANALYZE_CACHE_FILE):
+    # MAGIC | taille de l'entête (u64) | entête JSON | colonnes alignées sur 64 octets
+    layout, pos = {}, 0
+    for name, _ in ANALYZE_ROW_COLUMNS + ANALYZE_LEG_COLUMNS:
+        column = cols[name]
+        layout[name] = [column.dtype.str, len(column), pos]
+        pos = _align(pos + column.nbytes)
+    header = json.dumps({
+        "version": ANALYZE_CACHE_VERSION, "offset": cols["offset"], "head": cols["head"],
+        "head_len": cols["head_len"], "dicts": cols["dicts"], "columns": layout,
+    }, ensure_ascii=False).encode("utf-8")
+    base = _align(16 + len(header))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(ANALYZE_CACHE_MAGIC + len(header).to_bytes(8, "little") + header)
+        for name, (_, _, col_pos) in layout.items():
+            f.seek(base + col_pos)
+            f.write(np.ascontiguousarray(cols[name]).data)
+        f.truncate(base + pos)
+    os.replace(tmp_path, path)
+    cols["path"] = path
+
+
+def load_cached_columns(path: str = ANALYZE_CACHE_FILE):
+    # Colonnes en lecture seule directement sur le mmap: aucune copie, le
+    # coût d'ouverture ne dépend pas de la taille de l'historique
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        if mm[:8] != ANALYZE_CACHE_MAGIC:
+            return None
+        size = int.from_bytes(mm[8:16], "little")
+        header = json.loads(mm[16:16 + size])
+        if header["version"] != ANALYZE_CACHE_VERSION:
+            return None
+        base = _align(16 + size)
+        cols = {name: np.frombuffer(mm, dtype=dtype, count=n, offset=base + pos)
+                for name, (dtype, n, pos) in header["columns"].items()}
+    except (ValueError, KeyError) as e:
+        log.warning(f"Cache colonnes illisible ({path}): {e}")
+        return None
+    cols.update(dicts=header["dicts"], offset=header["offset"], head=header["head"],
+                head_len=header["head_len"], path=path)
+    return cols
+
+
+def _complete_lines_end(path: str, start: int, size: int) -> int:
+    # Fin de la dernière ligne complète: une ligne en cours d'écriture attend le prochain run
+    with open(path, "rb") as f:
+        pos = size
+        while pos > start:
+            block = min(64 * 1024, pos - start)
+            f.seek(pos - block)
+            newline = f.read(block).rfind(b"\n")
+            if newline >= 0:
+                return pos - block + newline + 1
+            pos -= block
+    return start
+
+
+def _split_log_range(path: str, start: int, end: int, chunk: int = ANALYZE_PARSE_CHUNK) -> list:
+    # Tranches de ~chunk octets coupées sur des fins de ligne
+    bounds = [start]
+    with open(path, "rb") as f:
+        while end - bounds[-1] > chunk:
+            f.seek(bounds[-1] + chunk)
+            f.readline()
+            if f.tell() >= end:
+                break
+            bounds.append(f.tell())
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _parse_log_range(path: str, start: int, end: int) -> dict:
+    # Tourne dans un process du pool: lignes de [start, end) → colonnes, avec
+    # des dictionnaires propres à la tranche (recodés par _append_columns)
+    tables = {name: {} for name in ANALYZE_DICTS}
+    rows = {name: [] for name, _ in ANALYZE_ROW_COLUMNS}
+    legs = {name: [] for name, _ in ANALYZE_LEG_COLUMNS}
+
+    def code(name: str, value: str) -> int:
+        table = tables[name]
+        found = table.get(value)
+        if found is None:
+            found = table[value] = len(table)
+        return found
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for raw in data.splitlines():
+        try:
+            opp = json.loads(raw)
+            detected = datetime.fromisoformat(opp["detected_at"])
+            pct, profit = float(opp["profit_pct"]), float(opp["profit"])
+            bookies = sorted({side["bookie"] for side in opp.get("sides", [])})
+            event = _event_key(opp)
+        except (ValueError, KeyError, TypeError):
+            continue  # ligne vide, corrompue ou incomplète
+        row = len(rows["ts"])
+        rows["ts"].append(detected.timestamp())
+        rows["pct"].append(pct)
+        rows["profit"].append(profit)
+        rows["sport"].append(code("sport", opp["sport"]))
+        rows["event"].append(code("event", event))
+        rows["pair"].append(code("pair", "+".join(bookies)))
+        rows["day"].append(detected.toordinal())
+        rows["hour"].append(detected.hour)
+        rows["weekday"].append(detected.weekday())
+        for bookie in bookies:
+            legs["leg_row"].append(row)
+            legs["leg_book"].append(code("book", bookie))
+    return {
+        "rows": {name: np.array(rows[name], dtype) for name, dtype in ANALYZE_ROW_COLUMNS},
+        "legs": {name: np.array(legs[name], dtype) for name, dtype in ANALYZE_LEG_COLUMNS},
+        "dicts": {name: list(table) for name, table in tables.items()},
+    }
+
+
+def _append_columns(cols: dict, parts: list) -> dict:
+    # Recode les dictionnaires de chaque tranche vers ceux du cache, puis
+    # concatène: les codes déjà en cache ne bougent jamais
+    dicts = {name: list(values) for name, values in cols["dicts"].items()}
+    index = {name: {value: i for i, value in enumerate(values)} for name, values in dicts.items()}
+    chunks = {name: [cols[name]] for name, _ in ANALYZE_ROW_COLUMNS + ANALYZE_LEG_COLUMNS}
+    n_rows = len(cols["ts"])
+    for part in parts:
+        remap = {}
+        for name in ANALYZE_DICTS:
+            table, values = index[name], dicts[name]
+            codes = []
+            for value in part["dicts"][name]:
+                found = table.get(value)
+                if found is None:
+                    found = table[value] = len(values)
+                    values.append(value)
+                codes.append(found)
+            remap[name] = np.array(codes, np.int32)
+        for name, _ in ANALYZE_ROW_COLUMNS:
+            column = part["rows"][name]
+            chunks[name].append(remap[name][column] if name in remap else column)
+        chunks["leg_row"].append(part["legs"]["leg_row"] + n_rows)
+        chunks["leg_book"].append(remap["book"][part["legs"]["leg_book"]])
+        n_rows += len(part["rows"]["ts"])
+    merged = {name: np.concatenate(chunks[name]).astype(dtype, copy=False)
+              for name, dtype in ANALYZE_ROW_COLUMNS + ANALYZE_LEG_COLUMNS}
+    merged.update(dicts=dicts, offset=cols["offset"], head=cols["head"], head_len=cols["head_len"], path=None)
+    return merged
+
+
+def load_log_columns(path: str = LOG_FILE, cache_path: str = ANALYZE_CACHE_FILE,
+                     workers: int = ANALYZE_WORKERS) -> tuple:
+    # Colonnes du log à jour: cache relu par mmap + parsing des seules lignes
+    # ajoutées depuis, réparti sur `workers` process. Retourne (cols, opps parsées).
+    size = os.path.getsize(path)
+    cols = load_cached_columns(cache_path)
+    if cols is not None and (cols["offset"] > size or _log_head(path, cols["head_len"]) != cols["head"]):
+        log.warning(f"{path} réécrit depuis le cache {cache_path}: reconstruction complète")
+        cols = None
+    if cols is None:
+        cols = _empty_columns()
+    start = cols["offset"]
+    end = _complete_lines_end(path, start, size)
+    if end <= start:
+        return cols, 0
+
+    ranges = _split_log_range(path, start, end)
+    if workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+            parts = list(pool.map(_parse_log_range, [path] * len(ranges), *zip(*ranges)))
+    else:
+        parts = [_parse_log_range(path, a, b) for a, b in ranges]
+    cols = _append_columns(cols, parts)
+    cols["offset"] = end
+    cols["head_len"] = min(end, ANALYZE_HEAD_BYTES)
+    cols["head"] = _log_head(path, cols["head_len"])
+    try:
+        save_log_columns(cols, cache_path)
+    except OSError as e:
+        log.warning(f"Cache colonnes non écrit ({cache_path}): {e}")
+    return cols, sum(len(part["rows"]["ts"]) for part in parts)
+
+
 # ─────────────────────────────────────────────────────
 # 📈  ANALYSE
 # ─────────────────────────────────────────────────────
 
-def analyze_results():
-    log_path = Path(LOG_FILE)
-    if not log_path.exists():
+ANALYZE_KEYS = {"sport": "sport", "pair": "pair", "day": "day", "hour": "hour", "lifetime": "event"}
+ANALYZE_QUANTILES = (10, 25, 50, 75, 90, 99)    # percentiles de profit du rapport
+ANALYZE_PROFIT_BINS = (1.0, 1.5, 2.0, 3.0, 5.0, 10.0)  # bornes (%) de l'histogramme de profit
+WEEKDAYS = ("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")
+HEAT_SHADES = " ·░▒▓█"
+
+
+def _analyze_options(args: list) -> dict:
+    opts = {"days": None, "since": None, "by": "sport", "sport": None, "workers": ANALYZE_WORKERS}
+    i = 0
+    while i < len(args):
+        name = args[i].lstrip("-")
+        if name not in opts or i + 1 >= len(args):
+            raise ValueError(f"Option inconnue: {args[i]} "
+                             f"(--days N --since YYYY-MM-DD --by X --sport LABEL --workers N)")
+        opts[name] = args[i + 1]
+        i += 2
+    if opts["by"] not in ANALYZE_GROUPS:
+        raise ValueError(f"--by doit être parmi: {', '.join(ANALYZE_GROUPS)}")
+    opts["workers"] = max(int(opts["workers"]), 1)
+    return opts
+
+
+def _analysis_mask(cols: dict, filters: dict):
+    # Opps retenues par --days/--since/--sport
+    mask = np.ones(len(cols["ts"]), bool)
+    if filters.get("since_ts") is not None:
+        mask &= cols["ts"] >= filters["since_ts"]
+    if filters.get("sport"):
+        sports = cols["dicts"]["sport"]
+        mask &= cols["sport"] == (sports.index(filters["sport"]) if filters["sport"] in sports else -1)
+    return mask
+
+
+def _group_stats(keys, values, totals) -> dict:
+    # Agrégats par clé sans boucle Python: tri (clé, valeur), bornes des
+    # groupes, reduceat; les percentiles sont lus au bon rang de chaque groupe
+    order = np.lexsort((values, keys))
+    keys, values, totals = keys[order], values[order], totals[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, np.intp)
+    n = np.diff(np.r_[starts, len(keys)])
+    stats = {
+        "key": keys[starts], "n": n, "min": values[starts], "max": values[starts + n - 1],
+        "sum": np.add.reduceat(values, starts), "total": np.add.reduceat(totals, starts),
+    }
+    for q in (50, 90):
+        stats[f"p{q}"] = values[starts + np.floor((n - 1) * q / 100 + 0.5).astype(np.intp)]
+    return stats
+
+
+def _analyze_shard(cols, spec: str, filters: dict, shard: int = 0, shards: int = 1) -> dict:
+    # Un agrégat groupé restreint aux clés ≡ shard (mod shards). Dans un
+    # process du pool, `cols` est le chemin du cache relu par mmap: rien de
+    # gros n'est sérialisé à l'aller, seuls les agrégats reviennent.
+    if isinstance(cols, str):
+        if analysis["path"] != cols:
+            analysis.update(path=cols, cols=load_cached_columns(cols))
+        cols = analysis["cols"]
+    mask = _analysis_mask(cols, filters)
+    if spec == "bookmaker":
+        keep = mask[cols["leg_row"]]
+        rows, keys = cols["leg_row"][keep], cols["leg_book"][keep]
+    else:
+        rows = np.flatnonzero(mask)
+        keys = cols[ANALYZE_KEYS[spec]][rows]
+    keys = keys.astype(np.int64)
+    if shards > 1:
+        mine = keys % shards == shard
+        rows, keys = rows[mine], keys[mine]
+    if spec != "lifetime":
+        return _group_stats(keys, cols["pct"][rows], cols["profit"][rows])
+
+    # Par match: première et dernière détection, ligue, nombre d'alertes
+    ts = cols["ts"][rows]
+    order = np.lexsort((ts, keys))
+    keys, ts, sports = keys[order], ts[order], cols["sport"][rows][order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, np.intp)
+    n = np.diff(np.r_[starts, len(keys)])
+    return {"key": keys[starts], "sport": sports[starts], "first": ts[starts], "last": ts[starts + n - 1], "n": n}
+
+
+def grouped_aggregates(cols: dict, specs: list, filters: dict, workers: int = ANALYZE_WORKERS) -> dict:
+    # Chaque agrégat est coupé en `workers` tranches de clés disjointes
+    # (clé mod workers) calculées en parallèle, puis concaténées
+    n_rows = int(_analysis_mask(cols, filters).sum())
+    if workers <= 1 or cols["path"] is None or n_rows < ANALYZE_PARALLEL_MIN:
+        return {spec: _analyze_shard(cols, spec, filters) for spec in specs}
+    parts = {spec: [] for spec in specs}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_analyze_shard, cols["path"], spec, filters, shard, workers): spec
+            for spec in specs for shard in range(workers)
+        }
+        for future in as_completed(futures):
+            parts[futures[future]].append(future.result())
+    return {spec: {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+            for spec, chunks in parts.items()}
+
+
+def _print_groups(title: str, stats: dict, label, count: int, days: int, by_key: bool = False):
+    # Une ligne par groupe: volume, part des opps (taux de présence), rythme
+    # par jour actif, distribution du profit et profit simulé
+    order = np.argsort(stats["key"] if by_key else -stats["n"], kind="stable")
+    labels = [label(int(stats["key"][i])) for i in order]
+    width = max((len(text) for text in labels), default=0)
+    print(f"\n{title}")
+    for text, i in zip(labels, order):
+        n = int(stats["n"][i])
+        print(f"   {text:<{width}} {n:>8} opps | {n / count:>6.1%} | {n / days:>7.1f}/j | "
+              f"moy {stats['sum'][i] / n:.2f}% | p50 {stats['p50'][i]:.2f}% | p90 {stats['p90'][i]:.2f}% | "
+              f"max {stats['max'][i]:.2f}% | ${stats['total'][i]:.2f}")
+
+
+def _print_distribution(pct):
+    quantiles = np.percentile(pct, ANALYZE_QUANTILES)
+    print("\n📐 Distribution du profit:")
+    print("   " + " | ".join(f"p{q} {v:.2f}%" for q, v in zip(ANALYZE_QUANTILES, quantiles)))
+    counts = np.bincount(np.searchsorted(ANALYZE_PROFIT_BINS, pct, side="right"),
+                         minlength=len(ANALYZE_PROFIT_BINS) + 1)
+    edges = ("",) + tuple(f"{b:g}" for b in ANALYZE_PROFIT_BINS) + ("",)
+    peak = counts.max()
+    for i, n in enumerate(counts):
+        if not n:
+            continue
+        low, high = edges[i], edges[i + 1]
+        span = f"< {high}%" if not low else f"≥ {low}%" if not high else f"{low}–{high}%"
+        print(f"   {span:>9} {'█' * max(int(30 * n / peak), 1):<30} {n:>8} ({n / len(pct):.1%})")
+
+
+def _print_heatmap(weekday, hour):
+    heat = np.bincount(weekday.astype(np.intp) * 24 + hour, minlength=7 * 24).reshape(7, 24)
+    shades = np.ceil(heat / max(heat.max(), 1) * (len(HEAT_SHADES) - 1)).astype(np.intp)
+    print("\n🔥 Opps par jour × heure (heure locale):")
+    print("        " + "".join(f"{h:<6}" for h in range(0, 24, 3)))
+    for d in range(7):
+        cells = "".join(HEAT_SHADES[s] * 2 for s in shades[d])
+        print(f"   {WEEKDAYS[d]}  {cells}  {heat[d].sum()}")
+    busiest = int(heat.sum(axis=0).argmax())
+    print(f"   pic: {busiest:02d}h–{(busiest + 1) % 24:02d}h ({heat[:, busiest].sum()} opps)")
+
+
+def _print_lifetimes(events: dict, sports: list, by_league: bool):
+    # Demi-vie: durée après laquelle la moitié des opps ont disparu, soit la
+    # médiane de (dernière − première détection) par match. Une opp live est
+    # re-loggée au plus toutes les POLL_INTERVAL: c'est la résolution.
+    lifetimes = events["last"] - events["first"]
+    once = events["n"] == 1
+    print(f"\n⏳ Demi-vie des opps: {_ago(float(np.median(lifetimes)))} "
+          f"(p90 {_ago(float(np.percentile(lifetimes, 90)))}, résolution {_ago(POLL_INTERVAL)}) — "
+          f"{len(lifetimes)} matchs, {once.mean():.0%} vus une seule fois")
+    if not by_league:
+        return
+    stats = _group_stats(events["sport"].astype(np.int64), lifetimes, once.astype(np.int64))
+    for i in np.argsort(-stats["n"], kind="stable"):
+        n = int(stats["n"][i])
+        print(f"   {sports[int(stats['key'][i])]}: {n} matchs | demi-vie {_ago(stats['p50'][i])} | "
+              f"p90 {_ago(stats['p90'][i])} | max {_ago(stats['max'][i])} | "
+              f"{stats['total'][i] / n:.0%} vus une fois")
+
+
+def analyze_results(args: list = None):
+    # python arb_scanner_v2.py analyze [--days N | --since YYYY-MM-DD] [--by sport|bookmaker|pair|day|hour|lifetime]
+    #                                  [--sport LABEL] [--workers N]
+    try:
+        opts = _analyze_options(args or [])
+    except ValueError as e:
+        print(e)
+        return
+    migrate_legacy_log()
+    if not Path(LOG_FILE).exists():
         print("Aucun fichier de log trouvé.")
         return
-    with open(log_path, "r") as f:
-        opps = json.load(f)
-    if not opps:
+    since_ts = None
+    if opts["days"]:
+        since_ts = time.time() - float(opts["days"]) * 86400
+    elif opts["since"]:
+        since_ts = time.mktime(time.strptime(opts["since"], "%Y-%m-%d"))
+    if np is None:
+        log.warning("numpy absent: rapport réduit depuis l'index SQLite")
+        _analyze_store(opts, since_ts)
+        return
+
+    t = time.perf_counter()
+    cols, parsed = load_log_columns(workers=opts["workers"])
+    load_time = time.perf_counter() - t
+    filters = {"since_ts": since_ts, "sport": opts["sport"]}
+    mask = _analysis_mask(cols, filters)
+    count = int(mask.sum())
+    if not count:
+        print("Aucune opportunité loggée.")
+        return
+    pct, profit = cols["pct"][mask], cols["profit"][mask]
+    days = len(np.unique(cols["day"][mask]))
+
+    by = opts["by"]
+    specs = ["sport", "bookmaker", "lifetime"] + ([by] if by in ("pair", "day", "hour") else [])
+    t = time.perf_counter()
+    groups = grouped_aggregates(cols, specs, filters, opts["workers"])
+    group_time = time.perf_counter() - t
+
+    dicts = cols["dicts"]
+    window = f" — depuis {time.strftime('%Y-%m-%d %H:%M', time.localtime(since_ts))}" if since_ts else ""
+    print(f"\n{'═'*50}")
+    print(f"  ANALYSE ARB — {count} opportunités{window}")
+    print(f"{'═'*50}")
+    print(f"   {len(cols['ts'])} opps en colonnes ({parsed} parsées) en {load_time:.2f}s | "
+          f"agrégats en {group_time:.2f}s | {days} jour(s) actif(s)")
+    print(f"\n📊 Profit moyen:    {pct.mean():.2f}%")
+    print(f"🏆 Meilleur profit: {pct.max():.2f}%")
+    print(f"📉 Plus faible:     {pct.min():.2f}%")
+    _print_distribution(pct)
+
+    _print_groups("🏟️ Par ligue:", groups["sport"], lambda k: dicts["sport"][k], count, days)
+    _print_groups("📚 Par bookmaker (part des opps où il apparaît):", groups["bookmaker"],
+                  lambda k: BOOK_LABELS.get(dicts["book"][k], dicts["book"][k]), count, days)
+    if by == "pair":
+        _print_groups("📋 Par pair:", groups["pair"], lambda k: dicts["pair"][k], count, days)
+    elif by == "day":
+        _print_groups("📋 Par day:", groups["day"], lambda k: datetime.fromordinal(k).strftime("%Y-%m-%d"),
+                      count, days, by_key=True)
+    elif by == "hour":
+        _print_groups("📋 Par hour:", groups["hour"], lambda k: f"{k:02d}h", count, days, by_key=True)
+
+    _print_heatmap(cols["weekday"][mask], cols["hour"][mask])
+    _print_lifetimes(groups["lifetime"], dicts["sport"], by_league=by == "lifetime")
+
+    print(f"\n💰 Profit total simulé (${BANKROLL}/opp): ${profit.sum():.2f}")
+    print(f"{'═'*50}\n")
+
+
+def _analyze_store(opts: dict, since_ts):
+    # Sans numpy: moyennes et groupes depuis les agrégats de l'index SQLite
+    conn = open_store()
+    sync_store(conn)
+
+    where, params = ["1 = 1"], []
+    if since_ts is not None:
+        where.append("hour >= ?")
+        params.append(time.strftime("%Y-%m-%d %H", time.localtime(since_ts)))
+    if opts["sport"]:
+        where.append("sport = ?")
+        params.append(opts["sport"])
+    clause = " AND ".join(where)
+
+    count, sum_pct, best_pct, worst_pct, total_profit = conn.execute(
+        f"SELECT SUM(n), SUM(sum_pct), MAX(max_pct), MIN(min_pct), SUM(sum_profit) FROM agg_hourly WHERE {clause}",
+        params,
+    ).fetchone()
+    if not count:
         print("Aucune opportunité loggée.")
         return
 
-    profits = [o["profit_pct"] for o in opps]
+    window = f" — depuis {time.strftime('%Y-%m-%d %H:00', time.localtime(since_ts))}" if since_ts else ""
     print(f"\n{'═'*50}")
-    print(f"  ANALYSE ARB — {len(opps)} opportunités")
+    print(f"  ANALYSE ARB — {count} opportunités{window}")
     print(f"{'═'*50}")
-    print(f"\n📊 Profit moyen:    {sum(profits)/len(profits):.2f}%")
-    print(f"🏆 Meilleur profit: {max(profits):.2f}%")
-    print(f"📉 Plus faible:     {min(profits):.2f}%")
-
-    sports = {}
-    for o in opps:
-        sports[o["sport"]] = sports.get(o["sport"], 0) + 1
-    print(f"\n📋 Par sport:")
-    for sport, count in sorted(sports.items(), key=lambda x: -x[1]):
-        print(f"   {sport}: {count} opps")
-
-    total_profit = sum(o["profit"] for o in opps)
+    print(f"\n📊 Profit moyen:    {sum_pct/count:.2f}%")
+    print(f"🏆 Meilleur profit: {best_pct:.2f}%")
+    print(f"📉 Plus faible:     {worst_pct:.2f}%")
+
+    by = opts["by"]
+    if by == "lifetime":
+        ev_where, ev_params = ["1 = 1"], []
+        if since_ts is not None:
+            ev_where.append("first_seen >= ?")
+            ev_params.append(since_ts)
+        if opts["sport"]:
+            ev_where.append("sport = ?")
+            ev_params.append(opts["sport"])
+        rows = conn.execute(
+            f"SELECT sport, COUNT(*), AVG(last_seen - first_seen), MAX(last_seen - first_seen) "
+            f"FROM agg_events WHERE {' AND '.join(ev_where)} GROUP BY sport ORDER BY COUNT(*) DESC",
+            ev_params,
+        ).fetchall()
+        print(f"\n⏳ Durée de vie des opps par ligue:")
+        for sport, n, avg_life, max_life in rows:
+            print(f"   {sport}: {n} matchs | moy {avg_life / 60:.0f} min | max {max_life / 60:.0f} min")
+    else:
+        table, key = {
+            "sport": ("agg_hourly", "sport"),
+            "pair": ("agg_hourly", "book_pair"),
+            "bookmaker": ("agg_hourly_book", "bookie"),
+            "day": ("agg_hourly", "substr(hour, 1, 10)"),
+            "hour": ("agg_hourly", "substr(hour, 12, 2)"),
+        }[by]
+        order = "k" if by in ("day", "hour") else "SUM(n) DESC"
+        rows = conn.execute(
+            f"SELECT {key} AS k, SUM(n), SUM(sum_pct), MAX(max_pct), SUM(sum_profit) "
+            f"FROM {table} WHERE {clause} GROUP BY k ORDER BY {order}",
+            params,
+        ).fetchall()
+        print(f"\n📋 Par {by}:")
+        for k, n, s_pct, m_pct, s_profit in rows:
+            label = BOOK_LABELS.get(k, k) if by == "bookmaker" else k
+            print(f"   {label}: {n} opps | moy {s_pct / n:.2f}% | max {m_pct:.2f}% | ${s_profit:.2f}")
+
     print(f"\n💰 Profit total simulé (${BANKROLL}/opp): ${total_profit:.2f}")
     print(f"{'═'*50}\n")
 
 
+# ─────────────────────────────────────────────────────
+# 🧪  BANC D'ESSAI — payloads synthétiques, fausse Odds API, benchmarks
+# ─────────────────────────────────────────────────────
+
+def generate_odds_payload(sport_key: str, n_games: int = 50, books: list = None,
+                          n_outcomes: int = 3, arb_rate: float = 0.05,
+                          seed: int = None, start: datetime = None,
+                          markets: tuple = ("h2h",)) -> list:
+    # Même forme que GET /v4/sports/{key}/odds (oddsFormat=decimal).
+    # Chaque bookie applique une marge de 2-8%; une fraction `arb_rate` des
+    # matchs reçoit une cote gonflée par outcome pour créer un arb de 1.5-6%.
+    # totals/spreads: chaque bookie choisit sa ligne parmi deux, l'arb
+    # éventuel est placé entre deux bookies sur la même ligne.
+    rng = random.Random(seed)
+    books = books or BOOKS
+    start = start or datetime.now(timezone.utc)
+    stamp = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+    games = []
+    for i in range(n_games):
+        home = f"{sport_key.split('_')[-1].title()} Home {i}"
+        away = f"{sport_key.split('_')[-1].title()} Away {i}"
+        names = [home, away, "Draw"][:n_outcomes] + [f"Outcome {k}" for k in range(3, n_outcomes)]
+        raw = [rng.uniform(0.5, 2.0) for _ in names]
+        probs = [r / sum(raw) for r in raw]
+        prices = {b: [1 / (p * (1 + rng.uniform(0.02, 0.08))) for p in probs] for b in books}
+        if len(books) >= 2 and rng.random() < arb_rate:
+            edge = rng.uniform(0.015, 0.06)
+            for o, p in enumerate(probs):
+                prices[rng.choice(books)][o] = 1 / (p * (1 - edge))
+        book_markets = {b: [{
+            "key": "h2h",
+            "last_update": stamp,
+            "outcomes": [
+                {"name": name, "price": round(max(price, 1.01), 2)}
+                for name, price in zip(names, prices[b])
+            ],
+        }] if "h2h" in markets else [] for b in books}
+
+        for key in markets:
+            if key not in ("totals", "spreads"):
+                continue
+            lines = (2.5, 3.5) if key == "totals" else (-0.5, -1.5)
+            arb_books = rng.sample(books, 2) if len(books) >= 2 and rng.random() < arb_rate else ()
+            arb_line = rng.choice(lines)
+            edge = rng.uniform(0.015, 0.06)
+            p_line = {line: rng.uniform(0.35, 0.65) for line in lines}
+            for b in books:
+                line = arb_line if b in arb_books else rng.choice(lines)
+                p_first = min(max(p_line[line] + rng.uniform(-0.02, 0.02), 0.05), 0.95)
+                margin = 1 + rng.uniform(0.02, 0.08)
+                odds = [1 / (p_first * margin), 1 / ((1 - p_first) * margin)]
+                if b in arb_books:
+                    odds[arb_books.index(b)] = 1 / (0.5 * (1 - edge))
+                if key == "totals":
+                    sides = [("Over", line), ("Under", line)]
+                else:
+                    sides = [(home, line), (away, -line)]
+                book_markets[b].append({
+                    "key": key,
+                    "last_update": stamp,
+                    "outcomes": [
+                        {"name": name, "price": round(max(price, 1.01), 2), "point": point}
+                        for (name, point), price in zip(sides, odds)
+                    ],
+                })
+
+        commence = start + timedelta(minutes=rng.randint(30, 7 * 24 * 60))
+        games.append({
+            "id": f"{sport_key}-{i:06d}",
+            "sport_key": sport_key,
+            "sport_title": SPORTS.get(sport_key, sport_key),
+            "commence_time": commence.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "home_team": home,
+            "away_team": away,
+            "bookmakers": [{
+                "key": b,
+                "title": b,
+                "last_update": stamp,
+                "markets": book_markets[b],
+            } for b in books],
+        })
+    return games
+
+
+class FakeOddsAPIHandler(BaseHTTPRequestHandler):
+    # GET /v4/sports/{sport_key}/odds → payload synthétique (fixe par sport),
+    # avec latence et erreurs injectables via les attributs du serveur.
+    def do_GET(self):
+        srv = self.server
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "v4" or parts[1] != "sports" or parts[3] != "odds":
+            self.send_error(404)
+            return
+        query = parse_qs(urlsplit(self.path).query)
+        # Facturation comme l'API réelle: 1 crédit par marché et par région
+        cost = (len(query.get("markets", ["h2h"])[0].split(","))
+                * len(query.get("regions", ["eu"])[0].split(",")))
+        with srv.lock:
+            srv.requests_used += cost
+            used = srv.requests_used
+            fail = srv.rng.random() < srv.error_rate
+            delay = srv.latency + srv.rng.uniform(0, srv.jitter)
+            if srv.rng.random() < srv.slow_rate:
+                delay += srv.slow_latency
+        time.sleep(delay)
+        if parts[2] in srv.dead_sports:
+            self.send_error(503, "league down")
+            return
+        if fail:
+            self.send_error(500, "injected error")
+            return
+        body = srv.payload_for(parts[2])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-requests-used", str(used))
+        self.send_header("x-requests-remaining", str(max(srv.quota - used, 0)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_odds_api(port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                        error_rate: float = 0.0, n_games: int = 50, books: list = None,
+                        arb_rate: float = 0.05, quota: int = 100000, slow_rate: float = 0.0,
+                        slow_latency: float = 1.0, dead_sports=(), serve_books: list = None,
+                        rename=None) -> ThreadingHTTPServer:
+    # slow_rate: part des requêtes retardées de slow_latency (queue de latence);
+    # dead_sports: ligues qui répondent toujours 503 (disjoncteur).
+    # serve_books: seuls bookies servis parmi `books`, rename: nom d'équipe →
+    # nom servi. Deux serveurs sur les mêmes `books` servent les mêmes
+    # matchs: de quoi simuler une seconde source aux noms différents.
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOddsAPIHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.rng = random.Random(0)
+    server.latency, server.jitter, server.error_rate = latency, jitter, error_rate
+    server.slow_rate, server.slow_latency, server.dead_sports = slow_rate, slow_latency, set(dead_sports)
+    server.quota, server.requests_used = quota, 0
+    payloads = {}
+
+    def payload_for(sport_key):
+        with server.lock:
+            if sport_key not in payloads:
+                games = generate_odds_payload(sport_key, n_games, books, arb_rate=arb_rate,
+                                              seed=zlib.crc32(sport_key.encode()),
+                                              markets=tuple(ODDS_MARKETS))
+                for game in games:
+                    if serve_books is not None:
+                        game["bookmakers"] = [bm for bm in game["bookmakers"] if bm["key"] in serve_books]
+                    if rename is not None:
+                        names = {game["home_team"]: rename(game["home_team"]), game["away_team"]: rename(game["away_team"])}
+                        game["bookmakers"] = [_rename_outcomes(bm, names) for bm in game["bookmakers"]]
+                        game["home_team"], game["away_team"] = names[game["home_team"]], names[game["away_team"]]
+                payloads[sport_key] = json.dumps(games).encode()
+            return payloads[sport_key]
+
+    server.payload_for = payload_for
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="fake-odds-api", daemon=True).start()
+    return server
+
+
+def _bench_options(args: list) -> dict:
+    opts = {"games": 2000, "books": len(BOOKS), "latency": 0.2, "errors": 0.0, "arb_rate": 0.05,
+            "slow": 0.1, "dead": 1}
+    for arg in args:
+        name, _, value = arg.lstrip("-").partition("=")
+        if name not in opts or not value:
+            raise ValueError(f"Option inconnue: {arg} (attendues: {', '.join('--' + k for k in opts)})")
+        opts[name] = type(opts[name])(value)
+    return opts
+
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n / max(seconds, 1e-9):>12,.0f} matchs/s"
+
+
+def run_benchmarks(args: list):
+    # python arb_scanner_v2.py bench [--games=N] [--books=N] [--latency=S] [--errors=R] [--arb_rate=R]
+    #                                [--slow=R] [--dead=N]
+    global BOOKS, ODDS_API_BASE, FETCH_HEDGE
+    try:
+        opts = _bench_options(args)
+    except ValueError as e:
+        print(e)
+        return
+
+    books = BOOKS + [f"bench_book_{i}" for i in range(max(opts["books"] - len(BOOKS), 0))]
+    books = books[:opts["books"]]
+    saved = BOOKS, ODDS_API_BASE, FETCH_HEDGE
+    BOOKS = books
+    try:
+        games = generate_odds_payload("soccer_bench", opts["games"], books, arb_rate=opts["arb_rate"],
+                                      seed=42, markets=tuple(ODDS_MARKETS))
+        label = "🧪 Bench"
+        print(f"\n{'═'*64}")
+        print(f"  BENCH — {len(games)} matchs × {len(books)} bookies")
+        print(f"{'═'*64}")
+
+        print("\n🔍 Détecteur")
+        t = time.perf_counter()
+        raw_games, games = games, compact_payload(games, use_cache=False)
+        print(f"   modèle compact           {_rate(len(games), time.perf_counter() - t)}")
+        t = time.perf_counter()
+        n_opps = sum(len(find_arb_opportunities(g, label)) for g in games)
+        print(f"   find_arb_opportunities   {_rate(len(games), time.perf_counter() - t)}  ({n_opps} opps)")
+        t = time.perf_counter()
+        find_arb_opportunities_batch(games, label)
+        print(f"   batch (numpy={'oui' if np is not None else 'non'})       "
+              f"{_rate(len(games), time.perf_counter() - t)}")
+        snapshot_cache.clear()
+        t = time.perf_counter()
+        find_arb_opportunities_cached(games, label)
+        print(f"   cache froid              {_rate(len(games), time.perf_counter() - t)}")
+        t = time.perf_counter()
+        find_arb_opportunities_cached(games, label)
+        print(f"   cache chaud              {_rate(len(games), time.perf_counter() - t)}")
+        snapshot_cache.clear()
+
+        opps = find_arb_opportunities_batch(games, label)
+        balances = ", ".join(f"{bookie} ${account['balance']:g}" for bookie, account in BOOK_ACCOUNTS.items())
+        print(f"\n💼 Allocation de portefeuille (soldes: {balances})")
+        for n in (10, 100, len(opps)):
+            if n > len(opps):
+                continue
+            t = time.perf_counter()
+            allocate_stakes(opps[:n])
+            elapsed = time.perf_counter() - t
+            funded = [opp.allocation for opp in opps[:n] if opp.allocation and opp.allocation[0]]
+            print(f"   {n:>5} opps live            {elapsed * 1000:>9.2f} ms  ({len(funded)} financées, "
+                  f"${sum(sum(st) for st, _ in funded):g} engagés, ${sum(p for _, p in funded):.2f} garantis)")
+        del opps
+
+        print("\n💾 Mémoire")
+        body = json.dumps(raw_games).encode()
+        del games, raw_games
+        tracemalloc.start()
+        decoded = json.loads(body)
+        raw_size = tracemalloc.get_traced_memory()[0]
+        games = compact_payload(decoded)
+        del decoded
+        find_arb_opportunities_cached(games, label)
+        del games
+        resident, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot_cache.clear()
+        print(f"   payload JSON             {len(body) / 1e6:>10.1f} Mo")
+        print(f"   JSON décodé (dicts)      {raw_size / 1e6:>10.1f} Mo")
+        print(f"   pic décodage+détection   {peak / 1e6:>10.1f} Mo")
+        print(f"   cache résident (compact) {resident / 1e6:>10.1f} Mo")
+
+        tracemalloc.start()
+        chunks = (body[i:i + STREAM_CHUNK_SIZE].decode() for i in range(0, len(body), STREAM_CHUNK_SIZE))
+        for raw in iter_json_array(chunks):
+            find_arb_opportunities_cached([compact_cached(raw)], label)
+        resident, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot_cache.clear()
+        print(f"   pic en flux              {peak / 1e6:>10.1f} Mo")
+
+        print(f"\n📉 Historique des cotes ({ODDS_HISTORY_SERIES} séries × {ODDS_HISTORY_TICKS} ticks)")
+        path = f"{ODDS_HISTORY_FILE}.bench"
+        store = OddsHistory(path, ODDS_HISTORY_SERIES, ODDS_HISTORY_TICKS)
+        keys = [store.key(f"ev{i}", "h2h", None, "bench", "home") for i in range(2 * ODDS_HISTORY_SERIES)]
+        t = time.perf_counter()
+        for tick in range(4):
+            for key in keys:
+                store.append(key, float(tick), 2.0 + tick / 100)
+        n_appends = 4 * len(keys)
+        print(f"   append                   {n_appends / (time.perf_counter() - t):>12,.0f} ticks/s "
+              f"({len(store.index)} séries gardées sur {len(keys)})")
+        t = time.perf_counter()
+        for key in keys[-ODDS_HISTORY_SERIES:]:
+            store.last_ticks(key, 8)
+        print(f"   last_ticks(8)            {ODDS_HISTORY_SERIES / (time.perf_counter() - t):>12,.0f} lectures/s")
+        print(f"   fichier mappé            {os.path.getsize(path) / 1e6:>10.1f} Mo")
+        store.close()
+        os.remove(path)
+
+        if np is not None:
+            n_logged = opts["games"] * 20
+            print(f"\n🧮 Analyse colonnaire ({n_logged} opps loggées, {ANALYZE_WORKERS} process)")
+            path = f"{LOG_FILE}.bench"
+            start = time.time() - 30 * 86400
+            with open(path, "w", encoding="utf-8") as f:
+                for i in range(n_logged):
+                    pair = random.sample(books, min(2, len(books)))
+                    pct = round(MIN_PROFIT_PCT + random.expovariate(1.5), 2)
+                    f.write(json.dumps({
+                        "sport": random.choice(list(SPORTS.values())), "home": f"H{i // 8}", "away": f"A{i // 8}",
+                        "commence": "2026-01-01 20:00", "market": "h2h", "line": None,
+                        "sides": [{"bookie": b} for b in pair], "profit_pct": pct, "profit": pct,
+                        "detected_at": datetime.fromtimestamp(start + i * 30 * 86400 / n_logged)
+                                               .strftime("%Y-%m-%d %H:%M:%S"),
+                    }) + "\n")
+            for run in ("froid", "cache"):
+                t = time.perf_counter()
+                cols, _ = load_log_columns(path, path + ".cols")
+                print(f"   chargement {run:<6}        {n_logged / (time.perf_counter() - t):>12,.0f} opps/s")
+            t = time.perf_counter()
+            grouped_aggregates(cols, ["sport", "bookmaker", "lifetime"], {"since_ts": None, "sport": None})
+            print(f"   agrégats groupés         {n_logged / (time.perf_counter() - t):>12,.0f} opps/s")
+            print(f"   cache colonnes           {os.path.getsize(path + '.cols') / 1e6:>10.1f} Mo "
+                  f"(log {os.path.getsize(path) / 1e6:.1f} Mo)")
+            del cols
+            os.remove(path)
+            os.remove(path + ".cols")
+
+        print(f"\n🌐 Scan de bout en bout (fausse API: {opts['latency']}s, {opts['errors']:.0%} erreurs)")
+        server = start_fake_odds_api(latency=opts["latency"], error_rate=opts["errors"],
+                                     n_games=max(opts["games"] // len(SPORTS), 1),
+                                     books=books, arb_rate=opts["arb_rate"])
+        ODDS_API_BASE = server.base_url
+        t = time.perf_counter()
+        first = None
+        n_games = n_opps = 0
+        for sport_key, league, _ in fetch_all_odds():
+            n_games += len(league)
+            n_opps += len(find_arb_opportunities_batch(league, SPORTS[sport_key]))
+            if first is None and league:
+                first = time.perf_counter() - t
+        total = time.perf_counter() - t
+        server.shutdown()
+        print(f"   {len(SPORTS)} ligues, {n_games} matchs, {n_opps} opps, concurrence {FETCH_CONCURRENCY}")
+        print(f"   1er lot détecté          {(first or 0) * 1000:>10.0f} ms")
+        print(f"   scan complet             {total * 1000:>10.0f} ms")
+
+        print("\n🔗 Multi-sources (Odds API + un flux secondaire aux noms d'équipes différents)")
+        feed_books = [f"feed_book_{i}" for i in range(2)]
+        server = start_fake_odds_api(latency=opts["latency"], n_games=max(opts["games"] // len(SPORTS), 1),
+                                     books=books + feed_books, serve_books=books, arb_rate=opts["arb_rate"])
+        feed = start_fake_odds_api(latency=opts["latency"], n_games=max(opts["games"] // len(SPORTS), 1),
+                                   books=books + feed_books, serve_books=feed_books, arb_rate=opts["arb_rate"],
+                                   rename=lambda name: name.upper().replace("HOME", "HME") + " FC")
+        ODDS_API_BASE = server.base_url
+        BOOKS = books + feed_books
+        providers.append(FeedProvider("bench", feed.base_url + "/v4/sports/{sport_key}/odds"))
+        for run in ("froid", "chaud"):
+            for key in [k for k in histograms if k[0] == "arb_event_match_seconds"]:
+                del histograms[key]
+            snapshot_cache.clear()
+            t = time.perf_counter()
+            n_games = n_opps = merged = 0
+            for sport_key, league, _ in fetch_all_odds():
+                n_games += len(league)
+                merged += sum(1 for g in league if len(g.lines) and any(b in feed_books for b in g.lines[0].books))
+                n_opps += len(find_arb_opportunities_batch(league, SPORTS[sport_key]))
+            matching = [h for k, h in histograms.items() if k[0] == "arb_event_match_seconds"]
+            per_event = sum(h["sum"] for h in matching) / max(sum(h["count"] for h in matching), 1)
+            print(f"   scan {run:<5} {n_games} matchs ({merged} fusionnés), {n_opps} opps | "
+                  f"rapprochement {per_event * 1e6:.0f} µs/match | {(time.perf_counter() - t) * 1000:.0f} ms")
+        providers.pop()
+        BOOKS = books
+        server.shutdown()
+        feed.shutdown()
+        snapshot_cache.clear()
+
+        # Scans successifs contre une API dégradée: retries, doublage au-delà
+        # du p95 et disjoncteur sur les ligues mortes
+        dead = sorted(SPORTS)[:opts["dead"]]
+        errors = max(opts["errors"], 0.2)
+        print(f"\n🛡 Résilience ({errors:.0%} erreurs, {opts['slow']:.0%} lentes +{max(opts['latency'] * 10, 1.0):.0f}s, "
+              f"{len(dead)} ligue(s) morte(s))")
+        server = start_fake_odds_api(latency=opts["latency"], jitter=opts["latency"] / 2, error_rate=errors,
+                                     slow_rate=opts["slow"], slow_latency=max(opts["latency"] * 10, 1.0),
+                                     dead_sports=dead, n_games=max(opts["games"] // len(SPORTS), 1),
+                                     books=books, arb_rate=opts["arb_rate"])
+        ODDS_API_BASE = server.base_url
+        FETCH_HEDGE = True
+        saved_stats = dict(session_stats)
+        for scan in range(1, BREAKER_THRESHOLD + 2):
+            before = dict(session_stats)
+            outcomes = {"ok": 0, "failed": 0}
+            t = time.perf_counter()
+            for _, _, outcome in fetch_all_odds():
+                if outcome is not None:
+                    outcomes[outcome] += 1
+            print(f"   scan {scan}: {outcomes['ok']} ok / {outcomes['failed']} en échec | "
+                  f"{session_stats['fetch_retries'] - before['fetch_retries']} retries | "
+                  f"{session_stats['fetch_hedges'] - before['fetch_hedges']} doublées | "
+                  f"{session_stats['breaker_skips'] - before['breaker_skips']} ignorées "
+                  f"| {(time.perf_counter() - t) * 1000:.0f} ms")
+        print(f"   disjoncteurs ouverts: {', '.join(k for k in breakers if breaker_state(k) == 'open') or 'aucun'}")
+        server.shutdown()
+        session_stats.update(saved_stats)
+        breakers.clear()
+
+        if resource is not None:
+            print(f"\n📈 RSS max du process      {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:>10.1f} Mo")
+        print(f"{'═'*64}\n")
+    finally:
+        BOOKS, ODDS_API_BASE, FETCH_HEDGE = saved
+
+
 # ─────────────────────────────────────────────────────
 # 🚀  ENTRY POINT
 # ─────────────────────────────────────────────────────
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "analyze":
-        analyze_results()
+        analyze_results(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "replay":
+        replay(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        run_benchmarks(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "fakeapi":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        fake = start_fake_odds_api(port=port, latency=0.2)
+        print(f"Fausse Odds API sur {fake.base_url} — lance le scanner avec ODDS_API_BASE={fake.base_url}")
+        while True:
+            time.sleep(3600)
+    elif len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        simulate_quota(int(sys.argv[2]) if len(sys.argv) > 2 else 30)
     else:
         run_scanner()
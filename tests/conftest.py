@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# L'import crée arb_scanner.log dans le dossier courant: pas dans le dépôt
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix="arb_tests_"))
+try:
+    import arb_scanner_v2  # noqa: E402
+finally:
+    os.chdir(_cwd)
+
+
+@pytest.fixture(autouse=True)
+def _workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import arb_scanner_v2 as arb
+
+NOW = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+ACCOUNTS = {
+    "betfair_ex_eu": {"balance": 400.0, "max_stake": None, "unit": 1.0},
+    "william_hill":  {"balance": 300.0, "max_stake": 40.0, "unit": 5.0},
+    "bwin":          {"balance": 300.0, "max_stake": 60.0, "unit": 1.0},
+    "pinnacle":      {"balance": 500.0, "max_stake": None, "unit": 2.0},
+}
+
+
+@pytest.fixture
+def opps():
+    # Arbs fréquents sur 4 bookies: les opps se partagent les mêmes comptes
+    raw = arb.generate_odds_payload("soccer_test", n_games=300, arb_rate=0.3, seed=11, start=NOW)
+    games = arb.compact_payload(raw, use_cache=False)
+    found = arb.find_arb_opportunities_batch(games, "Test", NOW)
+    assert len(found) > 20
+    return found
+
+
+def _funded(opps):
+    return [opp for opp in opps if opp.allocation and opp.allocation[0]]
+
+
+def test_allocation_spreads_across_opportunities(opps):
+    arb.allocate_stakes(opps, ACCOUNTS)
+    funded = _funded(opps)
+    assert len(funded) > 1
+
+    per_book = {}
+    for opp in funded:
+        stakes, profit = opp.allocation
+        sides = opp.sides()
+        assert len(stakes) == len(sides)
+        by_opp = {}
+        for (_, _, bookie, odd, _), stake in zip(sides, stakes):
+            account = ACCOUNTS[bookie]
+            assert stake > 0
+            assert stake / account["unit"] == pytest.approx(round(stake / account["unit"]))
+            if account["max_stake"] is not None:
+                assert stake <= account["max_stake"]
+            by_opp[bookie] = by_opp.get(bookie, 0.0) + stake
+        for bookie, total in by_opp.items():
+            assert total <= ACCOUNTS[bookie]["balance"] * arb.STAKE_MAX_SHARE + 1e-9
+            per_book[bookie] = per_book.get(bookie, 0.0) + total
+        # Profit garanti quel que soit le résultat
+        payout = min(stake * odd for (_, _, _, odd, _), stake in zip(sides, stakes))
+        assert profit == pytest.approx(payout - sum(stakes), abs=0.01)
+        assert profit > 0
+
+    for bookie, total in per_book.items():
+        assert total <= ACCOUNTS[bookie]["balance"] + 1e-9
+
+
+def test_allocation_prefers_best_rates(opps):
+    arb.allocate_stakes(opps, ACCOUNTS)
+    best = max(opps, key=lambda opp: opp.profit_pct)
+    assert best.allocation[0]
+
+
+def test_allocation_respects_drained_accounts(opps):
+    accounts = {bookie: dict(account) for bookie, account in ACCOUNTS.items()}
+    accounts["pinnacle"]["balance"] = 0.0
+    arb.allocate_stakes(opps, accounts)
+    funded = _funded(opps)
+    assert funded
+    assert all("pinnacle" not in [side[2] for side in opp.sides()] for opp in funded)
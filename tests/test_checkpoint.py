@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+import arb_scanner_v2 as arb
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    # Store partagé persistant (mode multi-workers) et état du scanner isolé
+    store = arb.SQLiteSharedStore(str(tmp_path / "arb_shared.db"))
+    monkeypatch.setitem(arb.coordination, "store", store)
+    monkeypatch.setattr(arb, "state", dict(arb.state, paused=False, resume_epoch=None))
+    monkeypatch.setattr(arb, "session_stats", dict(arb.session_stats))
+    monkeypatch.setattr(arb, "checkpoint", dict(arb.checkpoint, fingerprint=None))
+    monkeypatch.setattr(arb, "quota", {"remaining": None})
+    monkeypatch.setattr(arb, "last_payloads", {})
+    monkeypatch.setattr(arb, "sport_schedule", {
+        k: {"next_fetch": time.time() + 3600, "last_fetch": time.time(), "next_kickoff": None}
+        for k in arb.SPORTS})
+    return store
+
+
+def _due():
+    now = time.time()
+    return [k for k in arb.MY_SPORTS if arb.sport_schedule[k]["next_fetch"] <= now]
+
+
+def _restart(monkeypatch, path):
+    # Nouveau process: état et planning repartent de zéro avant la restauration
+    monkeypatch.setattr(arb, "state", dict(arb.state, paused=False, resume_epoch=None))
+    for entry in arb.sport_schedule.values():
+        entry["next_fetch"] = 0.0
+    return arb.restore_checkpoint(str(path))
+
+
+def test_restore_after_resume_keeps_fresh_leagues(scanner, tmp_path, monkeypatch):
+    path = tmp_path / "scanner_checkpoint.json.gz"
+    # /resume appliqué avant l'arrêt
+    scanner.incr("resume_epoch")
+    assert arb.sync_shared_state()
+    for entry in arb.sport_schedule.values():
+        entry["next_fetch"] = time.time() + 3600
+    assert arb.save_checkpoint(str(path))
+
+    restored = _restart(monkeypatch, path)
+    assert restored["fresh"] == len(arb.MY_SPORTS)
+    assert _due() == []
+    assert not arb.sync_shared_state()
+    assert _due() == []
+
+    # Un nouveau /resume rend bien toutes les ligues dues
+    scanner.incr("resume_epoch")
+    assert arb.sync_shared_state()
+    assert _due() == list(arb.MY_SPORTS)
+
+
+def test_restore_keeps_shared_pause_flag(scanner, tmp_path, monkeypatch):
+    path = tmp_path / "scanner_checkpoint.json.gz"
+    arb.save_checkpoint(str(path))
+    scanner.set("paused", "1")
+    _restart(monkeypatch, path)
+    assert arb.state["paused"]
@@ -0,0 +1,69 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+import arb_scanner_v2 as arb
+
+NOW = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+
+def _payload(seed, markets, n_outcomes=3, books=None):
+    # Payload synthétique troué: cotes, marchés et bookies retirés au hasard
+    # pour couvrir les lignes incomplètes et les matchs sans arb possible.
+    rng = random.Random(seed)
+    raw = arb.generate_odds_payload("soccer_test", n_games=150, books=books, n_outcomes=n_outcomes,
+                                    arb_rate=0.3, seed=seed, start=NOW, markets=markets)
+    for game in raw:
+        game["bookmakers"] = [b for b in game["bookmakers"] if rng.random() > 0.1]
+        for bookmaker in game["bookmakers"]:
+            for market in bookmaker["markets"]:
+                if rng.random() < 0.1:
+                    market["outcomes"].pop(rng.randrange(len(market["outcomes"])))
+    return raw
+
+
+def _per_game(games):
+    return [o.to_dict() for game in games for o in arb.find_arb_opportunities(game, "Test", NOW)]
+
+
+def _batch(games):
+    return [o.to_dict() for o in arb.find_arb_opportunities_batch(games, "Test", NOW)]
+
+
+@pytest.fixture
+def all_markets(monkeypatch):
+    monkeypatch.setattr(arb, "ODDS_MARKETS", ["h2h", "totals", "spreads"])
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("markets", [("h2h",), ("totals",), ("h2h", "totals", "spreads")])
+def test_batch_matches_per_game(all_markets, seed, markets):
+    games = arb.compact_payload(_payload(seed, markets), use_cache=False)
+    expected = _per_game(games)
+    assert expected, "le payload doit contenir des arbs"
+    assert _batch(games) == expected
+
+
+@pytest.mark.parametrize("n_outcomes", [2, 4])
+def test_batch_matches_per_game_outcomes(all_markets, n_outcomes):
+    games = arb.compact_payload(_payload(7, ("h2h",), n_outcomes=n_outcomes), use_cache=False)
+    assert _batch(games) == _per_game(games)
+
+
+def test_batch_matches_per_game_many_books(all_markets, monkeypatch):
+    books = arb.BOOKS + ["book_a", "book_b", "book_c", "book_d"]
+    monkeypatch.setattr(arb, "BOOKS", books)
+    games = arb.compact_payload(_payload(3, ("h2h", "totals"), books=books), use_cache=False)
+    assert _batch(games) == _per_game(games)
+
+
+def test_batch_without_numpy(all_markets, monkeypatch):
+    games = arb.compact_payload(_payload(5, ("h2h", "spreads")), use_cache=False)
+    expected = _per_game(games)
+    monkeypatch.setattr(arb, "np", None)
+    assert _batch(games) == expected
+
+
+def test_batch_empty():
+    assert arb.find_arb_opportunities_batch([], "Test", NOW) == []
@@ -0,0 +1,229 @@
+import time
+
+import pytest
+
+import arb_scanner_v2 as arb
+
+SPORT = "soccer_test"
+
+
+class ScriptedRng:
+    # Remplace server.rng: tirages random() dictés dans l'ordre, uniform()
+    # renvoie la borne basse (pas de jitter)
+    def __init__(self, draws):
+        self.draws = list(draws)
+
+    def random(self):
+        return self.draws.pop(0) if self.draws else 0.99
+
+    def uniform(self, a, b):
+        return a
+
+
+@pytest.fixture
+def server(monkeypatch):
+    srv = arb.start_fake_odds_api(n_games=5)
+    monkeypatch.setattr(arb, "ODDS_API_BASE", srv.base_url)
+    monkeypatch.setattr(arb, "FETCH_BACKOFF", 0.01)
+    monkeypatch.setattr(arb, "FETCH_HEDGE", False)
+    monkeypatch.setattr(arb, "send_telegram", lambda *a, **k: None)
+    monkeypatch.setattr(arb, "breakers", {})
+    monkeypatch.setattr(arb, "histograms", {})
+    monkeypatch.setattr(arb, "quota", {"remaining": None})
+    monkeypatch.setattr(arb, "late_leagues", {})
+    monkeypatch.setattr(arb, "state", dict(arb.state, paused=False))
+    monkeypatch.setattr(arb, "session_stats", dict(arb.session_stats, **{
+        key: 0 for key in ("api_calls", "fetch_retries", "fetch_hedges", "hedge_losers",
+                           "api_errors", "breaker_skips")}))
+    yield srv
+    srv.shutdown()
+
+
+def _fetch(sport_key=SPORT):
+    status = {}
+    games = list(arb.iter_odds(sport_key, status=status))
+    return games, status["ok"]
+
+
+def test_fetch_ok(server):
+    games, ok = _fetch()
+    assert ok and len(games) == 5
+    assert arb.session_stats["api_calls"] == 1
+    assert arb.quota["remaining"] == server.quota - server.requests_used
+
+
+def test_fetch_odds(server):
+    games = arb.fetch_odds(SPORT)
+    assert [g["id"] for g in games] == [g["id"] for g in _fetch()[0]]
+
+
+def test_retry_then_success(server):
+    # 1re requête en erreur 500, la 2e passe: (échec, lenteur) par requête
+    server.error_rate = 0.5
+    server.rng = ScriptedRng([0.0, 0.99, 0.99, 0.99])
+    games, ok = _fetch()
+    assert ok and len(games) == 5
+    assert arb.session_stats["fetch_retries"] == 1
+    assert arb.session_stats["api_errors"] == 1
+    assert arb.session_stats["api_calls"] == 1
+    assert arb.breaker_state(SPORT) == "closed"
+
+
+def test_retries_exhausted(server):
+    server.error_rate = 1.0
+    games, ok = _fetch()
+    assert not ok and games == []
+    assert server.requests_used == arb.FETCH_RETRIES + 1
+    assert arb.session_stats["fetch_retries"] == arb.FETCH_RETRIES
+    assert arb.session_stats["api_errors"] == arb.FETCH_RETRIES + 1
+    assert arb.session_stats["api_calls"] == 0
+
+
+def test_no_retry_on_client_error(server, monkeypatch):
+    monkeypatch.setattr(arb, "ODDS_API_BASE", server.base_url + "/nope")
+    games, ok = _fetch()
+    assert not ok
+    assert arb.session_stats["fetch_retries"] == 0
+
+
+def test_breaker_opens_and_recovers(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_RETRIES", 0)
+    server.dead_sports.add(SPORT)
+    for _ in range(arb.BREAKER_THRESHOLD):
+        assert arb.breaker_state(SPORT) == "closed"
+        assert _fetch()[1] is False
+    assert arb.breaker_state(SPORT) == "open"
+
+    # Disjoncteur ouvert: ligue ignorée sans requête
+    used = server.requests_used
+    assert _fetch() == ([], False)
+    assert server.requests_used == used
+    assert arb.session_stats["breaker_skips"] == 1
+
+    # Après le cooldown, un essai passe; un échec rouvre pour plus longtemps
+    now = time.time()
+    arb.breakers[SPORT]["open_until"] = now
+    assert arb.breaker_state(SPORT, now + 1) == "half-open"
+    assert _fetch()[1] is False
+    assert arb.breaker_state(SPORT) == "open"
+    assert arb.breakers[SPORT]["open_until"] - time.time() > arb.BREAKER_COOLDOWN * 1.5
+
+    # Essai réussi: disjoncteur refermé
+    server.dead_sports.clear()
+    arb.breakers[SPORT]["open_until"] = 0.0
+    games, ok = _fetch()
+    assert ok and len(games) == 5
+    assert arb.breaker_state(SPORT) == "closed"
+    assert arb.breakers[SPORT]["failures"] == 0
+
+
+def test_breaker_isolates_leagues(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_RETRIES", 0)
+    server.dead_sports.add(SPORT)
+    for _ in range(arb.BREAKER_THRESHOLD):
+        _fetch()
+    assert arb.breaker_state(SPORT) == "open"
+    assert _fetch("basketball_test")[1] is True
+
+
+def _prime_hedge():
+    for _ in range(arb.FETCH_HEDGE_MIN_SAMPLES):
+        arb.observe("arb_fetch_ttfb_seconds", 0.01, sport=SPORT)
+
+
+def test_no_hedge_without_samples(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_HEDGE", True)
+    assert arb.hedge_delay() is None
+    _prime_hedge()
+    assert arb.hedge_delay() == pytest.approx(arb.quantile("arb_fetch_ttfb_seconds", 0.95))
+
+
+def test_hedge_beats_slow_request(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_HEDGE", True)
+    _prime_hedge()
+    # 1re requête lente (slow_latency), la requête doublée répond tout de suite
+    server.slow_rate, server.slow_latency = 0.5, 1.0
+    server.rng = ScriptedRng([0.99, 0.0, 0.99, 0.99])
+    start = time.perf_counter()
+    games, ok = _fetch()
+    elapsed = time.perf_counter() - start
+    assert ok and len(games) == 5
+    assert elapsed < server.slow_latency
+    assert arb.session_stats["fetch_hedges"] == 1
+    # Seule la réponse retenue compte comme appel; la perdante est fermée à son arrivée
+    assert arb.session_stats["api_calls"] == 1
+    deadline = time.time() + 5
+    while arb.session_stats["hedge_losers"] < 1 and time.time() < deadline:
+        time.sleep(0.05)
+    assert arb.session_stats["hedge_losers"] == 1
+    assert arb.session_stats["api_calls"] == 1
+    assert server.requests_used == 2
+
+
+def test_hedge_not_sent_for_fast_request(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_HEDGE", True)
+    for _ in range(arb.FETCH_HEDGE_MIN_SAMPLES):
+        arb.observe("arb_fetch_ttfb_seconds", 1.0, sport=SPORT)
+    games, ok = _fetch()
+    assert ok
+    assert arb.session_stats["fetch_hedges"] == 0
+    assert server.requests_used == 1
+
+
+def test_hedge_disabled_when_quota_low(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_HEDGE", True)
+    _prime_hedge()
+    arb.quota["remaining"] = arb.QUOTA_RESERVE - 1
+    assert arb.hedge_delay() is None
+
+
+LEAGUES = ["soccer_a", "soccer_b", "soccer_c", "soccer_d", "soccer_e"]
+
+
+def _wait_late(n):
+    deadline = time.time() + 5
+    while len(arb.late_leagues) < n and time.time() < deadline:
+        time.sleep(0.05)
+    return sorted(arb.late_leagues)
+
+
+def test_deadline_stops_submitting_and_keeps_late_leagues(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_CONCURRENCY", 2)
+    monkeypatch.setattr(arb, "SCAN_DEADLINE", 0.3)
+    server.latency = 0.6
+    assert list(arb.fetch_all_odds(LEAGUES)) == []
+    # Seules les 2 ligues déjà lancées ont coûté une requête...
+    assert _wait_late(2) == LEAGUES[:2]
+    assert server.requests_used == 2
+
+    # ...et leur réponse tardive est resservie au scan suivant, sans requête
+    server.latency = 0.0
+    done = {}
+    for sport_key, games, outcome in arb.fetch_all_odds(LEAGUES):
+        done.setdefault(sport_key, []).extend(games)
+        if outcome is not None:
+            assert outcome == "ok"
+    assert sorted(done) == LEAGUES
+    assert all(len(games) == 5 for games in done.values())
+    assert server.requests_used == 2 + 3
+    assert arb.late_leagues == {}
+
+
+def test_pause_stops_submitting(server, monkeypatch):
+    monkeypatch.setattr(arb, "FETCH_CONCURRENCY", 1)
+    server.latency = 0.3
+    seen = []
+    for sport_key, games, outcome in arb.fetch_all_odds(LEAGUES):
+        if outcome is not None:
+            seen.append(sport_key)
+            arb.state["paused"] = True
+    assert seen == LEAGUES[:1]
+    time.sleep(0.5)
+    assert server.requests_used == 1
+
+
+def test_stale_late_league_is_refetched(server):
+    arb.late_leagues[SPORT] = (time.time() - arb.LATE_LEAGUE_MAX_AGE - 1, [])
+    results = list(arb.fetch_all_odds([SPORT]))
+    assert sum(len(games) for _, games, _ in results) == 5
+    assert server.requests_used == 1
@@ -0,0 +1,49 @@
+import json
+from datetime import datetime, timezone
+
+import arb_scanner_v2 as arb
+
+
+def _opps(seed):
+    raw = arb.generate_odds_payload("soccer_test", n_games=100, arb_rate=0.5, seed=seed)
+    games = arb.compact_payload(raw, use_cache=False)
+    return [o.to_dict() for o in arb.find_arb_opportunities_batch(games, "Test", datetime.now(timezone.utc))]
+
+
+def _append(opps, tail=""):
+    with open(arb.LOG_FILE, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(opp) + "\n" for opp in opps)
+        f.write(tail)
+
+
+def test_sync_store_is_incremental():
+    first, second = _opps(1), _opps(2)
+    _append(first)
+    conn = arb.open_store()
+    assert arb.sync_store(conn) == len(first)
+    assert arb.sync_store(conn) == 0
+
+    # Ligne en cours d'écriture: ingérée au sync suivant seulement
+    partial = json.dumps(second[0])
+    _append(second[1:], partial[:10])
+    assert arb.sync_store(conn) == len(second) - 1
+    with open(arb.LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(partial[10:] + "\n")
+    assert arb.sync_store(conn) == 1
+
+    total = len(first) + len(second)
+    assert conn.execute("SELECT COUNT(*) FROM opportunities").fetchone()[0] == total
+    assert conn.execute("SELECT SUM(n) FROM agg_hourly").fetchone()[0] == total
+    best = max(opp["profit_pct"] for opp in first + second)
+    assert conn.execute("SELECT MAX(max_pct) FROM agg_hourly").fetchone()[0] == best
+
+
+def test_sync_store_reindexes_truncated_log():
+    opps = _opps(3)
+    _append(opps)
+    conn = arb.open_store()
+    arb.sync_store(conn)
+    open(arb.LOG_FILE, "w").close()
+    _append(opps[:5])
+    assert arb.sync_store(conn) == 5
+    assert conn.execute("SELECT COUNT(*) FROM opportunities").fetchone()[0] == 5